@@ -0,0 +1,108 @@
+"""Compara o throughput do caminho sync e async com o mesmo pool.
+
+O caminho sync imita o que o FastAPI faz com rotas `def`: cada requisição
+ocupa uma thread do threadpool do anyio (40 por padrão) durante toda a ida
+ao banco. O caminho async executa as requisições como tasks, limitadas
+apenas pelo pool de conexões. A latência é medida desde a chegada da
+requisição, incluindo a espera por thread ou por conexão.
+
+Uso:
+    python -m benchmarks.async_vs_sync --requisicoes 2000 --pool 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from madr_fast.settings import Settings
+
+# consulta que imita uma ida ao banco de um handler (latência em segundos)
+CONSULTA = text('SELECT pg_sleep(:latencia)')
+
+
+def _resumo(nome, duracao, latencias):
+    latencias.sort()
+    p99 = latencias[int(len(latencias) * 0.99) - 1]
+    print(
+        f'{nome:>5}: {len(latencias) / duracao:8.1f} req/s | '
+        f'p50 {statistics.median(latencias) * 1000:7.2f} ms | '
+        f'p99 {p99 * 1000:7.2f} ms'
+    )
+
+
+def roda_sync(url, args):
+    engine = create_engine(
+        url, pool_size=args.pool, max_overflow=0, pool_timeout=60
+    )
+
+    def handler(enviada):
+        with Session(engine) as session:
+            session.execute(CONSULTA, {'latencia': args.latencia})
+        return time.perf_counter() - enviada
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        # aquece o pool antes de medir
+        list(executor.map(handler, [time.perf_counter()] * args.pool))
+
+        inicio = time.perf_counter()
+        futuros = [
+            executor.submit(handler, time.perf_counter())
+            for _ in range(args.requisicoes)
+        ]
+        latencias = [futuro.result() for futuro in futuros]
+        duracao = time.perf_counter() - inicio
+
+    engine.dispose()
+    _resumo('sync', duracao, latencias)
+
+
+async def roda_async(url, args):
+    engine = create_async_engine(
+        url, pool_size=args.pool, max_overflow=0, pool_timeout=60
+    )
+
+    async def handler(enviada):
+        async with AsyncSession(engine) as session:
+            await session.execute(CONSULTA, {'latencia': args.latencia})
+        return time.perf_counter() - enviada
+
+    # aquece o pool antes de medir
+    await asyncio.gather(
+        *(handler(time.perf_counter()) for _ in range(args.pool))
+    )
+
+    inicio = time.perf_counter()
+    latencias = await asyncio.gather(
+        *(handler(time.perf_counter()) for _ in range(args.requisicoes))
+    )
+    duracao = time.perf_counter() - inicio
+
+    await engine.dispose()
+    _resumo('async', duracao, list(latencias))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requisicoes', type=int, default=2000)
+    parser.add_argument('--pool', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=40)
+    parser.add_argument('--latencia', type=float, default=0.005)
+    args = parser.parse_args()
+
+    url = Settings().DATABASE_URL
+    print(
+        f'{args.requisicoes} requisições, pool={args.pool}, '
+        f'threads={args.threads}, latência={args.latencia * 1000:.1f} ms'
+    )
+    roda_sync(url, args)
+    asyncio.run(roda_async(url, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Mede a latência da busca por trecho do título com e sem o índice trigram.
+
+- varredura: bitmap scans desligados, o LIKE '%x%' varre a tabela
+- trigram: o planner usa o GIN com gin_trgm_ops (ix_livros_titulo_trgm)
+
+Cada medida roda a mesma consulta da rota (página + total) para trechos de
+títulos sorteados. A tabela cresce de um tamanho ao próximo em um schema
+próprio, removido no fim; o índice é recriado após cada carga.
+
+Uso:
+    python -m benchmarks.busca_trigram --livros 10000 100000 1000000 10000000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import time
+
+from fastapi_pagination.ext.sqlalchemy import create_count_query
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from madr_fast.models import Livro, table_registry
+from madr_fast.settings import Settings
+
+SCHEMA = 'benchmark_busca_trigram'
+TAMANHO_PAGINA = 20
+
+
+async def carrega(conn, de, ate):
+    # títulos variados (md5) gerados no próprio banco
+    await conn.execute(
+        text(
+            'INSERT INTO livros (titulo, ano, romancista_id)'
+            " SELECT 'livro ' || md5(i::text), 1900 + i % 125, 1"
+            ' FROM generate_series(CAST(:de AS int), CAST(:ate AS int)) i'
+        ),
+        {'de': de, 'ate': ate},
+    )
+
+
+async def mede(engine, num_livros, modo, amostras):
+    duracoes = []
+    async with engine.connect() as conn:
+        for _ in range(amostras):
+            i = random.randint(1, num_livros)
+            trecho = hashlib.md5(str(i).encode()).hexdigest()[5:13]
+            query = select(Livro).where(Livro.titulo.contains(trecho))
+
+            async with conn.begin():
+                if modo == 'varredura':
+                    await conn.execute(
+                        text('SET LOCAL enable_bitmapscan = off')
+                    )
+                inicio = time.perf_counter()
+                await conn.execute(query.limit(TAMANHO_PAGINA))
+                await conn.scalar(create_count_query(query))
+                duracoes.append(time.perf_counter() - inicio)
+
+    return statistics.median(duracoes)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--livros',
+        type=int,
+        nargs='+',
+        default=[10_000, 100_000, 1_000_000, 10_000_000],
+    )
+    parser.add_argument('--amostras', type=int, default=20)
+    args = parser.parse_args()
+
+    # search_path no schema do benchmark (pg_trgm continua em public), sem
+    # o statement_timeout da aplicação, que cortaria as varreduras longas, e
+    # sem statements preparados: o plano genérico guardado no modo varredura
+    # seria reaproveitado no modo trigram
+    engine = create_async_engine(
+        Settings().DATABASE_URL,
+        connect_args={
+            'options': f'-c search_path={SCHEMA},public',
+            'prepare_threshold': None,
+        },
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}'))
+        await conn.run_sync(table_registry.metadata.create_all)
+        await conn.execute(
+            text("INSERT INTO romancistas (nome) VALUES ('romancista')")
+        )
+
+    try:
+        carregados = 0
+        for num_livros in sorted(args.livros):
+            async with engine.begin() as conn:
+                # carga sem o índice e recriação dele, mais rápido que
+                # manter o GIN linha a linha
+                await conn.execute(text('DROP INDEX ix_livros_titulo_trgm'))
+                await carrega(conn, carregados + 1, num_livros)
+                await conn.execute(
+                    text(
+                        'CREATE INDEX ix_livros_titulo_trgm ON livros'
+                        ' USING gin (titulo gin_trgm_ops)'
+                    )
+                )
+            async with engine.connect() as conn:
+                await conn.execute(text('ANALYZE livros'))
+                await conn.commit()
+            carregados = num_livros
+
+            for modo in ('varredura', 'trigram'):
+                mediana = await mede(engine, num_livros, modo, args.amostras)
+                print(
+                    f'{num_livros:>10} livros | {modo:>9}: '
+                    f'{mediana * 1000:9.2f} ms (mediana)'
+                )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f'DROP SCHEMA {SCHEMA} CASCADE'))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""Compara o delete de romancista pelo ORM e pelo ON DELETE CASCADE.
+
+- orm: carrega o romancista e todos os seus livros na sessão e emite um
+  DELETE por livro (o antigo `cascade='all, delete-orphan'`)
+- cascade: um único DELETE do romancista; o banco remove os livros
+
+Cada medida roda dentro de uma transação desfeita no fim, com as tabelas
+criadas pelos models (FK com ON DELETE CASCADE).
+
+Uso:
+    python -m benchmarks.delete_em_cascata --livros 10 1000 100000
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from madr_fast.models import Livro, Romancista, table_registry
+from madr_fast.settings import Settings
+
+
+async def deleta_pelo_orm(session, romancista_id):
+    romancista = await session.scalar(
+        select(Romancista)
+        .where(Romancista.id == romancista_id)
+        .options(selectinload(Romancista.livros))
+    )
+    for livro in romancista.livros:
+        await session.delete(livro)
+    await session.delete(romancista)
+    await session.flush()
+
+
+async def deleta_em_cascata(session, romancista_id):
+    await session.execute(
+        delete(Romancista).where(Romancista.id == romancista_id)
+    )
+
+
+async def mede(engine, estrategia, num_livros):
+    async with engine.connect() as conn:
+        transacao = await conn.begin()
+        await conn.run_sync(table_registry.metadata.create_all)
+        romancista_id = await conn.scalar(
+            insert(Romancista)
+            .values(nome='romancista prolífico')
+            .returning(Romancista.id)
+        )
+        await conn.execute(
+            insert(Livro),
+            [
+                {
+                    'titulo': f'livro {i}',
+                    'ano': 2000,
+                    'romancista_id': romancista_id,
+                }
+                for i in range(num_livros)
+            ],
+        )
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        async with AsyncSession(bind=conn) as session:
+            await estrategia(session, romancista_id)
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        await transacao.rollback()
+
+    return duracao, pico
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--livros', type=int, nargs='+', default=[10, 1_000, 100_000]
+    )
+    args = parser.parse_args()
+
+    engine = create_async_engine(Settings().DATABASE_URL)
+    for num_livros in args.livros:
+        for nome, estrategia in (
+            ('orm', deleta_pelo_orm),
+            ('cascade', deleta_em_cascata),
+        ):
+            duracao, pico = await mede(engine, estrategia, num_livros)
+            print(
+                f'{num_livros:>7} livros | {nome:>7}: '
+                f'{duracao * 1000:9.1f} ms | pico {pico / 1024:9.1f} KiB'
+            )
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Compara o cadastro concorrente de romancistas com e sem group commit.
+
+- atual: cada requisição abre sua sessão e faz INSERT + COMMIT
+- agrupado: as requisições passam pelo AgrupadorDeEscritas e cada lote
+  (janela/tamanho máximo) é gravado com um INSERT e um só COMMIT
+
+Os COMMITs são reais (o custo medido é o fsync), então as tabelas são
+criadas em um schema próprio, removido no fim.
+
+Uso:
+    python -m benchmarks.group_commit --requisicoes 2000 --concorrencia 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_fast.agrupador import AgrupadorDeEscritas
+from madr_fast.database import cria_engine
+from madr_fast.models import Romancista, table_registry
+from madr_fast.settings import Settings
+
+SCHEMA = 'benchmark_group_commit'
+
+
+async def mede(engine, grava, rodada, requisicoes, concorrencia):
+    limite = asyncio.Semaphore(concorrencia)
+
+    async def requisicao(i):
+        async with limite:
+            await grava(Romancista, {'nome': f'romancista {rodada} {i}'})
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(requisicao(i) for i in range(requisicoes)))
+    return time.perf_counter() - inicio
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requisicoes', type=int, default=2_000)
+    parser.add_argument('--concorrencia', type=int, default=50)
+    parser.add_argument('--janela', type=float, default=0.005)
+    parser.add_argument('--max-lote', type=int, default=100)
+    args = parser.parse_args()
+
+    engine = cria_engine(
+        Settings().DATABASE_URL,
+        pool_size=args.concorrencia,
+        execution_options={'schema_translate_map': {None: SCHEMA}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}'))
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async def atual(modelo, valores):
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            resultado = await session.scalar(
+                insert(modelo).values(**valores).returning(modelo)
+            )
+            await session.commit()
+            return resultado
+
+    agrupador = AgrupadorDeEscritas(engine, args.janela, args.max_lote)
+
+    try:
+        for nome, grava in (('atual', atual), ('agrupado', agrupador.insere)):
+            duracao = await mede(
+                engine, grava, nome, args.requisicoes, args.concorrencia
+            )
+            print(
+                f'{nome:>8}: {duracao:7.2f} s | '
+                f'{args.requisicoes / duracao:8.0f} inserts/s'
+            )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f'DROP SCHEMA {SCHEMA} CASCADE'))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
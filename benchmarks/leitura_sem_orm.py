@@ -0,0 +1,148 @@
+"""Compara o custo de uma página da listagem de livros em dois caminhos.
+
+- orm: entidades `Livro` (load_only) no identity map, validadas por
+  `LivroPublic` ao criar a página, passadas pelo response_model e
+  serializadas para dict e depois para JSON, como o FastAPI faz
+- core: tuplas de colunas em Core (`listagem_de_livros`), dicts validados
+  uma vez pelo modelo de saída e a página serializada direto em JSON
+
+Mede linhas por segundo e a memória alocada (pico do tracemalloc) por
+página, sem o total (DATABASE_COUNT_STRATEGY=omitted nos dois caminhos).
+As tabelas e os dados são criados dentro de uma transação desfeita no fim.
+
+Uso:
+    python -m benchmarks.leitura_sem_orm --paginas 500 --tamanhos 20 100
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from fastapi_pagination.api import set_page, set_params
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import load_only
+
+from madr_fast import paginacao
+from madr_fast.campos import paginas_de
+from madr_fast.consultas import listagem_de_livros
+from madr_fast.models import Livro, Romancista, table_registry
+from madr_fast.routers.livros import ordem_livros
+from madr_fast.schemas import LivroPublic, PaginaLivros, ParamsCursor
+from madr_fast.settings import Settings
+
+
+async def pagina_orm(session, params):
+    query = (
+        select(Livro)
+        .options(
+            load_only(Livro.id, Livro.titulo, Livro.ano, Livro.romancista_id)
+        )
+        .order_by(Livro.titulo)
+        .offset(params.size * (params.page - 1))
+        .limit(params.size)
+    )
+    livros = (await session.scalars(query)).all()
+    modelo = PaginaLivros[LivroPublic]
+    pagina = modelo.create(livros, params, total=None)
+
+    # serialize_response do FastAPI e render do JSONResponse
+    adaptador = TypeAdapter(modelo)
+    conteudo = adaptador.validate_python(pagina, from_attributes=True)
+    return json.dumps(
+        adaptador.dump_python(conteudo, mode='json', by_alias=True),
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+
+
+async def pagina_core(session, params):
+    with set_params(params), paginas_de(PaginaLivros, LivroPublic, ()):
+        pagina = await paginacao.paginar(
+            session, listagem_de_livros(), ordem_livros
+        )
+    return pagina.model_dump_json(by_alias=True).encode()
+
+
+MODOS = {'orm': pagina_orm, 'core': pagina_core}
+
+
+async def mede(conn, modo, tamanho, args):
+    gera = MODOS[modo]
+    # as primeiras páginas, para o OFFSET não pesar na medida
+    paginas = [
+        ParamsCursor(page=1 + i % 10, size=tamanho)
+        for i in range(args.paginas)
+    ]
+
+    # uma sessão por "requisição", como nas rotas
+    inicio = time.perf_counter()
+    for params in paginas:
+        async with AsyncSession(bind=conn) as session:
+            await gera(session, params)
+    duracao = time.perf_counter() - inicio
+
+    # memória em uma amostra de páginas (o tracemalloc deixa tudo lento)
+    picos = []
+    tracemalloc.start()
+    for params in paginas[: args.amostras]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        async with AsyncSession(bind=conn) as session:
+            await gera(session, params)
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return args.paginas * tamanho / duracao, sum(picos) / len(picos)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--livros', type=int, default=1_000)
+    parser.add_argument('--paginas', type=int, default=500)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--amostras', type=int, default=50)
+    args = parser.parse_args()
+
+    paginacao.settings.DATABASE_COUNT_STRATEGY = 'omitted'
+    engine = create_async_engine(Settings().DATABASE_URL)
+    async with engine.connect() as conn:
+        transacao = await conn.begin()
+        await conn.run_sync(table_registry.metadata.create_all)
+        romancista_id = await conn.scalar(
+            insert(Romancista)
+            .values(nome='romancista')
+            .returning(Romancista.id)
+        )
+        await conn.execute(
+            insert(Livro),
+            [
+                {
+                    'titulo': f'livro {i:06}',
+                    'ano': 2000,
+                    'romancista_id': romancista_id,
+                }
+                for i in range(args.livros)
+            ],
+        )
+
+        for tamanho in args.tamanhos:
+            with set_page(PaginaLivros[LivroPublic]):
+                for modo in MODOS:
+                    linhas, memoria = await mede(conn, modo, tamanho, args)
+                    print(
+                        f'{tamanho:>4} por página | {modo:>4}: '
+                        f'{linhas:9.0f} linhas/s, '
+                        f'{memoria / 1024:7.1f} KiB alocados/página'
+                    )
+
+        await transacao.rollback()
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Compara a latência de páginas profundas por número (OFFSET) e por cursor.
+
+- offset: ORDER BY titulo LIMIT 21 OFFSET (página - 1) * 20, como a
+  paginação por número
+- cursor: WHERE titulo > (último título da página anterior) ORDER BY
+  titulo LIMIT 21, o seek da paginação por cursor
+
+Só a consulta da página é medida (o total custa o mesmo nos dois modos).
+Os livros são criados em um schema próprio, removido no fim.
+
+Uso:
+    python -m benchmarks.paginacao_cursor --livros 1000000 --paginas 1 50000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from madr_fast.models import Livro, table_registry
+from madr_fast.routers.livros import ordem_livros
+from madr_fast.schemas import tamanho_pagina
+from madr_fast.settings import Settings
+
+SCHEMA = 'benchmark_paginacao_cursor'
+
+
+async def mede(conn, query, amostras):
+    duracoes = []
+    for _ in range(amostras):
+        inicio = time.perf_counter()
+        await conn.execute(query)
+        duracoes.append(time.perf_counter() - inicio)
+    return statistics.median(duracoes)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--livros', type=int, default=1_000_000)
+    parser.add_argument(
+        '--paginas', type=int, nargs='+', default=[1, 100, 5_000, 50_000]
+    )
+    parser.add_argument('--amostras', type=int, default=20)
+    args = parser.parse_args()
+
+    # search_path no schema do benchmark e sem o statement_timeout da
+    # aplicação, que cortaria os OFFSETs longos
+    engine = create_async_engine(
+        Settings().DATABASE_URL,
+        connect_args={'options': f'-c search_path={SCHEMA},public'},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}'))
+        await conn.run_sync(table_registry.metadata.create_all)
+        await conn.execute(
+            text("INSERT INTO romancistas (nome) VALUES ('romancista')")
+        )
+        await conn.execute(
+            text(
+                'INSERT INTO livros (titulo, ano, romancista_id)'
+                " SELECT 'livro ' || md5(i::text), 1900 + i % 125, 1"
+                ' FROM generate_series(1, CAST(:n AS int)) i'
+            ),
+            {'n': args.livros},
+        )
+    async with engine.connect() as conn:
+        await conn.execute(text('ANALYZE livros'))
+        await conn.commit()
+
+    try:
+        async with engine.connect() as conn:
+            livros = select(Livro).order_by(*ordem_livros)
+            for pagina in args.paginas:
+                inicio = (pagina - 1) * tamanho_pagina
+                por_offset = livros.offset(inicio).limit(tamanho_pagina + 1)
+
+                # o cursor guarda a chave da última linha da página anterior
+                por_cursor = livros.limit(tamanho_pagina + 1)
+                if inicio:
+                    chave = (
+                        await conn.execute(
+                            select(*ordem_livros)
+                            .order_by(*ordem_livros)
+                            .offset(inicio - 1)
+                            .limit(1)
+                        )
+                    ).one()
+                    por_cursor = por_cursor.where(
+                        tuple_(*ordem_livros) > tuple(chave)
+                    )
+
+                for modo, query in (
+                    ('offset', por_offset),
+                    ('cursor', por_cursor),
+                ):
+                    mediana = await mede(conn, query, args.amostras)
+                    print(
+                        f'página {pagina:>7} | {modo:>6}: '
+                        f'{mediana * 1000:9.2f} ms (mediana)'
+                    )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f'DROP SCHEMA {SCHEMA} CASCADE'))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
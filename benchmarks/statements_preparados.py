@@ -0,0 +1,99 @@
+"""Mede o custo por consulta das buscas por chave primária em três modos.
+
+- select: `select()` montado a cada chamada, sem prepare no servidor
+- lambda: `lambda_stmt` (SQL em cache no SQLAlchemy), sem prepare
+- lambda+prepare: `lambda_stmt` e `prepare_threshold` do psycopg
+
+As tabelas e os dados são criados dentro de uma transação desfeita no fim,
+então o benchmark pode rodar contra o banco de desenvolvimento.
+
+Uso:
+    python -m benchmarks.statements_preparados --consultas 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from madr_fast import consultas
+from madr_fast.models import Livro, Romancista, table_registry
+from madr_fast.settings import Settings
+
+MODOS = {
+    # nome: (lambda_stmt, prepare_threshold)
+    'select': (False, None),
+    'lambda': (True, None),
+    'lambda+prepare': (True, 0),
+}
+
+
+async def mede(url, modo, args):
+    usa_lambda, prepare_threshold = MODOS[modo]
+    consultas.settings.DATABASE_PREPARED_STATEMENTS = usa_lambda
+    engine = create_async_engine(
+        url, connect_args={'prepare_threshold': prepare_threshold}
+    )
+
+    async with engine.connect() as conn:
+        transacao = await conn.begin()
+        await conn.run_sync(table_registry.metadata.create_all)
+        romancista_id = await conn.scalar(
+            insert(Romancista)
+            .values(nome='romancista')
+            .returning(Romancista.id)
+        )
+        await conn.execute(
+            insert(Livro),
+            [
+                {
+                    'titulo': f'livro {i}',
+                    'ano': 2000,
+                    'romancista_id': romancista_id,
+                }
+                for i in range(args.livros)
+            ],
+        )
+        primeiro_id = await conn.scalar(Livro.__table__.select().limit(1))
+
+        inicio = time.perf_counter()
+        for i in range(args.consultas):
+            # uma sessão por "requisição", como nas rotas
+            async with AsyncSession(bind=conn) as session:
+                await session.scalar(
+                    consultas.livro_por_id(primeiro_id + i % args.livros)
+                )
+                await session.scalar(
+                    consultas.romancista_por_id(romancista_id)
+                )
+        duracao = time.perf_counter() - inicio
+
+        await transacao.rollback()
+
+    await engine.dispose()
+    return duracao / args.consultas
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--consultas', type=int, default=5000)
+    parser.add_argument('--livros', type=int, default=1000)
+    args = parser.parse_args()
+
+    url = Settings().DATABASE_URL
+    print(f'{args.consultas} requisições (2 buscas por chave primária cada)')
+
+    base = None
+    for modo in MODOS:
+        por_requisicao = await mede(url, modo, args)
+        base = base or por_requisicao
+        print(
+            f'{modo:>15}: {por_requisicao * 1e6:8.1f} µs/requisição '
+            f'({(1 - por_requisicao / base) * 100:5.1f}% de economia)'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
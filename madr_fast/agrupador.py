@@ -0,0 +1,139 @@
+import asyncio
+from collections import defaultdict
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_fast.database import engine, settings
+
+
+class AgrupadorDeEscritas:
+    """Agrupa INSERTs concorrentes em uma única transação (group commit).
+
+    Os INSERTs que chegam dentro da `janela` (segundos), até `max_lote`,
+    são gravados juntos, um INSERT de várias linhas por model, com um só
+    COMMIT. Se o lote viola alguma constraint, ele é refeito um a um em
+    SAVEPOINTs, então a violação falha só o seu chamador.
+    """
+
+    def __init__(self, _engine, janela: float, max_lote: int):
+        self.engine = _engine
+        self.janela = janela
+        self.max_lote = max_lote
+        self._pendentes = []
+        self._temporizador = None
+        self._tarefas = set()
+
+    async def insere(self, modelo, valores: dict):
+        """Insere `valores` em `modelo` no próximo lote e retorna o objeto."""
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._pendentes.append((modelo, valores, futuro))
+
+        if len(self._pendentes) >= self.max_lote:
+            self._dispara()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.janela, self._dispara)
+
+        return await futuro
+
+    def _dispara(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+        lote, self._pendentes = self._pendentes, []
+        tarefa = asyncio.create_task(self._grava(lote))
+        # mantém referência até o fim, senão a tarefa pode ser coletada
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _grava(self, lote):
+        try:
+            async with AsyncSession(
+                self.engine, expire_on_commit=False
+            ) as session:
+                try:
+                    resultados = await _insere_em_bloco(session, lote)
+                except IntegrityError:
+                    await session.rollback()
+                    resultados = await _insere_um_a_um(session, lote)
+                await session.commit()
+        except Exception as erro:
+            # conexão ou COMMIT falhou: ninguém do lote foi gravado
+            for *_, futuro in lote:
+                _resolve(futuro, erro=erro)
+            return
+
+        for (*_, futuro), resultado in zip(lote, resultados):
+            if isinstance(resultado, IntegrityError):
+                _resolve(futuro, erro=resultado)
+            else:
+                _resolve(futuro, resultado=resultado)
+
+
+async def _insere_em_bloco(session, lote):
+    # um INSERT ... VALUES (...), (...) RETURNING por model, na ordem do lote
+    indices = defaultdict(list)
+    for i, (modelo, _, _) in enumerate(lote):
+        indices[modelo].append(i)
+
+    resultados = [None] * len(lote)
+    for modelo, posicoes in indices.items():
+        objetos = await session.scalars(
+            insert(modelo).returning(modelo, sort_by_parameter_order=True),
+            [lote[i][1] for i in posicoes],
+        )
+        for i, objeto in zip(posicoes, objetos):
+            resultados[i] = objeto
+    return resultados
+
+
+async def _insere_um_a_um(session, lote):
+    # só o SAVEPOINT do INSERT que viola a constraint é desfeito
+    resultados = []
+    for modelo, valores, _ in lote:
+        try:
+            async with session.begin_nested():
+                resultados.append(
+                    await session.scalar(
+                        insert(modelo).values(**valores).returning(modelo)
+                    )
+                )
+        except IntegrityError as erro:
+            resultados.append(erro)
+    return resultados
+
+
+def _resolve(futuro, resultado=None, erro=None):
+    # o chamador pode ter desistido (requisição cancelada)
+    if futuro.done():
+        return
+    if erro is not None:
+        futuro.set_exception(erro)
+    else:
+        futuro.set_result(resultado)
+
+
+agrupador = (
+    AgrupadorDeEscritas(
+        engine,
+        janela=settings.DATABASE_GROUP_COMMIT_WINDOW,
+        max_lote=settings.DATABASE_GROUP_COMMIT_MAX_BATCH,
+    )
+    if settings.DATABASE_GROUP_COMMIT
+    else None
+)
+
+
+async def insere_e_confirma(session, modelo, valores: dict):
+    """INSERT ... RETURNING com COMMIT, no lote do agrupador se ativado."""
+    if agrupador is not None:
+        return await agrupador.insere(modelo, valores)
+
+    resultado = await session.scalar(
+        insert(modelo).values(**valores).returning(modelo)
+    )
+    await session.commit()
+    return resultado
@@ -1,24 +1,99 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 from http import HTTPStatus
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi_pagination import add_pagination
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
-from madr_fast.routers import auth, contas, livros, romancistas
+from madr_fast.autocompletar import (
+    carrega_do_primario,
+    recarrega_periodicamente,
+)
+from madr_fast.database import (
+    CONSULTA_CANCELADA,
+    e_memoria,
+    e_sqlite,
+    engine,
+    settings,
+)
+from madr_fast.models import table_registry
+from madr_fast.routers import auth, contas, interno, livros, romancistas
 from madr_fast.schemas import Message
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # SQLite em memória nasce vazio a cada processo: sem migrações, cria as
+    # tabelas direto dos models
+    if e_sqlite(settings.DATABASE_URL) and e_memoria(settings.DATABASE_URL):
+        async with engine.begin() as conn:
+            await conn.run_sync(table_registry.metadata.create_all)
+
+    # índices do autocompletar; se o banco não responder, a primeira busca
+    # por prefixo carrega
+    try:
+        await carrega_do_primario(engine)
+    except (SQLAlchemyError, OSError):
+        logging.getLogger(__name__).warning(
+            'índices do autocompletar não carregados na inicialização'
+        )
+
+    # recarga periódica em segundo plano, para ver as escritas dos outros
+    # workers
+    recarga = None
+    if settings.AUTOCOMPLETE_REFRESH_INTERVAL > 0:
+        recarga = asyncio.create_task(
+            recarrega_periodicamente(
+                engine, settings.AUTOCOMPLETE_REFRESH_INTERVAL
+            )
+        )
+    yield
+    if recarga is not None:
+        recarga.cancel()
+        with suppress(asyncio.CancelledError):
+            await recarga
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(contas.router)
 app.include_router(romancistas.router)
 app.include_router(livros.router)
 app.include_router(auth.router)
+app.include_router(interno.router)
 add_pagination(app)
 
 
+# * Erros do banco ---
+# consulta cancelada pelo statement_timeout da rota
+@app.exception_handler(OperationalError)
+async def consulta_cancelada(request: Request, exc: OperationalError):
+    if getattr(exc.orig, 'sqlstate', None) != CONSULTA_CANCELADA:
+        raise exc
+    return JSONResponse(
+        status_code=HTTPStatus.GATEWAY_TIMEOUT,
+        content={'detail': 'Consulta excedeu o tempo limite do MADR'},
+    )
+
+
+# pool esgotado: nenhuma conexão livre dentro do DATABASE_POOL_TIMEOUT
+@app.exception_handler(PoolTimeoutError)
+async def pool_esgotado(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+        content={'detail': 'MADR sobrecarregado, tente novamente'},
+        headers={'Retry-After': '1'},
+    )
+
+
 @app.get(
     '/',
     response_model=Message,
     status_code=HTTPStatus.OK,
     include_in_schema=False,
 )
-def read_root():
+async def read_root():
     return {'message': 'Bem-vindo!'}
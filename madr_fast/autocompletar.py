@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_fast.database import engine, le_de_replica, sem_prazo
+from madr_fast.models import Livro, Romancista
+
+
+class IndicePrefixos:
+    """Lista ordenada de (texto, id) em memória para buscas por prefixo.
+
+    Os textos já chegam normalizados (minúsculas, espaços simples) pelo
+    `valida_e_sanitiza` dos schemas. A busca é uma bisseção até o primeiro
+    texto >= prefixo, seguida dos vizinhos que começam com ele. Cada id
+    pode ter um grupo (o romancista de um livro), para remover em bloco o
+    que o ON DELETE CASCADE removeu no banco.
+
+    A carga lê um retrato do banco: as alterações feitas por este processo
+    desde `inicia_carga` (ou, antes da primeira carga, desde o início) são
+    registradas e reaplicadas sobre ele, senão se perderiam até a próxima.
+    """
+
+    def __init__(self):
+        self._chaves = []  # (texto, id), ordenada
+        self._entradas = {}  # id -> (texto, grupo)
+        self._alteracoes = []  # (método, *argumentos), None fora de cargas
+        self.carregado_em = None  # time.monotonic() da última carga
+
+    def __len__(self):
+        return len(self._chaves)
+
+    def inicia_carga(self):
+        if self._alteracoes is None:
+            self._alteracoes = []
+
+    def cancela_carga(self):
+        # sem nenhuma carga, continua registrando para a primeira
+        if self.carregado_em is not None:
+            self._alteracoes = None
+
+    def carrega(self, linhas):
+        """Substitui o conteúdo por `linhas` de (id, texto, grupo)."""
+        self._entradas = {id_: (texto, grupo) for id_, texto, grupo in linhas}
+        self._chaves = sorted(
+            (texto, id_) for id_, (texto, _) in self._entradas.items()
+        )
+        alteracoes, self._alteracoes = self._alteracoes or [], None
+        for metodo, *argumentos in alteracoes:
+            metodo(*argumentos)
+        self.carregado_em = time.monotonic()
+
+    def descarta(self):
+        self._chaves, self._entradas = [], {}
+        self._alteracoes = []
+        self.carregado_em = None
+
+    def adiciona(self, id_, texto, grupo=None):
+        self._registra(self.adiciona, id_, texto, grupo)
+        self._remove(id_)  # alteração: sai o texto antigo
+        insort(self._chaves, (texto, id_))
+        self._entradas[id_] = (texto, grupo)
+
+    def remove(self, id_):
+        self._registra(self.remove, id_)
+        self._remove(id_)
+
+    def remove_grupo(self, grupo):
+        self._registra(self.remove_grupo, grupo)
+        for id_ in [i for i, (_, g) in self._entradas.items() if g == grupo]:
+            self._remove(id_)
+
+    def _remove(self, id_):
+        entrada = self._entradas.pop(id_, None)
+        if entrada is not None:
+            del self._chaves[bisect_left(self._chaves, (entrada[0], id_))]
+
+    def _registra(self, *alteracao):
+        if self._alteracoes is not None:
+            self._alteracoes.append(alteracao)
+
+    def busca(self, prefixo, limite):
+        inicio = bisect_left(self._chaves, (prefixo,))
+        encontrados = []
+        for texto, id_ in self._chaves[inicio : inicio + limite]:
+            if not texto.startswith(prefixo):
+                break
+            encontrados.append((id_, texto))
+        return encontrados
+
+
+# um índice por processo: com vários workers, cada um tem o seu e vê as
+# escritas dos outros na recarga periódica, em segundo plano
+indice_livros = IndicePrefixos()
+indice_romancistas = IndicePrefixos()
+_carga = asyncio.Lock()
+logger = logging.getLogger(__name__)
+
+
+def normaliza_prefixo(prefixo):
+    # mesma forma dos textos guardados; o espaço final é mantido, ele
+    # separa 'dom ' de 'domingo'
+    return re.sub(r'\s+', ' ', prefixo.lower().lstrip())
+
+
+async def carrega_indices(session):
+    indices = (indice_livros, indice_romancistas)
+    for indice in indices:
+        indice.inicia_carga()
+    try:
+        livros = await session.execute(
+            select(Livro.id, Livro.titulo, Livro.romancista_id)
+        )
+        romancistas = await session.execute(
+            select(Romancista.id, Romancista.nome)
+        )
+    except BaseException:
+        for indice in indices:
+            indice.cancela_carga()
+        raise
+    indice_livros.carrega(livros.all())
+    indice_romancistas.carrega(
+        (id_, nome, None) for id_, nome in romancistas.all()
+    )
+
+
+async def carrega_do_primario(_engine):
+    # as tabelas inteiras, do primário (uma réplica atrasada perderia
+    # escritas) e sem o statement_timeout das rotas
+    with sem_prazo():
+        async with _carga, AsyncSession(_engine) as session:
+            await carrega_indices(session)
+
+
+async def recarrega_periodicamente(_engine, intervalo):
+    """Recarrega os índices a cada `intervalo` segundos (tarefa do lifespan).
+
+    A recarga fica fora das requisições: uma tecla nunca espera por ela.
+    """
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await carrega_do_primario(_engine)
+        except (SQLAlchemyError, OSError):
+            logger.warning('recarga dos índices do autocompletar falhou')
+
+
+async def garante_indices(session):
+    # carregados na inicialização; aqui só se a carga falhou (e a recarga
+    # periódica ainda não os trouxe)
+    if indice_livros.carregado_em is not None:
+        return
+    if le_de_replica(session):
+        await carrega_do_primario(engine)
+        return
+    async with _carga:
+        if indice_livros.carregado_em is None:
+            await carrega_indices(session)
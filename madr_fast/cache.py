@@ -0,0 +1,227 @@
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+
+from madr_fast.coalescencia import uma_vez
+
+# ausência de entrada (None pode ser um valor guardado)
+AUSENTE = object()
+
+
+@dataclass
+class EstatisticasCache:
+    acertos: int = 0
+    faltas: int = 0
+    despejos: int = 0  # entradas removidas pelo limite de tamanho
+    negativos: int = 0  # acertos em entradas negativas (CachePorId)
+
+
+class CacheTTL:
+    """Cache em memória do processo, com validade (TTL) e despejo LRU.
+
+    Com `max_bytes`, os valores (bytes ou str) também são limitados pela
+    soma dos seus tamanhos; um valor maior que o limite não é guardado.
+    `ao_remover(chave, valor)`, se definido, é chamado para cada entrada
+    que sai: invalidada, substituída, vencida, despejada ou limpa.
+    """
+
+    def __init__(self, max_itens, ttl, max_bytes=None):
+        self.max_itens = max_itens
+        self.ttl = ttl  # segundos
+        self.max_bytes = max_bytes
+        self.bytes = 0  # soma dos tamanhos, com max_bytes
+        self.estatisticas = EstatisticasCache()
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self.ao_remover = None
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def obtem(self, chave):
+        item = self._itens.get(chave)
+        if item is None or item[0] <= time.monotonic():
+            self.invalida(chave)
+            self.estatisticas.faltas += 1
+            return AUSENTE
+
+        self._itens.move_to_end(chave)  # usado por último
+        self.estatisticas.acertos += 1
+        return item[1]
+
+    def guarda(self, chave, valor, ttl=None):
+        if self.max_bytes is not None and len(valor) > self.max_bytes:
+            return  # despejaria todo o resto e a si mesmo
+
+        validade = self.ttl if ttl is None else ttl
+        self.invalida(chave)
+        self._itens[chave] = (time.monotonic() + validade, valor)
+        self.bytes += self._tamanho(valor)
+        while len(self._itens) > self.max_itens or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            # o usado há mais tempo
+            chave, (_, despejado) = self._itens.popitem(last=False)
+            self.bytes -= self._tamanho(despejado)
+            self.estatisticas.despejos += 1
+            self._removida(chave, despejado)
+
+    def invalida(self, chave):
+        item = self._itens.pop(chave, None)
+        if item is not None:
+            self.bytes -= self._tamanho(item[1])
+            self._removida(chave, item[1])
+
+    def limpa(self):
+        itens, self._itens = self._itens, OrderedDict()
+        self.bytes = 0
+        for chave, (_, valor) in itens.items():
+            self._removida(chave, valor)
+
+    def _removida(self, chave, valor):
+        if self.ao_remover is not None:
+            self.ao_remover(chave, valor)
+
+    def _tamanho(self, valor):
+        return 0 if self.max_bytes is None else len(valor)
+
+
+class SemCache:
+    """Armazenamento que não guarda nada: toda busca é uma falta."""
+
+    def __init__(self):
+        self.estatisticas = EstatisticasCache()
+
+    def __len__(self):
+        return 0
+
+    def __contains__(self, chave):
+        return False
+
+    def obtem(self, chave):
+        self.estatisticas.faltas += 1
+        return AUSENTE
+
+    def guarda(self, chave, valor, ttl=None):
+        pass
+
+    def invalida(self, chave):
+        pass
+
+    def limpa(self):
+        pass
+
+
+def cria_armazenamento(backend, max_itens, ttl):
+    if backend == 'none':
+        return SemCache()
+    return CacheTTL(max_itens, ttl)
+
+
+class CachePorId:
+    """Cache read-through por id, com entradas negativas para os ausentes.
+
+    O armazenamento é plugável: qualquer objeto com a interface do
+    CacheTTL (obtem, guarda, invalida, limpa, `in`, estatisticas e, com
+    grupos, ao_remover). Os valores
+    são dicts de colunas, ou None para os ids que não existem, guardados
+    por `ttl_negativo` segundos. Com `grupo` (valor -> grupo, ex.: o
+    romancista de um livro), as chaves guardadas por este processo são
+    agrupadas, para invalidar em bloco o que o ON DELETE CASCADE removeu;
+    uma chave sai do grupo quando sai do armazenamento.
+    Faltas simultâneas da mesma chave fazem uma só carga (coalescência), e
+    uma carga que cruza uma escrita da chave não guarda o que leu.
+    """
+
+    def __init__(self, armazenamento, ttl_negativo, grupo=None):
+        self.armazenamento = armazenamento
+        self.ttl_negativo = ttl_negativo
+        self.grupo = grupo
+        self._grupos = defaultdict(set)  # grupo -> chaves
+        self._cargas = {}  # chave -> marca da carga em andamento
+        if grupo:
+            armazenamento.ao_remover = self._desagrupa
+
+    def __len__(self):
+        return len(self.armazenamento)
+
+    @property
+    def estatisticas(self):
+        return self.armazenamento.estatisticas
+
+    async def obtem(self, chave, carrega, preenche=True):
+        """Valor da chave; numa falta, o de `await carrega()`, guardado.
+
+        Com `preenche=False` (ex.: leitura de uma réplica, que pode estar
+        atrasada), o valor carregado é devolvido sem ser guardado.
+        """
+        valor = self.armazenamento.obtem(chave)
+        if valor is None:
+            self.estatisticas.negativos += 1
+        if valor is not AUSENTE:
+            return valor
+
+        # a marca identifica a carga em andamento da chave: uma escrita a
+        # descarta, então a carga não guarda o valor (talvez anterior à
+        # escrita) e as faltas seguintes fazem uma carga nova
+        marca = self._cargas.setdefault(chave, object())
+        return await uma_vez(
+            (self, chave, marca, preenche),
+            lambda: self._carrega(chave, marca, carrega, preenche),
+        )
+
+    async def _carrega(self, chave, marca, carrega, preenche):
+        try:
+            valor = await carrega()
+        finally:
+            atual = self._cargas.get(chave) is marca
+            if atual:
+                del self._cargas[chave]
+
+        if not (preenche and atual):
+            return valor
+        if valor is None:
+            self.armazenamento.guarda(chave, valor, ttl=self.ttl_negativo)
+        else:
+            self._guarda(chave, valor)
+        return valor
+
+    def guarda(self, chave, valor):
+        """Grava o valor de uma escrita (cadastro ou alteração)."""
+        self._cargas.pop(chave, None)
+        self._guarda(chave, valor)
+
+    def _guarda(self, chave, valor):
+        self.armazenamento.guarda(chave, valor)
+        # só o que foi guardado (o armazenamento pode recusar o valor)
+        if self.grupo and chave in self.armazenamento:
+            self._grupos[self.grupo(valor)].add(chave)
+
+    def _desagrupa(self, chave, valor):
+        if valor is None:  # entrada negativa: sem grupo
+            return
+        grupo = self.grupo(valor)
+        chaves = self._grupos.get(grupo)
+        if chaves is not None:
+            chaves.discard(chave)
+            if not chaves:
+                del self._grupos[grupo]
+
+    def invalida(self, chave):
+        self._cargas.pop(chave, None)
+        self.armazenamento.invalida(chave)
+
+    def invalida_grupo(self, grupo):
+        # o grupo de uma chave em carga ainda não é conhecido: todas as
+        # cargas em andamento deixam de guardar
+        self._cargas.clear()
+        for chave in list(self._grupos.get(grupo, ())):
+            self.armazenamento.invalida(chave)  # e sai do grupo
+        self._grupos.pop(grupo, None)
+
+    def limpa(self):
+        self._cargas.clear()
+        self.armazenamento.limpa()
+        self._grupos.clear()
@@ -0,0 +1,63 @@
+from functools import cache
+
+from fastapi import Response
+from fastapi_pagination.api import set_page
+from pydantic import BaseModel, ConfigDict, create_model
+
+
+# * Campos esparsos (?campos=id,titulo) ---
+# a consulta lê só as colunas pedidas e a resposta sai de um modelo com só
+# esses campos, serializado direto: o response_model da rota exige todos
+def lista_campos(campos: str | None):
+    # sem repetição, na ordem pedida
+    return tuple(dict.fromkeys(campos.split(','))) if campos else ()
+
+
+# modelo de saída com os campos pedidos (sem os validadores de entrada do
+# modelo original, ex.: a sanitização do título)
+@cache
+def modelo_parcial(modelo, campos):
+    return create_model(
+        f'{modelo.__name__}Parcial',
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            nome: (campo.annotation, campo)
+            for nome, campo in modelo.model_fields.items()
+            if nome in campos
+        },
+    )
+
+
+# * Recursos relacionados ---
+# com ?expandir=/?incluir=, a saída é o modelo com o relacionado embutido
+# e os campos pedidos ganham os da relação (o nome dela e, com livros, o
+# livros_truncados)
+def com_relacao(modelo, campos, relacao, modelo_com_relacao):
+    if not relacao:
+        return modelo, campos
+    extras = tuple(
+        campo
+        for campo in modelo_com_relacao.model_fields
+        if campo not in modelo.model_fields
+    )
+    return modelo_com_relacao, (*campos, *extras) if campos else ()
+
+
+# * Listagens ---
+# as páginas criadas no bloco validam os itens (dicts das linhas) uma vez,
+# pelo modelo de saída; com responde, a página é serializada sem passar de
+# novo pelo response_model
+def paginas_de(pagina, modelo, campos):
+    campos = campos or tuple(modelo.model_fields)
+    return set_page(pagina[modelo_parcial(modelo, campos)])
+
+
+def responde(conteudo, modelo, campos):
+    if not isinstance(conteudo, BaseModel):  # entidade da busca por id
+        campos = campos or tuple(modelo.model_fields)
+        conteudo = modelo_parcial(modelo, campos).model_validate(
+            conteudo, from_attributes=True
+        )
+    return Response(
+        conteudo.model_dump_json(by_alias=True), media_type='application/json'
+    )
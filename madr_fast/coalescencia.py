@@ -0,0 +1,84 @@
+import asyncio
+from dataclasses import dataclass
+
+from madr_fast.settings import Settings
+
+settings = Settings()
+
+
+@dataclass
+class EstatisticasCoalescencia:
+    execucoes: int = 0  # execuções de fato (uma por grupo de chamadas)
+    coalescidas: int = 0  # chamadas que receberam o resultado de outra
+
+
+class Coalescedor:
+    """Junta chamadas simultâneas com a mesma chave em uma execução.
+
+    A primeira chamada de uma chave executa `gera`; as que chegam enquanto
+    ela está em andamento esperam e recebem o mesmo resultado, ou a mesma
+    exceção (ex.: o 404). Se a primeira é cancelada (o cliente desistiu),
+    a próxima que esperava executa no lugar dela.
+    """
+
+    def __init__(self):
+        self.estatisticas = EstatisticasCoalescencia()
+        self._em_andamento = {}  # chave -> futuro do resultado
+
+    def __len__(self):
+        return len(self._em_andamento)
+
+    async def executa(self, chave, gera):
+        """Resultado de `await gera()`, compartilhado pelas simultâneas."""
+        futuro = self._em_andamento.get(chave)
+        if futuro is not None:
+            self.estatisticas.coalescidas += 1
+            try:
+                # shield: o cancelamento desta chamada não cancela as outras
+                return await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise  # esta chamada foi cancelada
+            self.estatisticas.coalescidas -= 1
+            return await self.executa(chave, gera)
+
+        futuro = asyncio.get_running_loop().create_future()
+        # exceção sem ninguém esperando não é um erro não tratado
+        futuro.add_done_callback(_consome)
+        self._em_andamento[chave] = futuro
+        self.estatisticas.execucoes += 1
+        try:
+            resultado = await gera()
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as erro:
+            futuro.set_exception(erro)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            del self._em_andamento[chave]
+
+
+def _consome(futuro):
+    if not futuro.cancelled():
+        futuro.exception()
+
+
+# um por processo: junta as requisições de um worker, não as de workers
+# diferentes
+coalescedor = Coalescedor()
+
+
+async def uma_vez(chave, gera):
+    """`await gera()`, em uma execução por chave se a coalescência está ativa.
+
+    A chave precisa identificar tudo que muda o resultado (a rota, os
+    parâmetros e a geração das tabelas lidas), senão uma requisição recebe
+    o resultado de outra.
+    """
+    if not settings.REQUEST_COALESCING:
+        return await gera()
+    return await coalescedor.executa(chave, gera)
@@ -0,0 +1,86 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+
+from fastapi import Request, Response
+
+from madr_fast.settings import Settings
+
+settings = Settings()
+
+
+# * ETag e Last-Modified ---
+# buscas por id: o ETag vem do id, do update_at e dos campos pedidos, e o
+# GET condicional é respondido com uma consulta só do update_at; listagens
+# e respostas com recursos embutidos: o ETag é o hash do corpo
+def etag_de(*partes):
+    return _etag('|'.join(map(str, partes)).encode())
+
+
+def e_condicional(request: Request):
+    return any(
+        cabecalho in request.headers
+        for cabecalho in ('if-none-match', 'if-modified-since')
+    )
+
+
+def nao_modificado(request: Request, etag, modificado_em=None):
+    # If-None-Match tem precedência; a comparação é a fraca (ignora W/)
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        etags = {
+            parte.strip().removeprefix('W/')
+            for parte in if_none_match.split(',')
+        }
+        return '*' in etags or etag in etags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or modificado_em is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False  # data inválida: o cabeçalho é ignorado
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    # a data HTTP tem resolução de segundos
+    return _utc(modificado_em).replace(microsecond=0) <= desde
+
+
+def cabecalhos(etag, modificado_em=None):
+    valores = {'ETag': etag}
+    if modificado_em is not None:
+        valores['Last-Modified'] = format_datetime(
+            _utc(modificado_em), usegmt=True
+        )
+    if settings.HTTP_CACHE_CONTROL:
+        valores['Cache-Control'] = settings.HTTP_CACHE_CONTROL
+    return valores
+
+
+def resposta_304(etag, modificado_em=None):
+    return Response(
+        status_code=HTTPStatus.NOT_MODIFIED,
+        headers=cabecalhos(etag, modificado_em),
+    )
+
+
+def condicional(request: Request, resposta, etag=None, modificado_em=None):
+    """Acrescenta os validadores à resposta, ou a troca por um 304."""
+    etag = etag or _etag(resposta.body)
+    if nao_modificado(request, etag, modificado_em):
+        return resposta_304(etag, modificado_em)
+    resposta.headers.update(cabecalhos(etag, modificado_em))
+    return resposta
+
+
+def _etag(conteudo):
+    return f'"{hashlib.blake2b(conteudo, digest_size=16).hexdigest()}"'
+
+
+def _utc(momento):
+    # update_at vem sem fuso (timestamp do banco, em UTC)
+    if momento.tzinfo is None:
+        return momento.replace(tzinfo=timezone.utc)
+    return momento.astimezone(timezone.utc)
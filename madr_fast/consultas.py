@@ -0,0 +1,256 @@
+from sqlalchemy import (
+    case,
+    cast,
+    func,
+    lambda_stmt,
+    literal,
+    null,
+    or_,
+    select,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+
+from madr_fast.cache import CachePorId, cria_armazenamento
+from madr_fast.database import le_de_replica
+from madr_fast.models import Livro, Romancista, Usuario
+from madr_fast.settings import Settings
+
+settings = Settings()
+
+# tabelas, para as listagens em Core (tuplas de colunas, sem entidades)
+livros = Livro.__table__
+romancistas = Romancista.__table__
+
+
+# * Consultas quentes ---
+# com DATABASE_PREPARED_STATEMENTS as consultas viram lambda_stmt: o
+# SQLAlchemy reaproveita o SQL compilado sem reconstruir o select, e o
+# psycopg prepara o statement no servidor (sem parse/plan a cada chamada)
+def livro_por_id(livro_id: int):
+    if settings.DATABASE_PREPARED_STATEMENTS:
+        return lambda_stmt(lambda: select(Livro).where(Livro.id == livro_id))
+    return select(Livro).where(Livro.id == livro_id)
+
+
+def romancista_por_id(romancista_id: int):
+    if settings.DATABASE_PREPARED_STATEMENTS:
+        return lambda_stmt(
+            lambda: select(Romancista).where(Romancista.id == romancista_id)
+        )
+    return select(Romancista).where(Romancista.id == romancista_id)
+
+
+def usuario_por_email(email: str):
+    if settings.DATABASE_PREPARED_STATEMENTS:
+        return lambda_stmt(
+            lambda: select(Usuario).where(Usuario.email == email)
+        )
+    return select(Usuario).where(Usuario.email == email)
+
+
+# * Listagens ---
+# select em Core das colunas de LivroPublic (ou das pedidas em ?campos=):
+# as linhas vêm como tuplas, sem entidades no identity map, e os índices
+# das ordenações cobrem as colunas (a página sai de um index-only scan);
+# filtros e ordens usam as colunas das tabelas, para não passar pelo ORM
+# as chaves (id, romancista_id) vêm mesmo fora de ?campos=, para embutir
+# os recursos relacionados; a saída fica só com os campos pedidos
+def listagem_de_livros(campos=()):
+    campos = campos or ('titulo', 'ano')
+    colunas = dict.fromkeys((*campos, 'id', 'romancista_id'))
+    return select(*(livros.c[coluna] for coluna in colunas))
+
+
+def listagem_de_romancistas(campos=()):
+    campos = campos or ('nome',)
+    colunas = dict.fromkeys((*campos, 'id'))
+    return select(*(romancistas.c[coluna] for coluna in colunas))
+
+
+# * Cache por id ---
+# as buscas por id leem do cache (read-through) os dados da listagem padrão
+# da entidade, ou None para ids que não existem (entrada negativa, com TTL
+# menor); as escritas guardam o novo valor ou invalidam a entrada
+def _cache_por_id(grupo=None):
+    return CachePorId(
+        cria_armazenamento(
+            settings.OBJECT_CACHE_BACKEND,
+            settings.OBJECT_CACHE_SIZE,
+            settings.OBJECT_CACHE_TTL,
+        ),
+        settings.OBJECT_CACHE_NEGATIVE_TTL,
+        grupo=grupo,
+    )
+
+
+# livros agrupados por romancista: removidos em cascata com ele
+livros_por_id = _cache_por_id(grupo=lambda livro: livro['romancista_id'])
+romancistas_por_id = _cache_por_id()
+
+
+def dados_publicos(entidade):
+    # as colunas da listagem padrão, as mesmas dos itens das páginas, e o
+    # update_at, para o ETag e o Last-Modified
+    listagem = (
+        listagem_de_livros()
+        if isinstance(entidade, Livro)
+        else listagem_de_romancistas()
+    )
+    return {
+        **{
+            coluna: getattr(entidade, coluna)
+            for coluna in listagem.selected_columns.keys()
+        },
+        'update_at': entidade.update_at,
+    }
+
+
+def atualizado_em(tabela, id_: int):
+    # GET condicional: só o update_at, pela chave primária
+    return select(tabela.c.update_at).where(tabela.c.id == id_)
+
+
+# o cache é preenchido só por leituras do primário (e pelas escritas): o
+# que uma réplica atrasada leu duraria no cache o TTL inteiro, além do
+# atraso, e furaria a janela de read-your-writes
+async def livro_em_cache(session, livro_id: int):
+    async def carrega():
+        livro = await session.scalar(livro_por_id(livro_id))
+        return livro and dados_publicos(livro)
+
+    return await livros_por_id.obtem(
+        livro_id, carrega, preenche=not le_de_replica(session)
+    )
+
+
+async def romancista_em_cache(session, romancista_id: int):
+    async def carrega():
+        romancista = await session.scalar(romancista_por_id(romancista_id))
+        return romancista and dados_publicos(romancista)
+
+    return await romancistas_por_id.obtem(
+        romancista_id, carrega, preenche=not le_de_replica(session)
+    )
+
+
+# * Recursos relacionados ---
+# ?expandir=romancista e ?incluir=livros nas listagens: um SELECT ... IN com
+# as chaves dos itens da página (como o selectinload), qualquer que seja o
+# tamanho dela
+async def anexa_romancistas(session, itens):
+    if not itens:
+        return
+    ids = list({item['romancista_id'] for item in itens})
+    linhas = await session.execute(
+        listagem_de_romancistas().where(romancistas.c.id.in_(ids))
+    )
+    por_id = {linha.id: linha._asdict() for linha in linhas}
+    for item in itens:
+        # removido entre a página e este SELECT (com os livros, em cascata):
+        # null, em vez de derrubar a página inteira
+        item['romancista'] = por_id.get(item['romancista_id'])
+
+
+# os livros de cada romancista limitados a EMBED_LIVROS_LIMIT pelo título,
+# com row_number() por romancista; um a mais indica que há outros
+async def anexa_livros(session, itens):
+    if not itens:
+        return
+    limite = settings.EMBED_LIVROS_LIMIT
+    por_romancista = {
+        item['id']: item.setdefault('livros', []) for item in itens
+    }
+    numerados = (
+        listagem_de_livros()
+        .add_columns(
+            func.row_number()
+            .over(
+                partition_by=livros.c.romancista_id,
+                order_by=livros.c.titulo,
+            )
+            .label('posicao')
+        )
+        .where(livros.c.romancista_id.in_(list(por_romancista)))
+        .subquery()
+    )
+    colunas = listagem_de_livros().selected_columns.keys()
+    linhas = await session.execute(
+        select(*(numerados.c[coluna] for coluna in colunas))
+        .where(numerados.c.posicao <= limite + 1)
+        .order_by(numerados.c.romancista_id, numerados.c.posicao)
+    )
+    for linha in linhas:
+        por_romancista[linha.romancista_id].append(linha._asdict())
+
+    for item in itens:
+        item['livros_truncados'] = len(item['livros']) > limite
+        del item['livros'][limite:]
+
+
+# * Busca textual ---
+# retorna a consulta (uma listagem de livros) e a ordem da paginação
+def busca_textual(q: str, dialeto: str, campos=()):
+    query = listagem_de_livros(campos)
+
+    # Postgres: vetor_busca (título peso A, nome peso B) contra a consulta
+    # em português sem acentos, ordenada pela relevância
+    if dialeto == 'postgresql':
+        consulta = func.websearch_to_tsquery('portuguese', func.unaccent(q))
+        vetor = livros.c.vetor_busca
+        # ts_rank_cd devolve real (float4); o cursor guarda o valor como
+        # double, e sem o cast a comparação com o float4 pularia empates
+        relevancia = cast(func.ts_rank_cd(vetor, consulta), DOUBLE_PRECISION)
+        query = query.where(vetor.bool_op('@@')(consulta))
+        return query, (relevancia.desc(), livros.c.id)
+
+    # demais bancos (SQLite): todos os termos no título ou no nome, sem
+    # stemming nem ranking
+    termos = q.lower().split()
+    query = query.join_from(livros, romancistas).where(
+        *(
+            or_(
+                livros.c.titulo.contains(termo),
+                romancistas.c.nome.contains(termo),
+            )
+            for termo in termos
+        )
+    )
+    return query, (livros.c.id,)
+
+
+# * Facetas ---
+# colunas agrupadas por faceta em ?facetas=
+colunas_facetas = {'ano': livros.c.ano, 'romancista': livros.c.romancista_id}
+
+
+# linhas (faceta, valor, total): faceta é a posição em `facetas`, ou -1 no
+# total das linhas contadas; só as primeiras `limite` linhas do filtro
+# entram nas contagens
+def contagem_de_facetas(query, facetas, limite: int, dialeto: str):
+    filtradas = select(*(colunas_facetas[faceta] for faceta in facetas))
+    if query.whereclause is not None:
+        filtradas = filtradas.where(query.whereclause)
+    filtradas = filtradas.limit(limite).cte('filtradas')
+    colunas = list(filtradas.c)
+
+    # Postgres: todas as facetas e o total em um GROUP BY GROUPING SETS;
+    # grouping(coluna) = 0 nas linhas do conjunto daquela coluna
+    if dialeto == 'postgresql':
+        faceta = case(
+            *((func.grouping(c) == 0, i) for i, c in enumerate(colunas)),
+            else_=-1,
+        )
+        return select(faceta, func.coalesce(*colunas), func.count()).group_by(
+            func.grouping_sets(*colunas, tuple_())
+        )
+
+    # demais bancos (SQLite): um GROUP BY por faceta, unidos
+    return union_all(
+        *(
+            select(literal(i), c, func.count()).group_by(c)
+            for i, c in enumerate(colunas)
+        ),
+        select(literal(-1), null(), func.count()).select_from(filtradas),
+    )
@@ -1,11 +1,346 @@
-from sqlalchemy import create_engine
+import itertools
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+from sqlalchemy import event, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from madr_fast.settings import Settings
 
-engine = create_engine(Settings().DATABASE_URL)
+settings = Settings()
+
+# SQLSTATE das violações de integridade levantadas pelo banco
+VIOLACAO_UNICA = '23505'
+VIOLACAO_CHAVE_ESTRANGEIRA = '23503'
+# SQLSTATE de consulta cancelada pelo statement_timeout
+CONSULTA_CANCELADA = '57014'
+# o SQLite não tem SQLSTATE: traduz o nome do erro estendido
+VIOLACOES_SQLITE = {
+    'SQLITE_CONSTRAINT_UNIQUE': VIOLACAO_UNICA,
+    'SQLITE_CONSTRAINT_FOREIGNKEY': VIOLACAO_CHAVE_ESTRANGEIRA,
+}
+
+
+@dataclass
+class EstatisticasPool:
+    checkouts: int = 0
+    checkins: int = 0
+    timeouts: int = 0
+    pico_em_uso: int = 0
+    espera_total: float = 0.0  # segundos
+    espera_max: float = 0.0  # segundos
+
+
+class PoolMonitorado(AsyncAdaptedQueuePool):
+    """Pool que mede a espera por conexão e conta os timeouts de checkout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estatisticas = EstatisticasPool()
+
+    def recreate(self):
+        # mantém as estatísticas quando o engine recria o pool (dispose)
+        pool = super().recreate()
+        pool.estatisticas = self.estatisticas
+        return pool
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.estatisticas.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            self.estatisticas.espera_total += espera
+            self.estatisticas.espera_max = max(
+                self.estatisticas.espera_max, espera
+            )
+
+
+def e_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def e_memoria(url):
+    return make_url(url).database in {None, '', ':memory:'}
+
+
+def cria_engine(url, **opcoes):
+    if e_sqlite(url):
+        _engine = _cria_engine_sqlite(url, **opcoes)
+    else:
+        _engine = _cria_engine_postgres(url, **opcoes)
+
+    # eventos do pool alimentam os contadores de checkout/checkin
+    @event.listens_for(_engine.sync_engine, 'checkout')
+    def _conta_checkout(*_):
+        estatisticas = _engine.pool.estatisticas
+        estatisticas.checkouts += 1
+        estatisticas.pico_em_uso = max(
+            estatisticas.pico_em_uso, _engine.pool.checkedout()
+        )
+
+    @event.listens_for(_engine.sync_engine, 'checkin')
+    def _conta_checkin(*_):
+        _engine.pool.estatisticas.checkins += 1
+
+    return _engine
+
+
+def _cria_engine_postgres(url, **opcoes):
+    opcoes = {
+        'pool_size': settings.DATABASE_POOL_SIZE,
+        'max_overflow': settings.DATABASE_MAX_OVERFLOW,
+        'pool_timeout': settings.DATABASE_POOL_TIMEOUT,
+        'pool_recycle': settings.DATABASE_POOL_RECYCLE,
+        'pool_pre_ping': settings.DATABASE_POOL_PRE_PING,
+        **opcoes,
+    }
+    # o psycopg prepara no servidor após N execuções do mesmo SQL (5, se
+    # nada for dito); desligado, None não prepara nenhum
+    opcoes.setdefault('connect_args', {}).setdefault(
+        'prepare_threshold',
+        settings.DATABASE_PREPARE_THRESHOLD
+        if settings.DATABASE_PREPARED_STATEMENTS
+        else None,
+    )
+    if settings.DATABASE_STATEMENT_TIMEOUT:
+        # prazo padrão fixado na conexão, sem custo extra por transação
+        opcoes.setdefault('connect_args', {})['options'] = (
+            f'-c statement_timeout={settings.DATABASE_STATEMENT_TIMEOUT}'
+        )
+
+    return create_async_engine(url, poolclass=PoolMonitorado, **opcoes)
+
+
+# nomes dos bancos em memória: um banco por engine
+_bancos_em_memoria = itertools.count()
+
+
+def _cria_engine_sqlite(url, somente_leitura=False, **opcoes):
+    pragmas = [
+        'foreign_keys = ON',  # FOREIGN KEY e ON DELETE CASCADE
+        'case_sensitive_like = ON',  # LIKE do contains igual ao Postgres
+    ]
+
+    opcoes = {
+        'poolclass': PoolMonitorado,
+        'pool_timeout': settings.DATABASE_POOL_TIMEOUT,
+        **opcoes,
+    }
+    memoria = e_memoria(url)
+    if memoria or not somente_leitura:
+        # um só escritor: as escritas esperam na fila do pool em vez de
+        # disputar o lock do arquivo (SQLITE_BUSY) ou, em memória, o das
+        # tabelas do cache compartilhado (SQLITE_LOCKED)
+        opcoes.setdefault('pool_size', 1)
+        opcoes.setdefault('max_overflow', 0)
+
+    ancora = None
+    if memoria:
+        # banco em memória nomeado e compartilhado: cada sessão usa a sua
+        # conexão, com a sua transação, e a âncora mantém o banco vivo
+        # enquanto o pool fecha e reabre as outras
+        nome = f'file:madr-{next(_bancos_em_memoria)}'
+        url = make_url(url).set(
+            database=nome,
+            query={'mode': 'memory', 'cache': 'shared', 'uri': 'true'},
+        )
+        ancora = sqlite3.connect(f'{nome}?mode=memory&cache=shared', uri=True)
+        opcoes.setdefault('connect_args', {'check_same_thread': False})
+    else:
+        pragmas += [
+            'journal_mode = WAL',  # leitores não bloqueiam o escritor
+            'synchronous = NORMAL',  # fsync só nos checkpoints do WAL
+            f'mmap_size = {settings.DATABASE_SQLITE_MMAP_SIZE}',
+            f'busy_timeout = {int(settings.DATABASE_POOL_TIMEOUT * 1000)}',
+        ]
+        if somente_leitura:
+            pragmas.append('query_only = ON')
+
+    _engine = create_async_engine(url, **opcoes)
+    _engine.sync_engine.ancora = ancora
+
+    @event.listens_for(_engine.sync_engine, 'connect')
+    def _configura_conexao(dbapi_connection, _):
+        # o driver abre transações por conta própria e atrapalha SAVEPOINTs;
+        # o BEGIN passa a ser emitido pelo SQLAlchemy (evento begin)
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+
+    @event.listens_for(_engine.sync_engine, 'begin')
+    def _inicia_transacao(conn):
+        conn.exec_driver_sql('BEGIN')
+
+    return _engine
+
+
+def resumo_pool(_engine):
+    pool = _engine.pool
+    estatisticas = pool.estatisticas
+    tentativas = estatisticas.checkouts + estatisticas.timeouts
+    return {
+        'tamanho': pool.size(),
+        'em_uso': pool.checkedout(),
+        'ociosas': pool.checkedin(),
+        'overflow_em_uso': max(pool.overflow(), 0),
+        'pico_em_uso': estatisticas.pico_em_uso,
+        'checkouts': estatisticas.checkouts,
+        'checkins': estatisticas.checkins,
+        'timeouts': estatisticas.timeouts,
+        'espera_media_ms': (
+            estatisticas.espera_total / tentativas * 1000
+            if tentativas
+            else 0.0
+        ),
+        'espera_max_ms': estatisticas.espera_max * 1000,
+    }
+
+
+# prazo (ms) definido pela rota da requisição atual, se houver
+_prazo_ms: ContextVar[int | None] = ContextVar('prazo_ms', default=None)
+
+
+def prazo(ms: int):
+    """Dependência que troca o statement_timeout das consultas da rota."""
+
+    async def define_prazo():
+        _prazo_ms.set(ms)
+
+    return define_prazo
+
+
+@contextmanager
+def sem_prazo():
+    """Consultas do bloco sem statement_timeout (cargas em segundo plano)."""
+    token = _prazo_ms.set(0)
+    try:
+        yield
+    finally:
+        _prazo_ms.reset(token)
+
+
+@event.listens_for(Session, 'after_begin')
+def _aplica_prazo(session, transaction, connection):
+    # SET LOCAL vale só até o fim da transação, então a conexão volta ao
+    # pool com o prazo padrão
+    ms = _prazo_ms.get()
+    if ms is not None and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(ms)}')
+
+
+def tipo_de_violacao(erro: IntegrityError):
+    # as escritas confiam nas constraints do banco (UNIQUE/FOREIGN KEY) em
+    # vez de consultar antes; o SQLSTATE diz qual delas falhou
+    sqlstate = getattr(erro.orig, 'sqlstate', None)
+    if sqlstate is None:
+        return VIOLACOES_SQLITE.get(getattr(erro.orig, 'sqlite_errorname', ''))
+    return sqlstate
+
+
+class RoteadorDeLeitura:
+    """Escolhe o engine das rotas de leitura entre as réplicas."""
+
+    def __init__(
+        self, primario, replicas, estrategia='round_robin', janela=0.0
+    ):
+        self.primario = primario
+        self.replicas = list(replicas)
+        self.estrategia = estrategia
+        self.janela = janela
+        self._rodizio = itertools.cycle(self.replicas)
+
+    def escolhe(self, ultima_escrita: float | None = None):
+        # sem réplicas, ou cliente dentro da janela de read-your-writes
+        if not self.replicas:
+            return self.primario
+        if ultima_escrita is not None and (
+            time.time() - ultima_escrita < self.janela
+        ):
+            return self.primario
+
+        if self.estrategia == 'least_connections':
+            return min(self.replicas, key=lambda r: r.pool.checkedout())
+        return next(self._rodizio)
+
+
+# cookie com o instante da última escrita do cliente
+COOKIE_ULTIMA_ESCRITA = 'madr_ultima_escrita'
+METODOS_DE_LEITURA = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def ultima_escrita(request: Request):
+    try:
+        return float(request.cookies[COOKIE_ULTIMA_ESCRITA])
+    except (KeyError, ValueError):
+        return None
+
+
+def marca_escrita(request: Request, response: Response):
+    # marca o cliente antes da escrita; se ela falhar, o pior caso é ler do
+    # primário durante a janela
+    janela = settings.DATABASE_READ_YOUR_WRITES
+    if janela > 0 and request.method not in METODOS_DE_LEITURA:
+        response.set_cookie(
+            COOKIE_ULTIMA_ESCRITA,
+            str(time.time()),
+            max_age=math.ceil(janela),
+            httponly=True,
+        )
+
+
+engine = cria_engine(settings.DATABASE_URL)
+replicas = [cria_engine(url) for url in settings.DATABASE_REPLICA_URLS]
+if (
+    not replicas
+    and e_sqlite(settings.DATABASE_URL)
+    and not e_memoria(settings.DATABASE_URL)
+):
+    # SQLite em WAL: as rotas GET leem do mesmo arquivo por um pool próprio,
+    # somente leitura, sem esperar pelo único escritor
+    replicas = [cria_engine(settings.DATABASE_URL, somente_leitura=True)]
+roteador = RoteadorDeLeitura(
+    engine,
+    replicas,
+    estrategia=settings.DATABASE_REPLICA_STRATEGY,
+    janela=settings.DATABASE_READ_YOUR_WRITES,
+)
+
+
+def le_de_replica(session):
+    """Se a sessão lê de uma réplica (DATABASE_REPLICA_URLS), talvez atrasada.
+
+    O pool somente leitura do SQLite lê o mesmo arquivo do primário.
+    """
+    return bool(settings.DATABASE_REPLICA_URLS) and any(
+        session.bind is replica for replica in replicas
+    )
+
+
+async def get_session(
+    request: Request, response: Response
+):  # pragma: no cover
+    marca_escrita(request, response)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
 
 
-def get_session():  # pragma: no cover
-    with Session(engine) as session:
+async def get_read_session(request: Request):  # pragma: no cover
+    # rotas somente leitura: réplica (ou primário, ver RoteadorDeLeitura)
+    _engine = roteador.escolhe(ultima_escrita(request))
+    async with AsyncSession(_engine, expire_on_commit=False) as session:
         yield session
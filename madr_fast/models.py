@@ -1,10 +1,62 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import (
+    DDL,
+    DateTime,
+    FetchedValue,
+    ForeignKey,
+    Index,
+    Text,
+    event,
+    func,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
+from sqlalchemy.sql.expression import FunctionElement
 
 table_registry = registry()
 
+# índices de trigramas (buscas contains) dependem da extensão pg_trgm e a
+# busca textual, da unaccent
+for extensao in ('pg_trgm', 'unaccent'):
+    event.listen(
+        table_registry.metadata,
+        'before_create',
+        DDL(f'CREATE EXTENSION IF NOT EXISTS {extensao}').execute_if(
+            dialect='postgresql'
+        ),
+    )
+
+
+# now() do banco; no SQLite, o CURRENT_TIMESTAMP tem resolução de segundos
+# e duas escritas no mesmo segundo teriam o mesmo update_at (e o mesmo
+# ETag): lá o horário vem com milissegundos
+class agora(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(agora)
+def _agora(_elemento, compilador, **opcoes):
+    return compilador.process(func.now(), **opcoes)
+
+
+@compiles(agora, 'sqlite')
+def _agora_sqlite(_elemento, _compilador, **_opcoes):
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def indice_trigram(tabela, coluna):
+    # GIN com gin_trgm_ops atende LIKE '%x%' (o contains); só no Postgres,
+    # no SQLite a busca continua varrendo a tabela
+    return Index(
+        f'ix_{tabela}_{coluna}_trgm',
+        coluna,
+        postgresql_using='gin',
+        postgresql_ops={coluna: 'gin_trgm_ops'},
+    ).ddl_if(dialect='postgresql')
+
 
 @table_registry.mapped_as_dataclass
 class Usuario:
@@ -16,50 +68,144 @@ class Usuario:
     email: Mapped[str] = mapped_column(unique=True)
 
     created_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now()
+        init=False, server_default=agora()
     )
     update_at: Mapped[datetime] = mapped_column(
-        init=False, onupdate=func.now(), server_default=func.now()
+        init=False, onupdate=agora(), server_default=agora()
     )
 
 
 @table_registry.mapped_as_dataclass
 class Romancista:
     __tablename__ = 'romancistas'
+    __table_args__ = (indice_trigram('romancistas', 'nome'),)
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     nome: Mapped[str] = mapped_column(unique=True)
 
     created_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now()
+        init=False, server_default=agora()
     )
     update_at: Mapped[datetime] = mapped_column(
-        init=False, onupdate=func.now(), server_default=func.now()
+        init=False, onupdate=agora(), server_default=agora()
     )
 
-    # relacao
+    # relacao (livros são removidos pelo ON DELETE CASCADE do banco)
     livros: Mapped[list['Livro']] = relationship(
-        init=False, back_populates='romancista', cascade='all, delete-orphan'
+        init=False,
+        back_populates='romancista',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+        order_by='Livro.titulo',
     )
 
 
 @table_registry.mapped_as_dataclass
 class Livro:
     __tablename__ = 'livros'
+    __table_args__ = (
+        indice_trigram('livros', 'titulo'),
+        Index(
+            'ix_livros_vetor_busca', 'vetor_busca', postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
+        # filtros seguidos da ordem das listagens (título): o seek da
+        # paginação por cursor continua no mesmo índice
+        Index('ix_livros_romancista_id_titulo', 'romancista_id', 'titulo'),
+        # um índice por ordenar_por da busca por query, com as demais
+        # colunas públicas no INCLUDE: filtro de ano, ordem e página saem
+        # de um index-only scan, sem Sort nem leitura da tabela. Por id, a
+        # ordem vem da chave primária, mas não é index-only: o filtro de
+        # ano e as colunas da página são lidos da tabela, linha a linha
+        Index(
+            'ix_livros_ano_titulo',
+            'ano',
+            'titulo',
+            postgresql_include=['id', 'romancista_id'],
+        ),
+        Index(
+            'ix_livros_titulo_cobertura',
+            'titulo',
+            postgresql_include=['ano', 'id', 'romancista_id'],
+        ).ddl_if(dialect='postgresql'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     titulo: Mapped[str] = mapped_column(unique=True)
     ano: Mapped[int]
 
     created_at: Mapped[datetime] = mapped_column(
-        init=False, server_default=func.now()
+        init=False, server_default=agora()
     )
     update_at: Mapped[datetime] = mapped_column(
-        init=False, onupdate=func.now(), server_default=func.now()
+        init=False, onupdate=agora(), server_default=agora()
     )
 
-    romancista_id: Mapped[int] = mapped_column(ForeignKey('romancistas.id'))
+    romancista_id: Mapped[int] = mapped_column(
+        ForeignKey('romancistas.id', ondelete='CASCADE')
+    )
 
     romancista: Mapped[Romancista] = relationship(
         init=False, back_populates='livros'
     )
+
+    # busca textual (título e nome do romancista), mantido pelos triggers
+    # abaixo; não é carregado com o livro
+    vetor_busca: Mapped[str | None] = mapped_column(
+        Text().with_variant(TSVECTOR(), 'postgresql'),
+        init=False,
+        deferred=True,
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
+
+
+# * Busca textual ---
+# português, sem acentos: o título pesa mais (A) que o nome (B)
+DDL_VETOR_BUSCA = (
+    """
+    CREATE OR REPLACE FUNCTION livros_documento(titulo text, nome text)
+    RETURNS tsvector LANGUAGE sql STABLE AS $$
+        SELECT setweight(to_tsvector('portuguese', unaccent(titulo)), 'A')
+            || setweight(
+                to_tsvector('portuguese', unaccent(coalesce(nome, ''))), 'B'
+            )
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION livros_atualiza_vetor_busca()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.vetor_busca := livros_documento(
+            NEW.titulo,
+            (SELECT nome FROM romancistas WHERE id = NEW.romancista_id)
+        );
+        RETURN NEW;
+    END $$
+    """,
+    """
+    CREATE TRIGGER livros_vetor_busca
+    BEFORE INSERT OR UPDATE OF titulo, romancista_id ON livros
+    FOR EACH ROW EXECUTE FUNCTION livros_atualiza_vetor_busca()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION romancistas_atualiza_vetor_busca()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE livros SET vetor_busca = livros_documento(titulo, NEW.nome)
+        WHERE romancista_id = NEW.id;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE TRIGGER romancistas_vetor_busca
+    AFTER UPDATE OF nome ON romancistas
+    FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+    EXECUTE FUNCTION romancistas_atualiza_vetor_busca()
+    """,
+)
+for comando in DDL_VETOR_BUSCA:
+    event.listen(
+        Livro.__table__,
+        'after_create',
+        DDL(comando).execute_if(dialect='postgresql'),
+    )
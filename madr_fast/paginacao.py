@@ -0,0 +1,317 @@
+import base64
+import binascii
+import json
+import time
+from http import HTTPStatus
+
+from fastapi import Response
+from fastapi.exceptions import HTTPException
+from fastapi_pagination.api import create_page, resolve_params
+from fastapi_pagination.ext.sqlalchemy import create_count_query
+from sqlalchemy import and_, literal_column, or_, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+from madr_fast.cache import AUSENTE, CacheTTL
+from madr_fast.coalescencia import uma_vez
+from madr_fast.consultas import contagem_de_facetas
+from madr_fast.database import le_de_replica
+from madr_fast.settings import Settings
+
+settings = Settings()
+
+PROXIMO = 'proximo'
+ANTERIOR = 'anterior'
+
+# totais por filtro, na estratégia 'cached'
+totais = CacheTTL(
+    settings.DATABASE_COUNT_CACHE_SIZE, settings.DATABASE_COUNT_CACHE_TTL
+)
+
+
+# páginas das buscas (o JSON da resposta), na geração atual das tabelas
+paginas = CacheTTL(
+    settings.SEARCH_CACHE_SIZE,
+    settings.SEARCH_CACHE_TTL,
+    max_bytes=settings.SEARCH_CACHE_MAX_BYTES,
+)
+geracoes = dict.fromkeys(('livros', 'romancistas'), 0)
+escritas_em = dict.fromkeys(geracoes, float('-inf'))  # time.monotonic()
+
+
+# * Paginação por chave (keyset) ---
+# a ordem é total (a última expressão desempata, ex.: o id) e o cursor
+# guarda a chave da primeira ou da última linha da página; a página vizinha
+# começa com WHERE (chave) > (cursor), servido pelo índice da ordenação,
+# em vez de OFFSET, que lê e descarta todas as linhas anteriores; a query
+# seleciona colunas (ver consultas.listagem_de_livros) e os itens da página
+# são dicts com elas, aos quais `anexa` pode embutir recursos relacionados
+async def paginar(session, query, ordem, anexa=None, **extras):
+    params = resolve_params()
+    colunas, decrescentes = zip(*map(_direcao, ordem))
+    nomes = query.selected_columns.keys()
+
+    # select em Core não dispara o autoflush: objetos pendentes na sessão
+    # (sem efeito numa sessão só de leitura) entram na consulta como antes
+    await session.flush()
+
+    total, total_modo = await conta(session, query)
+
+    para_tras = False
+    if params.cursor:
+        sentido, valores = _decodifica(params.cursor, colunas)
+        para_tras = sentido == ANTERIOR
+        # para trás: mesma busca com a ordem invertida, desinvertida depois
+        sentidos = [decrescente != para_tras for decrescente in decrescentes]
+        query = query.where(_depois_de(colunas, sentidos, valores)).order_by(
+            *(_ordena(c, d) for c, d in zip(colunas, sentidos))
+        )
+    else:
+        query = query.order_by(*ordem).offset(params.size * (params.page - 1))
+
+    # a chave de ordenação vem depois das colunas do item (rotulada, pode
+    # repetir uma delas); uma linha a mais indica se há página seguinte (no
+    # sentido da busca)
+    query = query.add_columns(*(coluna.label(None) for coluna in colunas))
+    linhas = (await session.execute(query.limit(params.size + 1))).all()
+    tem_anterior, tem_proximo = _vizinhas(
+        params, para_tras, len(linhas) > params.size
+    )
+    linhas = linhas[: params.size]
+    if para_tras:
+        linhas.reverse()
+
+    itens = [dict(zip(nomes, linha)) for linha in linhas]
+    if anexa:
+        await anexa(session, itens)
+
+    return create_page(
+        itens,
+        total=total,
+        params=params,
+        total_modo=total_modo,
+        **extras,
+        proximo=_codifica(PROXIMO, linhas[-1][len(nomes) :])
+        if linhas and tem_proximo
+        else None,
+        anterior=_codifica(ANTERIOR, linhas[0][len(nomes) :])
+        if linhas and tem_anterior
+        else None,
+    )
+
+
+# * Páginas em cache ---
+# a chave é a rota, os parâmetros validados, a página pedida e a geração
+# das tabelas lidas; qualquer escrita troca a geração da tabela, e as
+# páginas das gerações anteriores, que nenhuma chave pede mais, saem pelo
+# LRU ou pelo TTL, sem rastrear quais páginas uma escrita afeta; a mesma
+# chave junta as requisições simultâneas da página em uma consulta
+# a chave também separa as páginas lidas do primário das lidas de uma
+# réplica: quem acabou de escrever lê do primário (read-your-writes) e não
+# recebe a página que uma réplica atrasada montou na geração nova
+def nova_geracao(*tabelas):
+    for tabela in tabelas:
+        geracoes[tabela] += 1
+        escritas_em[tabela] = time.monotonic()
+
+
+def chave_da_pagina(session, tabelas, parametros):
+    # gerações lidas antes da consulta: se uma escrita terminar durante
+    # ela, a página fica na geração antiga, que não é mais pedida
+    return (
+        parametros,
+        resolve_params().model_dump_json(),
+        tuple(geracoes[tabela] for tabela in tabelas),
+        le_de_replica(session),
+    )
+
+
+def escrita_recente(tabelas):
+    # dentro da janela de read-your-writes, a réplica pode não ter a escrita
+    janela = settings.DATABASE_READ_YOUR_WRITES
+    ultima = max(escritas_em[tabela] for tabela in tabelas)
+    return time.monotonic() - ultima < janela
+
+
+async def pagina_em_cache(session, tabelas, parametros, gera):
+    chave = chave_da_pagina(session, tabelas, parametros)
+    corpo = paginas.obtem(chave) if paginas.ttl > 0 else AUSENTE
+    if corpo is AUSENTE:
+
+        async def gera_e_guarda():
+            corpo = (await gera()).body
+            # a página de uma réplica logo depois de uma escrita talvez não
+            # a tenha: não fica guardada pelo TTL inteiro
+            if paginas.ttl > 0 and not (
+                le_de_replica(session) and escrita_recente(tabelas)
+            ):
+                paginas.guarda(chave, corpo)
+            return corpo
+
+        corpo = await uma_vez(chave, gera_e_guarda)
+    return Response(corpo, media_type='application/json')
+
+
+async def pagina_coalescida(session, tabelas, parametros, gera):
+    """Como `pagina_em_cache`, sem guardar: só junta as simultâneas."""
+
+    async def gera_corpo():
+        return (await gera()).body
+
+    corpo = await uma_vez(
+        chave_da_pagina(session, tabelas, parametros), gera_corpo
+    )
+    return Response(corpo, media_type='application/json')
+
+
+# * Total ---
+# o count percorre todo o filtro e, em tabelas grandes, custa mais que a
+# própria página; a estratégia troca exatidão por custo
+async def conta(session, query):
+    estrategia = settings.DATABASE_COUNT_STRATEGY
+    if estrategia == 'omitted':
+        return None, 'omitted'
+
+    # o count só precisa das linhas do filtro, não das colunas da entidade
+    contagem = create_count_query(
+        query.with_only_columns(
+            literal_column('1'), maintain_column_froms=True
+        )
+    )
+    dialeto = session.bind.dialect
+
+    # a estimativa só vale para filtros amplos: abaixo do limite o count
+    # exato é barato (e a estimativa, imprecisa)
+    if estrategia == 'estimated' and dialeto.name == 'postgresql':
+        estimativa = await _estimativa(session, query)
+        if estimativa >= settings.DATABASE_COUNT_ESTIMATE_THRESHOLD:
+            return estimativa, 'estimated'
+
+    if estrategia == 'cached':
+        # chave: SQL do count e parâmetros (o filtro normalizado)
+        compilado = contagem.compile(dialect=dialeto)
+        chave = (str(compilado), tuple(sorted(compilado.params.items())))
+        total = totais.obtem(chave)
+        if total is not AUSENTE:
+            return total, 'cached'
+        total = await session.scalar(contagem)
+        totais.guarda(chave, total)
+        return total, 'exact'
+
+    return await session.scalar(contagem), 'exact'
+
+
+async def _estimativa(session, query):
+    # linhas previstas pelo planner (pg_class.reltuples e estatísticas das
+    # colunas), sem executar a consulta
+    conn = await session.connection()
+    compilado = query.compile(
+        dialect=conn.dialect, compile_kwargs={'render_postcompile': True}
+    )
+    plano = await conn.exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compilado}', compilado.params
+    )
+    return int(plano.scalar()[0]['Plan']['Plan Rows'])
+
+
+# * Facetas ---
+# contagens por valor das facetas pedidas, para o mesmo filtro da página,
+# em uma consulta; acima de DATABASE_FACET_LIMIT linhas, parciais
+async def conta_facetas(session, query, facetas):
+    limite = settings.DATABASE_FACET_LIMIT
+    linhas = await session.execute(
+        contagem_de_facetas(
+            query, facetas, limite + 1, session.bind.dialect.name
+        )
+    )
+
+    contagens = {faceta: [] for faceta in facetas}
+    contadas = 0
+    for indice, valor, total in linhas:
+        if indice < 0:
+            contadas = total
+        else:
+            contagens[facetas[indice]].append({'valor': valor, 'total': total})
+
+    for valores in contagens.values():
+        valores.sort(
+            key=lambda contagem: (-contagem['total'], contagem['valor'])
+        )
+    return {**contagens, 'parcial': contadas > limite}
+
+
+def _vizinhas(params, para_tras, ha_mais):
+    # se há página anterior e seguinte; ha_mais vale no sentido da busca
+    if params.cursor:
+        return (ha_mais if para_tras else True), (
+            True if para_tras else ha_mais
+        )
+    return params.page > 1, ha_mais
+
+
+def _direcao(expressao):
+    if (
+        isinstance(expressao, UnaryExpression)
+        and expressao.modifier is operators.desc_op
+    ):
+        return expressao.element, True
+    return expressao, False
+
+
+def _ordena(coluna, decrescente):
+    return coluna.desc() if decrescente else coluna.asc()
+
+
+def _depois_de(colunas, decrescentes, valores):
+    # mesma direção em todas as colunas: comparação de tuplas, que o
+    # Postgres transforma em condição de índice
+    if len(set(decrescentes)) == 1:
+        chave = tuple_(*colunas)
+        return chave < valores if decrescentes[0] else chave > valores
+
+    # direções mistas (ex.: relevância desc, id asc): comparação expandida
+    return or_(
+        *(
+            and_(
+                *(c == v for c, v in zip(colunas[:i], valores[:i])),
+                colunas[i] < valores[i]
+                if decrescentes[i]
+                else colunas[i] > valores[i],
+            )
+            for i in range(len(colunas))
+        )
+    )
+
+
+def _codifica(sentido, valores):
+    conteudo = json.dumps([sentido, list(valores)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(conteudo.encode()).decode().rstrip('=')
+
+
+def _decodifica(cursor, colunas):
+    try:
+        conteudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sentido, valores = json.loads(conteudo)
+        if sentido not in {PROXIMO, ANTERIOR}:
+            valores = None
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        valores = None
+
+    # o cursor vem do cliente: valores conferidos com os tipos das colunas
+    if (
+        not isinstance(valores, list)
+        or len(valores) != len(colunas)
+        or not all(map(_do_tipo, valores, colunas))
+    ):
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Cursor inválido'
+        )
+
+    return sentido, tuple(valores)
+
+
+def _do_tipo(valor, coluna):
+    tipo = coluna.type.python_type
+    if tipo is float:
+        tipo = (int, float)
+    return isinstance(valor, tipo) and not isinstance(valor, bool)
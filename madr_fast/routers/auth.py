@@ -2,11 +2,12 @@ from http import HTTPStatus
 from typing import Annotated
 
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from madr_fast.consultas import usuario_por_email
 from madr_fast.database import get_session
 from madr_fast.models import Usuario
 from madr_fast.schemas import Token
@@ -21,16 +22,16 @@ router = APIRouter(prefix='/auth', tags=['Autenticação'])
 
 # tipos annotated
 T_FormData = Annotated[OAuth2PasswordRequestForm, Depends()]
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
 T_CurrentUser = Annotated[Usuario, Depends(get_current_user)]
 
 
 @router.post('/token', response_model=Token)
-def login_para_token_de_acesso(form_data: T_FormData, session: T_Session):
+async def login_para_token_de_acesso(
+    form_data: T_FormData, session: T_Session
+):
     # pega o usuário no database
-    usuario_db = session.scalar(
-        select(Usuario).where(Usuario.email == form_data.username)
-    )
+    usuario_db = await session.scalar(usuario_por_email(form_data.username))
 
     # verifica se usuário exista no banco de dados
     if not usuario_db:
@@ -39,8 +40,10 @@ def login_para_token_de_acesso(form_data: T_FormData, session: T_Session):
             detail='Email ou senha incorretos',
         )
 
-    # verifica se a senha combina
-    if not verify_password(form_data.password, usuario_db.senha):
+    # verifica se a senha combina (hash fora do event loop)
+    if not await run_in_threadpool(
+        verify_password, form_data.password, usuario_db.senha
+    ):
         raise HTTPException(  # caso não combine, levanta bad request
             status_code=HTTPStatus.BAD_REQUEST,
             detail='Email ou senha incorretos',
@@ -52,7 +55,7 @@ def login_para_token_de_acesso(form_data: T_FormData, session: T_Session):
 
 
 @router.post('/refresh_token', response_model=Token)
-def atualiza_token_de_acesso(usuario_atual: T_CurrentUser):
+async def atualiza_token_de_acesso(usuario_atual: T_CurrentUser):
     # com o usuário atual dentro do tempo de expiração
     # gera um novo token de acesso
     novo_token_de_acesso = create_access_token(
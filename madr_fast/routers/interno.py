@@ -0,0 +1,70 @@
+from dataclasses import asdict
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+from fastapi.exceptions import HTTPException
+
+from madr_fast.coalescencia import coalescedor
+from madr_fast.consultas import livros_por_id, romancistas_por_id
+from madr_fast.database import engine, resumo_pool
+from madr_fast.paginacao import paginas, totais
+from madr_fast.schemas import CachePublic, CoalescenciaPublic, PoolPublic
+from madr_fast.security import principais
+from madr_fast.settings import Settings
+
+settings = Settings()
+
+
+async def habilitados():
+    # fora da documentação não basta: a porta da aplicação é pública, e sem
+    # INTERNAL_ENDPOINTS as rotas não existem para o cliente
+    if not settings.INTERNAL_ENDPOINTS:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND)
+
+
+# rota (fora da documentação pública)
+router = APIRouter(
+    prefix='/interno',
+    tags=['Interno'],
+    include_in_schema=False,
+    dependencies=[Depends(habilitados)],
+)
+
+
+@router.get('/pool', response_model=PoolPublic, status_code=HTTPStatus.OK)
+async def estatisticas_do_pool():
+    # contadores do pool de conexões, para dimensionar o pool por medição
+    return resumo_pool(engine)
+
+
+@router.get(
+    '/caches',
+    response_model=dict[str, CachePublic],
+    status_code=HTTPStatus.OK,
+)
+async def estatisticas_dos_caches():
+    # acertos, faltas e despejos dos caches em memória deste processo
+    caches = {
+        'livros': livros_por_id,
+        'romancistas': romancistas_por_id,
+        'principais': principais,
+        'totais': totais,
+        'paginas': paginas,
+    }
+    return {
+        nome: {'itens': len(cache), **asdict(cache.estatisticas)}
+        for nome, cache in caches.items()
+    }
+
+
+@router.get(
+    '/coalescencia',
+    response_model=CoalescenciaPublic,
+    status_code=HTTPStatus.OK,
+)
+async def estatisticas_da_coalescencia():
+    # execuções no banco e requisições que receberam o resultado de outra
+    return {
+        'em_andamento': len(coalescedor),
+        **asdict(coalescedor.estatisticas),
+    }
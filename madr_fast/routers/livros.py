@@ -1,106 +1,301 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.exceptions import HTTPException
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-
-from madr_fast.database import get_session
-from madr_fast.models import Livro, Romancista, Usuario
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_fast.agrupador import insere_e_confirma
+from madr_fast.autocompletar import (
+    garante_indices,
+    indice_livros,
+    normaliza_prefixo,
+)
+from madr_fast.campos import (
+    com_relacao,
+    lista_campos,
+    paginas_de,
+    responde,
+)
+from madr_fast.condicional import (
+    condicional,
+    e_condicional,
+    etag_de,
+    nao_modificado,
+    resposta_304,
+)
+from madr_fast.consultas import (
+    anexa_romancistas,
+    atualizado_em,
+    busca_textual,
+    dados_publicos,
+    listagem_de_livros,
+    livro_em_cache,
+    livro_por_id,
+    livros,
+    livros_por_id,
+    romancista_em_cache,
+)
+from madr_fast.database import (
+    VIOLACAO_CHAVE_ESTRANGEIRA,
+    get_read_session,
+    get_session,
+    prazo,
+    tipo_de_violacao,
+)
+from madr_fast.models import Livro, Usuario, agora
+from madr_fast.paginacao import (
+    conta_facetas,
+    nova_geracao,
+    pagina_coalescida,
+    pagina_em_cache,
+    paginar,
+)
 from madr_fast.schemas import (
+    CamposLivro,
+    ExpandirLivro,
+    FiltroLivros,
+    LivroComRomancista,
     LivroPublic,
     LivroSchema,
+    LivroSugestao,
     LivroUpdate,
     Message,
     PaginaLivros,
+    PaginaLivrosFacetada,
 )
 from madr_fast.security import get_current_user
+from madr_fast.settings import Settings
+
+settings = Settings()
 
 # rota
 router = APIRouter(prefix='/livros', tags=['Livros'])
 
 # tipos annotated
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 T_CurrentUser = Annotated[Usuario, Depends(get_current_user)]
+T_FiltroLivros = Annotated[FiltroLivros, Depends()]
+
+# buscas por query varrem a tabela: prazo menor que o padrão
+prazo_busca = Depends(prazo(settings.DATABASE_SEARCH_STATEMENT_TIMEOUT))
+
+# ordens aceitas em ordenar_por, cada uma servida por um índice; a última
+# coluna é única, então a ordem é total
+ordens_livros = {
+    'titulo': (livros.c.titulo,),
+    'ano': (livros.c.ano, livros.c.titulo),
+    'id': (livros.c.id,),
+}
+ordem_livros = ordens_livros['titulo']
 
 
 # * CREATE ---
 @router.post('/', response_model=LivroPublic, status_code=HTTPStatus.CREATED)
-def cadastra_livro(
+async def cadastra_livro(
     livro: LivroSchema,
     session: T_Session,
     usuario_atual: T_CurrentUser,
 ):
-    # verifica se o título do livro já existe no banco de dados
-    check_db = session.scalar(
-        select(Livro).where(Livro.titulo == livro.titulo)
-    )
-    if check_db:  # caso exista, levanta conflict
-        raise HTTPException(
+    # insere e retorna o livro em uma ida ao banco: título repetido e
+    # romancista inexistente são barrados pelas constraints do banco
+    try:
+        livro_db = await insere_e_confirma(session, Livro, livro.model_dump())
+    except IntegrityError as erro:
+        await session.rollback()
+        if tipo_de_violacao(erro) == VIOLACAO_CHAVE_ESTRANGEIRA:
+            raise HTTPException(  # caso romancista não exista, not found
+                status_code=HTTPStatus.NOT_FOUND,
+                detail='Romancista não consta no MADR',
+            )
+        raise HTTPException(  # caso título exista, levanta conflict
             status_code=HTTPStatus.CONFLICT,
             detail='Livro já consta no MADR',
         )
 
-    # verifica se o romancista existe no banco de dados
-    check_romancista = session.scalar(
-        select(Romancista).where(Romancista.id == livro.romancista_id)
+    indice_livros.adiciona(
+        livro_db.id, livro_db.titulo, livro_db.romancista_id
     )
-    if not check_romancista:
-        raise HTTPException(  # caso romancista não exista, levanta not found
-            status_code=HTTPStatus.NOT_FOUND,
-            detail='Romancista não consta no MADR',
+    livros_por_id.guarda(livro_db.id, dados_publicos(livro_db))
+    nova_geracao('livros')
+    return livro_db
+
+
+# * READ ---
+# busca textual por relevância (declarada antes de /{livro_id})
+@router.get(
+    '/busca',
+    response_model=PaginaLivros[LivroPublic],
+    status_code=HTTPStatus.OK,
+    dependencies=[prazo_busca],
+)
+async def busca_livros_por_texto(
+    request: Request,
+    session: T_ReadSession,
+    q: str = Query(min_length=1),
+    campos: CamposLivro = None,
+    expandir: ExpandirLivro = None,
+):
+    campos = lista_campos(campos)
+
+    async def gera():
+        query, ordem = busca_textual(q, session.bind.dialect.name, campos)
+        modelo, saida = com_relacao(
+            LivroPublic, campos, expandir, LivroComRomancista
         )
 
-    # guarda os dados do livro no banco de dados
-    livro_db = Livro(
-        titulo=livro.titulo, ano=livro.ano, romancista_id=livro.romancista_id
+        # retorna paginação de livros, mais relevantes primeiro
+        with paginas_de(PaginaLivros, modelo, saida):
+            pagina = await paginar(
+                session, query, ordem, anexa=expandir and anexa_romancistas
+            )
+        return responde(pagina, modelo, saida)
+
+    # o nome do romancista também é buscado: depende das duas tabelas
+    resposta = await pagina_em_cache(
+        session,
+        ('livros', 'romancistas'),
+        ('livros/busca', q, campos, expandir),
+        gera,
     )
-    session.add(livro_db)
-    session.commit()
-    session.refresh(livro_db)
+    return condicional(request, resposta)
 
-    return livro_db
+
+# autocompletar por prefixo do título, servido da memória
+@router.get(
+    '/autocompletar',
+    response_model=list[LivroSugestao],
+    status_code=HTTPStatus.OK,
+)
+async def autocompleta_livros(
+    session: T_ReadSession,
+    prefixo: str = Query(min_length=1),
+    limite: int = Query(10, ge=1, le=50),
+):
+    await garante_indices(session)
+    return [
+        {'id': id_, 'titulo': titulo}
+        for id_, titulo in indice_livros.busca(
+            normaliza_prefixo(prefixo), limite
+        )
+    ]
 
 
-# * READ ---
 # por id
 @router.get(
     '/{livro_id}', response_model=LivroPublic, status_code=HTTPStatus.OK
 )
-def busca_livro_por_id(livro_id: int, session: T_Session):
-    livro = session.scalar(select(Livro).where(Livro.id == livro_id))
+async def busca_livro_por_id(
+    livro_id: int,
+    request: Request,
+    session: T_ReadSession,
+    campos: CamposLivro = None,
+    expandir: ExpandirLivro = None,
+):
+    campos = lista_campos(campos)
+    nao_consta = HTTPException(  # caso não existe, levanta not found
+        status_code=HTTPStatus.NOT_FOUND, detail='Livro não consta no MADR'
+    )
+
+    # GET condicional do livro sozinho: validado só pelo update_at
+    if not expandir and e_condicional(request):
+        modificado_em = await session.scalar(atualizado_em(livros, livro_id))
+        if modificado_em is None:
+            raise nao_consta
+        etag = etag_de('livro', livro_id, modificado_em, campos)
+        if nao_modificado(request, etag, modificado_em):
+            return resposta_304(etag, modificado_em)
+
+    # dados do livro do cache (ou do banco, numa falta); os campos pedidos
+    # são recortados na resposta
+    livro = await livro_em_cache(session, livro_id)
 
     # verifica se existe livro com o livro_id
     if not livro:
-        raise HTTPException(  # caso não existe, levanta not found
-            status_code=HTTPStatus.NOT_FOUND, detail='Livro não consta no MADR'
+        raise nao_consta
+
+    if expandir:  # o romancista, também do cache; ETag pelo corpo
+        romancista = await romancista_em_cache(session, livro['romancista_id'])
+        if not romancista:
+            # removido depois da leitura do livro: o livro foi junto, em
+            # cascata
+            livros_por_id.invalida(livro_id)
+            raise nao_consta
+        resposta = responde(
+            {**livro, 'romancista': romancista},
+            *com_relacao(LivroPublic, campos, expandir, LivroComRomancista),
         )
+        return condicional(request, resposta)
 
-    return livro
+    return condicional(
+        request,
+        responde(livro, LivroPublic, campos),
+        etag_de('livro', livro_id, livro['update_at'], campos),
+        livro['update_at'],
+    )
 
 
 # por query
 @router.get(
     '/query/',
-    response_model=PaginaLivros[LivroPublic],
+    response_model=PaginaLivrosFacetada[LivroPublic],
     status_code=HTTPStatus.OK,
+    dependencies=[prazo_busca],
 )
-def busca_livros_por_query(
-    session: T_Session,
-    titulo: str = Query(None),
-    ano: int = Query(None),
+async def busca_livros_por_query(
+    request: Request, session: T_ReadSession, filtro: T_FiltroLivros
 ):
+    # páginas repetidas vêm do cache, até a próxima escrita em livros (e
+    # em romancistas, com o romancista expandido)
+    resposta = await pagina_em_cache(
+        session,
+        ('livros', 'romancistas') if filtro.expandir else ('livros',),
+        ('livros/query', filtro.model_dump_json()),
+        lambda: _pagina_de_livros_por_query(session, filtro),
+    )
+    return condicional(request, resposta)
+
+
+async def _pagina_de_livros_por_query(session, filtro):
     # monta a query
-    query = select(Livro)
-    if titulo:
-        query = query.filter(Livro.titulo.contains(titulo))
-    if ano:
-        query = query.filter(Livro.ano == ano)
+    campos = lista_campos(filtro.campos)
+    query = listagem_de_livros(campos)
+    if filtro.titulo:
+        query = query.filter(livros.c.titulo.contains(filtro.titulo))
+    if filtro.ano:
+        query = query.filter(livros.c.ano == filtro.ano)
+    if filtro.ano_min:
+        query = query.filter(livros.c.ano >= filtro.ano_min)
+    if filtro.ano_max:
+        query = query.filter(livros.c.ano <= filtro.ano_max)
+
+    colunas = ordens_livros[filtro.ordenar_por]
+    if filtro.ordem == 'desc':
+        colunas = tuple(coluna.desc() for coluna in colunas)
+
+    # contagens das facetas pedidas (sem repetição), em uma consulta
+    facetas = None
+    if filtro.facetas:
+        facetas = await conta_facetas(
+            session, query, list(dict.fromkeys(filtro.facetas.split(',')))
+        )
 
     # retorna paginação de livros
-    return paginate(session, query=query)
+    modelo, saida = com_relacao(
+        LivroPublic, campos, filtro.expandir, LivroComRomancista
+    )
+    with paginas_de(PaginaLivrosFacetada, modelo, saida):
+        pagina = await paginar(
+            session,
+            query,
+            colunas,
+            anexa=filtro.expandir and anexa_romancistas,
+            facetas=facetas,
+        )
+    return responde(pagina, modelo, saida)
 
 
 # EXTRA: por romancista id
@@ -109,74 +304,103 @@ def busca_livros_por_query(
     response_model=PaginaLivros[LivroPublic],
     status_code=HTTPStatus.OK,
 )
-def busca_livros_por_romancista_id(romancista_id: int, session: T_Session):
-    # verifica se existe romancista no banco de dados
-    check_romancista = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
-    )
+async def busca_livros_por_romancista_id(
+    romancista_id: int,
+    request: Request,
+    session: T_ReadSession,
+    campos: CamposLivro = None,
+    expandir: ExpandirLivro = None,
+):
+    campos = lista_campos(campos)
 
-    if not check_romancista:
-        raise HTTPException(  # caso não existe, levanta not found
-            status_code=HTTPStatus.NOT_FOUND,
-            detail='Romancista não consta no MADR',
+    async def gera():
+        query = listagem_de_livros(campos).filter(
+            livros.c.romancista_id == romancista_id
+        )
+        modelo, saida = com_relacao(
+            LivroPublic, campos, expandir, LivroComRomancista
         )
 
-    query = select(Livro).filter(Livro.romancista_id == romancista_id)
+        with paginas_de(PaginaLivros, modelo, saida):
+            pagina = await paginar(
+                session,
+                query,
+                ordem_livros,
+                anexa=expandir and anexa_romancistas,
+            )
 
-    # retorna paginação de livros
-    return paginate(session, query=query)
+        # página com livros: o romancista existe; vazia, verifica no banco
+        if not pagina.items and not await romancista_em_cache(
+            session, romancista_id
+        ):
+            raise HTTPException(  # caso não existe, levanta not found
+                status_code=HTTPStatus.NOT_FOUND,
+                detail='Romancista não consta no MADR',
+            )
+
+        return responde(pagina, modelo, saida)
+
+    # requisições simultâneas da mesma página (ex.: um romancista em alta)
+    # fazem as consultas uma vez e recebem a mesma resposta
+    resposta = await pagina_coalescida(
+        session,
+        ('livros', 'romancistas'),
+        ('livros/romancista', romancista_id, campos, expandir),
+        gera,
+    )
+    return condicional(request, resposta)
 
 
 # * UPDATE (PATCH) ---
 @router.patch(
     '/{livro_id}', response_model=LivroPublic, status_code=HTTPStatus.OK
 )
-def altera_livro(
+async def altera_livro(
     livro_id: int,
     session: T_Session,
     usuario_atual: T_CurrentUser,
     livro_update: LivroUpdate,
 ):
-    # carrega o livro buscado por id do banco de dados
-    livro_db = session.scalar(select(Livro).where(Livro.id == livro_id))
-
-    # verifica se o livro existe no banco de dados
-    if not livro_db:
-        raise HTTPException(  # caso não existe, levanta not found
-            status_code=HTTPStatus.NOT_FOUND, detail='Livro não consta no MADR'
-        )
-
-    # verifica validade do título atualizado
-    if livro_update.titulo and session.scalar(
-        select(Livro).where(Livro.titulo == livro_update.titulo)
-    ):
-        raise HTTPException(  # caso já exista, levanta conflict
-            status_code=HTTPStatus.CONFLICT, detail='Título já consta no MADR'
-        )
-
-    # verifica se o romancista existe no banco de dados
-    if livro_update.romancista_id:
-        check_romancista = session.scalar(
-            select(Romancista).where(
-                Romancista.id == livro_update.romancista_id
-            )
+    # campos diferentes de None a serem atualizados
+    valores = livro_update.model_dump(exclude_none=True)
+
+    # atualiza e retorna o livro em uma ida ao banco: título repetido e
+    # romancista inexistente são barrados pelas constraints do banco; o
+    # update_at explícito volta no RETURNING também para o livro já na
+    # sessão (o onupdate não é sincronizado), e vai para o cache e o ETag
+    try:
+        livro_db = await session.scalar(
+            update(Livro)
+            .where(Livro.id == livro_id)
+            .values(**valores, update_at=agora())
+            .returning(Livro)
+            if valores
+            else livro_por_id(livro_id)
         )
-        if not check_romancista:
+        await session.commit()
+    except IntegrityError as erro:
+        await session.rollback()
+        if tipo_de_violacao(erro) == VIOLACAO_CHAVE_ESTRANGEIRA:
             raise HTTPException(  # caso id não exista, levanta not found
                 status_code=HTTPStatus.NOT_FOUND,
                 detail='Romancista não consta no MADR',
             )
+        raise HTTPException(  # caso título já exista, levanta conflict
+            status_code=HTTPStatus.CONFLICT, detail='Título já consta no MADR'
+        )
 
-    # atualiza os dados do livro para campos diferentes de None
-    for chave, valor in livro_update.model_dump(exclude_none=True).items():
-        setattr(livro_db, chave, valor)
-
-    # atualiza o banco de dados
-    session.add(livro_db)
-    session.commit()
-    session.refresh(livro_db)
+    # verifica se o livro existe no banco de dados
+    if not livro_db:
+        raise HTTPException(  # caso não existe, levanta not found
+            status_code=HTTPStatus.NOT_FOUND, detail='Livro não consta no MADR'
+        )
 
     # retorna o livro atualizado
+    indice_livros.adiciona(
+        livro_db.id, livro_db.titulo, livro_db.romancista_id
+    )
+    livros_por_id.guarda(livro_db.id, dados_publicos(livro_db))
+    nova_geracao('livros')
     return livro_db
 
 
@@ -184,13 +408,13 @@ def altera_livro(
 @router.delete(
     '/{livro_id}', response_model=Message, status_code=HTTPStatus.OK
 )
-def deleta_livro(
+async def deleta_livro(
     livro_id: int,
     session: T_Session,
     usuario_atual: T_CurrentUser,
 ):
     # carrega o livro buscado por id no banco de dados
-    livro_db = session.scalar(select(Livro).where(Livro.id == livro_id))
+    livro_db = await session.scalar(livro_por_id(livro_id))
 
     # verifica se o livro existe no banco de dados
     if not livro_db:
@@ -199,8 +423,11 @@ def deleta_livro(
         )
 
     # deleta do banco de dados
-    session.delete(livro_db)
-    session.commit()
+    await session.delete(livro_db)
+    await session.commit()
+    indice_livros.remove(livro_id)
+    livros_por_id.invalida(livro_id)
+    nova_geracao('livros')
 
     # retorna mensagem de sucesso
     return {'message': 'Livro deletado no MADR'}
@@ -1,33 +1,84 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
-from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from madr_fast.database import get_session
-from madr_fast.models import Romancista, Usuario
+from madr_fast.agrupador import insere_e_confirma
+from madr_fast.autocompletar import (
+    garante_indices,
+    indice_livros,
+    indice_romancistas,
+    normaliza_prefixo,
+)
+from madr_fast.campos import (
+    com_relacao,
+    lista_campos,
+    paginas_de,
+    responde,
+)
+from madr_fast.coalescencia import uma_vez
+from madr_fast.condicional import (
+    condicional,
+    e_condicional,
+    etag_de,
+    nao_modificado,
+    resposta_304,
+)
+from madr_fast.consultas import (
+    anexa_livros,
+    atualizado_em,
+    dados_publicos,
+    listagem_de_romancistas,
+    livros_por_id,
+    romancista_em_cache,
+    romancistas,
+    romancistas_por_id,
+)
+from madr_fast.database import (
+    get_read_session,
+    get_session,
+    le_de_replica,
+    prazo,
+)
+from madr_fast.models import Romancista, Usuario, agora
+from madr_fast.paginacao import (
+    geracoes,
+    nova_geracao,
+    pagina_em_cache,
+    paginar,
+)
 from madr_fast.schemas import (
+    CamposRomancista,
+    IncluirRomancista,
     Message,
     PaginaRomancistas,
+    RomancistaComLivros,
     RomancistaPublic,
     RomancistaSchema,
     RomancistaUpdate,
 )
 from madr_fast.security import get_current_user
+from madr_fast.settings import Settings
+
+settings = Settings()
 
 # rota
 router = APIRouter(prefix='/romancistas', tags=['Romancistas'])
 
 # tipos annotated
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
+T_ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
 T_CurrentUser = Annotated[Usuario, Depends(get_current_user)]
 
-# configs para query (para definir paginação)
-offset_std = 0
-limit_std = 20
+# buscas por query varrem a tabela: prazo menor que o padrão
+prazo_busca = Depends(prazo(settings.DATABASE_SEARCH_STATEMENT_TIMEOUT))
+
+# ordem das listagens: nome é único, a ordem já é total
+ordem_romancistas = (romancistas.c.nome,)
 
 
 # * CREATE ---
@@ -36,60 +87,159 @@ limit_std = 20
     response_model=RomancistaPublic,
     status_code=HTTPStatus.CREATED,
 )
-def cadastra_romancista(
+async def cadastra_romancista(
     romancista: RomancistaSchema,
     session: T_Session,
     usuario_atual: T_CurrentUser,
 ):
-    # verificar se o romancista existe no banco de dados
-    check_db = session.scalar(
-        select(Romancista).where(Romancista.nome == romancista.nome)
-    )
-    if check_db:
+    # insere e retorna o romancista em uma ida ao banco: nome repetido é
+    # barrado pela constraint UNIQUE do banco
+    try:
+        romancista_db = await insere_e_confirma(
+            session, Romancista, {'nome': romancista.nome}
+        )
+    except IntegrityError:
+        await session.rollback()
         raise HTTPException(  # caso exista, levanta conflict
             status_code=HTTPStatus.CONFLICT,
             detail='Romancista já consta no MADR',
         )
 
-    # guarda dados do romancista no banco de dados
-    romancista_db = Romancista(nome=romancista.nome)
-    session.add(romancista_db)
-    session.commit()
-    session.refresh(romancista_db)
-
+    indice_romancistas.adiciona(romancista_db.id, romancista_db.nome)
+    romancistas_por_id.guarda(romancista_db.id, dados_publicos(romancista_db))
+    nova_geracao('romancistas')
     return romancista_db
 
 
 # * READ ---
+# autocompletar por prefixo do nome, servido da memória
+@router.get('/autocompletar', response_model=list[RomancistaPublic])
+async def autocompleta_romancistas(
+    session: T_ReadSession,
+    prefixo: str = Query(min_length=1),
+    limite: int = Query(10, ge=1, le=50),
+):
+    await garante_indices(session)
+    return [
+        {'id': id_, 'nome': nome}
+        for id_, nome in indice_romancistas.busca(
+            normaliza_prefixo(prefixo), limite
+        )
+    ]
+
+
 # por id
 @router.get('/{romancista_id}', response_model=RomancistaPublic)
-def busca_romancistas_por_id(
+async def busca_romancistas_por_id(
     romancista_id: int,
-    session: T_Session,
+    request: Request,
+    session: T_ReadSession,
+    campos: CamposRomancista = None,
+    incluir: IncluirRomancista = None,
 ):
-    # verifica se existe romancista por romancista_id
-    romancista = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
+    campos = lista_campos(campos)
+    nao_consta = HTTPException(  # caso não exista, levanta not found
+        status_code=HTTPStatus.NOT_FOUND,
+        detail='Romancista não consta no MADR',
     )
+
+    # GET condicional do romancista sozinho: validado só pelo update_at
+    if not incluir and e_condicional(request):
+        modificado_em = await session.scalar(
+            atualizado_em(romancistas, romancista_id)
+        )
+        if modificado_em is None:
+            raise nao_consta
+        etag = etag_de('romancista', romancista_id, modificado_em, campos)
+        if nao_modificado(request, etag, modificado_em):
+            return resposta_304(etag, modificado_em)
+
+    # verifica se existe romancista por romancista_id (cache ou banco)
+    romancista = await romancista_em_cache(session, romancista_id)
     if not romancista:
-        raise HTTPException(  # caso não exista, levanta not found
-            status_code=HTTPStatus.NOT_FOUND,
-            detail='Romancista não consta no MADR',
+        raise nao_consta
+
+    if incluir:  # os livros vêm do banco, em um SELECT; ETag pelo corpo
+
+        async def gera():
+            com_livros = {**romancista}
+            await anexa_livros(session, [com_livros])
+            return responde(
+                com_livros,
+                *com_relacao(
+                    RomancistaPublic, campos, incluir, RomancistaComLivros
+                ),
+            ).body
+
+        # requisições simultâneas do mesmo romancista: um SELECT só, na
+        # geração atual dos livros e na mesma origem (primário ou réplica)
+        corpo = await uma_vez(
+            (
+                'romancistas/id',
+                romancista_id,
+                campos,
+                incluir,
+                geracoes['livros'],
+                le_de_replica(session),
+            ),
+            gera,
+        )
+        return condicional(
+            request, Response(corpo, media_type='application/json')
         )
-    return romancista
+
+    return condicional(
+        request,
+        responde(romancista, RomancistaPublic, campos),
+        etag_de('romancista', romancista_id, romancista['update_at'], campos),
+        romancista['update_at'],
+    )
 
 
 # por query
-@router.get('/query/', response_model=PaginaRomancistas[RomancistaPublic])
-def busca_romancistas_por_query(session: T_Session, nome: str = Query(None)):
-    query = select(Romancista)
+@router.get(
+    '/query/',
+    response_model=PaginaRomancistas[RomancistaPublic],
+    dependencies=[prazo_busca],
+)
+async def busca_romancistas_por_query(
+    request: Request,
+    session: T_ReadSession,
+    nome: str = Query(None),
+    campos: CamposRomancista = None,
+    incluir: IncluirRomancista = None,
+):
+    campos = lista_campos(campos)
 
-    # monta a query
-    if nome:
-        query = query.filter(Romancista.nome.contains(nome))
+    async def gera():
+        query = listagem_de_romancistas(campos)
 
-    # retorna paginação de romancistas
-    return paginate(session, query=query)
+        # monta a query
+        if nome:
+            query = query.filter(romancistas.c.nome.contains(nome))
+
+        # retorna paginação de romancistas
+        modelo, saida = com_relacao(
+            RomancistaPublic, campos, incluir, RomancistaComLivros
+        )
+        with paginas_de(PaginaRomancistas, modelo, saida):
+            pagina = await paginar(
+                session,
+                query,
+                ordem_romancistas,
+                anexa=incluir and anexa_livros,
+            )
+        return responde(pagina, modelo, saida)
+
+    # páginas repetidas vêm do cache, até a próxima escrita em romancistas
+    # (e em livros, com os livros incluídos)
+    resposta = await pagina_em_cache(
+        session,
+        ('romancistas', 'livros') if incluir else ('romancistas',),
+        ('romancistas/query', nome, campos, incluir),
+        gera,
+    )
+    return condicional(request, resposta)
 
 
 # * UPDATE (PATCH) ---
@@ -98,16 +248,28 @@ def busca_romancistas_por_query(session: T_Session, nome: str = Query(None)):
     response_model=RomancistaPublic,
     status_code=HTTPStatus.OK,
 )
-def altera_romancista(
+async def altera_romancista(
     romancista_id: int,
     session: T_Session,
     usuario_atual: T_CurrentUser,
     romancista_update: RomancistaUpdate,
 ):
-    # carrega o romancista por id do banco de dados
-    romancista_db = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
-    )
+    # atualiza e retorna o romancista em uma ida ao banco: nome de outro
+    # romancista é barrado pela constraint UNIQUE do banco; o update_at
+    # explícito volta no RETURNING também para o romancista já na sessão
+    try:
+        romancista_db = await session.scalar(
+            update(Romancista)
+            .where(Romancista.id == romancista_id)
+            .values(nome=romancista_update.nome, update_at=agora())
+            .returning(Romancista)
+        )
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(  # caso ja exista, levanta conflict
+            status_code=HTTPStatus.CONFLICT, detail='Nome já consta no MADR'
+        )
 
     # verifica se o romancista existe no banco de dados
     if not romancista_db:
@@ -116,26 +278,10 @@ def altera_romancista(
             detail='Romancista não consta no MADR',
         )
 
-    # verifica nome atualizado igual nome atual
-    if romancista_db.nome == romancista_update.nome:
-        # caso mesmo nome retorna romancista
-        return romancista_db
-
-    # verifica validade do nome atualizado
-    if romancista_update.nome and session.scalar(
-        select(Romancista).where(Romancista.nome == romancista_update.nome)
-    ):
-        raise HTTPException(  # caso ja exista, levanta conflict
-            status_code=HTTPStatus.CONFLICT, detail='Nome já consta no MADR'
-        )
-
-    # atualiza o banco de dados
-    romancista_db.nome = romancista_update.nome
-    session.add(romancista_db)
-    session.commit()
-    session.refresh(romancista_db)
-
-    # retorna o livro atualizado
+    # retorna o romancista atualizado
+    indice_romancistas.adiciona(romancista_db.id, romancista_db.nome)
+    romancistas_por_id.guarda(romancista_db.id, dados_publicos(romancista_db))
+    nova_geracao('romancistas')
     return romancista_db
 
 
@@ -143,27 +289,33 @@ def altera_romancista(
 @router.delete(
     '/{romancista_id}', response_model=Message, status_code=HTTPStatus.OK
 )
-def deleta_romancista(
+async def deleta_romancista(
     romancista_id: int,
     session: T_Session,
     usuario_atual: T_CurrentUser,
 ):
-    # carrega o romancista buscado por id no banco de dados
-    romancista_db = session.scalar(
-        select(Romancista).where(Romancista.id == romancista_id)
+    # deleta em um único DELETE: os livros do romancista são removidos
+    # pelo ON DELETE CASCADE do banco, sem carregá-los na sessão
+    deletado = await session.scalar(
+        delete(Romancista)
+        .where(Romancista.id == romancista_id)
+        .returning(Romancista.id)
     )
 
-    # verifica se o romancista existe no banco de dados
-    if not romancista_db:
+    # verifica se o romancista existia no banco de dados
+    if not deletado:
         # levanta a excecao NOT FOUND,
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Romancista não consta no MADR',
         )
 
-    # deleta do banco de dados
-    session.delete(romancista_db)
-    session.commit()
+    await session.commit()
+    indice_romancistas.remove(romancista_id)
+    indice_livros.remove_grupo(romancista_id)  # removidos em cascata
+    romancistas_por_id.invalida(romancista_id)
+    livros_por_id.invalida_grupo(romancista_id)
+    nova_geracao('romancistas', 'livros')
 
     # retorna mensagem de sucesso
     return {'message': 'Romancista deletado no MADR'}
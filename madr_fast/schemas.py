@@ -1,8 +1,9 @@
 import re
 from datetime import datetime as dt
-from typing import TypeVar
+from typing import Annotated, Generic, Literal, TypeVar
 
-from fastapi_pagination import Page
+from fastapi import Query
+from fastapi_pagination import Page, Params
 from fastapi_pagination.customization import (
     CustomizedPage,
     UseFieldsAliases,
@@ -24,12 +25,51 @@ def valida_e_sanitiza(text):
     return ' '.join(text.lower().split())
 
 
+# * Campos esparsos ---
+# ?campos= com nomes de campos do modelo separados por vírgula
+def parametro_campos(modelo):
+    nomes = '|'.join(modelo.model_fields)
+    return Annotated[
+        str | None,
+        Query(
+            pattern=rf'^({nomes})(,({nomes}))*$',
+            description='Campos da resposta, ex.: id,titulo',
+        ),
+    ]
+
+
 # * Paginação ---
 tamanho_pagina = 20  # itens
 T = TypeVar('T')
 
+
+class ParamsCursor(Params):
+    cursor: str | None = Query(
+        None, description='Cursor próximo/anterior de outra página'
+    )
+
+
+# página por número (OFFSET) ou por cursor (seek pela chave de ordenação,
+# custo igual em qualquer profundidade); traz os cursores vizinhos e a
+# origem do total
+class PaginaCursor(Page[T], Generic[T]):
+    proximo: str | None = None
+    anterior: str | None = None
+    # como o total foi obtido: exact, cached, estimated ou omitted
+    total_modo: str = 'exact'
+
+    __params_type__ = ParamsCursor
+
+    @classmethod
+    def create(cls, items, params, *, total=None, **kwargs):
+        pagina = super().create(items, params, total=total, **kwargs)
+        if params.cursor:  # por cursor, a página não tem número
+            pagina.page = None
+        return pagina
+
+
 PaginaLivros = CustomizedPage[
-    Page[T],
+    PaginaCursor[T],
     UseName('PaginaLivros'),
     UseParamsFields(size=tamanho_pagina),
     UseFieldsAliases(
@@ -37,11 +77,44 @@ PaginaLivros = CustomizedPage[
         page='página',
         size='tamanho',
         pages='páginas',
+        proximo='próximo',
+    ),
+]
+
+
+class ContagemFaceta(BaseModel):
+    valor: int
+    total: int
+
+
+class Facetas(BaseModel):
+    ano: list[ContagemFaceta] | None = None
+    romancista: list[ContagemFaceta] | None = None  # por romancista_id
+    # filtro acima de DATABASE_FACET_LIMIT linhas: contagens só das
+    # primeiras linhas
+    parcial: bool = False
+
+
+# página da busca por query, com as facetas pedidas
+class PaginaFacetada(PaginaCursor[T], Generic[T]):
+    facetas: Facetas | None = None
+
+
+PaginaLivrosFacetada = CustomizedPage[
+    PaginaFacetada[T],
+    UseName('PaginaLivrosFacetada'),
+    UseParamsFields(size=tamanho_pagina),
+    UseFieldsAliases(
+        items='livros',
+        page='página',
+        size='tamanho',
+        pages='páginas',
+        proximo='próximo',
     ),
 ]
 
 PaginaRomancistas = CustomizedPage[
-    Page[T],
+    PaginaCursor[T],
     UseName('PaginaRomancistas'),
     UseParamsFields(size=tamanho_pagina),
     UseFieldsAliases(
@@ -49,6 +122,7 @@ PaginaRomancistas = CustomizedPage[
         page='página',
         size='tamanho',
         pages='páginas',
+        proximo='próximo',
     ),
 ]
 
@@ -94,6 +168,10 @@ class LivroPublic(LivroSchema):
     id: int
 
 
+CamposLivro = parametro_campos(LivroPublic)
+ExpandirLivro = Literal['romancista'] | None  # ?expandir=
+
+
 class LivroUpdate(BaseModel):
     titulo: str | None = Field(default=None, min_length=1)
     ano: int | None = Field(gt=0, lt=dt.today().year + 1, default=None)
@@ -102,6 +180,27 @@ class LivroUpdate(BaseModel):
     _valida_e_sanitiza = field_validator('titulo')(valida_e_sanitiza)
 
 
+class LivroSugestao(BaseModel):
+    id: int
+    titulo: str
+
+
+class FiltroLivros(BaseModel):
+    # parâmetros de GET /livros/query/
+    titulo: str | None = None
+    ano: int | None = None
+    ano_min: int | None = None
+    ano_max: int | None = None
+    ordenar_por: Literal['titulo', 'ano', 'id'] = 'titulo'
+    ordem: Literal['asc', 'desc'] = 'asc'
+    # contagens agrupadas para o mesmo filtro, ex.: 'ano,romancista'
+    facetas: Annotated[
+        str | None, Query(pattern=r'^(ano|romancista)(,(ano|romancista))*$')
+    ] = None
+    campos: CamposLivro = None
+    expandir: ExpandirLivro = None
+
+
 # * Romancista ---
 class RomancistaSchema(BaseModel):
     nome: str = Field(min_length=1)
@@ -113,6 +212,10 @@ class RomancistaPublic(RomancistaSchema):
     id: int
 
 
+CamposRomancista = parametro_campos(RomancistaPublic)
+IncluirRomancista = Literal['livros'] | None  # ?incluir=
+
+
 class RomancistaUpdate(BaseModel):
     nome: str = Field(min_length=1)
 
@@ -127,3 +230,41 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
+
+
+# * Interno ---
+class CachePublic(BaseModel):
+    itens: int
+    acertos: int
+    faltas: int
+    despejos: int
+    negativos: int
+
+
+class CoalescenciaPublic(BaseModel):
+    em_andamento: int
+    execucoes: int
+    coalescidas: int
+
+
+class PoolPublic(BaseModel):
+    tamanho: int
+    em_uso: int
+    ociosas: int
+    overflow_em_uso: int
+    pico_em_uso: int
+    checkouts: int
+    checkins: int
+    timeouts: int
+    espera_media_ms: float
+    espera_max_ms: float
+
+
+# * Recursos relacionados (?expandir=romancista, ?incluir=livros) ---
+class LivroComRomancista(LivroPublic):
+    romancista: RomancistaPublic | None  # removido durante a busca
+
+
+class RomancistaComLivros(RomancistaPublic):
+    livros: list[LivroPublic]
+    livros_truncados: bool = False  # mais livros que EMBED_LIVROS_LIMIT
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from http import HTTPStatus
 from typing import Annotated
@@ -8,10 +9,11 @@ from fastapi.security import OAuth2PasswordBearer
 from jwt import decode, encode
 from jwt.exceptions import PyJWTError
 from pwdlib import PasswordHash
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from zoneinfo import ZoneInfo
 
+from madr_fast.cache import AUSENTE, CacheTTL
+from madr_fast.consultas import usuario_por_email
 from madr_fast.database import get_session
 from madr_fast.models import Usuario
 from madr_fast.schemas import TokenData
@@ -34,9 +36,15 @@ By default, if no HTTP Authorization header is provided, required for
 
     This is useful when you want to have optional authentication."""
 
+# usuários autenticados por email; as rotas que alteram ou removem a conta
+# invalidam a entrada (em outros workers, ela vence com o TTL)
+principais = CacheTTL(
+    settings.AUTH_PRINCIPAL_CACHE_SIZE, settings.AUTH_PRINCIPAL_CACHE_TTL
+)
+
 # tipos annotated
 T_Token = Annotated[str, Depends(oauth2_scheme)]
-T_Session = Annotated[Session, Depends(get_session)]
+T_Session = Annotated[AsyncSession, Depends(get_session)]
 
 
 def create_access_token(data: dict):
@@ -59,7 +67,7 @@ def verify_password(plain_pwd: str, hashed_pwd: str):
     return pwd_context.verify(plain_pwd, hashed_pwd)
 
 
-def get_current_user(
+async def get_current_user(
     session: T_Session,
     token: T_Token,
 ):
@@ -80,10 +88,31 @@ def get_current_user(
     except PyJWTError:
         raise credentials_exception
 
-    usuario = session.scalar(
-        select(Usuario).where(Usuario.email == token_data.username)
-    )
+    usuario = principais.obtem(token_data.username)
+    if usuario is not AUSENTE:
+        return usuario
+
+    usuario = await session.scalar(usuario_por_email(token_data.username))
 
     if not usuario:
         raise credentials_exception
+
+    # a entrada não sobrevive ao token que a trouxe
+    usuario = _principal(usuario)
+    expira = payload.get('exp')
+    validade = principais.ttl
+    if expira is not None:
+        validade = min(validade, expira - time.time())
+    if validade > 0:
+        principais.guarda(token_data.username, usuario, validade)
     return usuario
+
+
+def _principal(usuario):
+    # cópia fora da sessão da requisição: o rollback de uma requisição não
+    # expira o usuário compartilhado com as outras
+    principal = Usuario(
+        username=usuario.username, senha=usuario.senha, email=usuario.email
+    )
+    principal.id = usuario.id
+    return principal
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,3 +12,101 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    # endpoints internos de operação (/interno: pool, caches, coalescência);
+    # desligados, respondem 404; ligar só onde a porta não é pública
+    INTERNAL_ENDPOINTS: bool = False
+
+    # pool de conexões (padrões do SQLAlchemy)
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30  # segundos esperando por conexão
+    DATABASE_POOL_RECYCLE: int = -1  # segundos, -1 desativa
+    DATABASE_POOL_PRE_PING: bool = False
+
+    # consultas por chave primária/email via lambda_stmt (cache de SQL) e
+    # statements preparados no servidor (prepare_threshold do psycopg); o
+    # limiar vale para todo statement da conexão, não só para essas consultas.
+    # Desligado, nenhum statement é preparado (prepare_threshold=None)
+    DATABASE_PREPARED_STATEMENTS: bool = False
+    DATABASE_PREPARE_THRESHOLD: int = 0  # execuções antes de preparar
+
+    # orçamento de tempo por consulta (statement_timeout, ms; 0 = sem limite)
+    # padrão de todas as rotas e o das buscas por query, mais caras
+    DATABASE_STATEMENT_TIMEOUT: int = 5_000
+    DATABASE_SEARCH_STATEMENT_TIMEOUT: int = 1_000
+
+    # group commit: POSTs de livros/romancistas que chegam dentro da janela
+    # (segundos) são inseridos em uma só transação, até o tamanho máximo
+    DATABASE_GROUP_COMMIT: bool = False
+    DATABASE_GROUP_COMMIT_WINDOW: float = 0.005
+    DATABASE_GROUP_COMMIT_MAX_BATCH: int = 100
+
+    # SQLite (DATABASE_URL='sqlite+aiosqlite:///madr.db', ou
+    # 'sqlite+aiosqlite://' em memória): bytes do arquivo mapeados em memória
+    DATABASE_SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+
+    # réplicas de leitura para as rotas GET (vazio = tudo no primário);
+    # no .env como JSON: DATABASE_REPLICA_URLS='["postgresql+psycopg://..."]'
+    DATABASE_REPLICA_URLS: list[str] = []
+    DATABASE_REPLICA_STRATEGY: Literal['round_robin', 'least_connections'] = (
+        'round_robin'
+    )
+    # segundos em que as leituras de quem acabou de escrever vão ao primário
+    # (read-your-writes), 0 desativa
+    DATABASE_READ_YOUR_WRITES: float = 0
+
+    # total das listagens paginadas: 'exact' (count a cada página),
+    # 'cached' (count guardado por filtro durante o TTL, segundos),
+    # 'estimated' (linhas estimadas pelo planner do Postgres, com count
+    # exato abaixo do limite) ou 'omitted' (sem total)
+    DATABASE_COUNT_STRATEGY: Literal[
+        'exact', 'cached', 'estimated', 'omitted'
+    ] = 'exact'
+    DATABASE_COUNT_CACHE_TTL: float = 30
+    DATABASE_COUNT_CACHE_SIZE: int = 1_000  # filtros guardados
+    DATABASE_COUNT_ESTIMATE_THRESHOLD: int = 10_000
+
+    # facetas da busca por query (?facetas=ano,romancista): contagens sobre
+    # no máximo tantas linhas do filtro; acima disso, marcadas como parciais
+    DATABASE_FACET_LIMIT: int = 10_000
+
+    # ?incluir=livros: no máximo tantos livros por romancista (os primeiros
+    # pelo título), com livros_truncados=true nos que têm mais
+    EMBED_LIVROS_LIMIT: int = 100
+
+    # autocompletar: índices de prefixos em memória, carregados na
+    # inicialização e recarregados do banco a cada intervalo (segundos, 0
+    # desativa), para ver as escritas feitas por outros workers
+    AUTOCOMPLETE_REFRESH_INTERVAL: float = 300
+
+    # páginas das buscas (/livros/query/, /livros/busca e /romancistas/
+    # query/) guardadas por parâmetros, até o TTL (segundos, 0 desativa) ou
+    # até qualquer escrita na tabela; limitadas em número e em bytes
+    SEARCH_CACHE_TTL: float = 30
+    SEARCH_CACHE_SIZE: int = 1_000
+    SEARCH_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # GETs idênticos simultâneos (mesma rota, parâmetros e página, na mesma
+    # geração das tabelas) compartilham uma execução no banco e o resultado
+    REQUEST_COALESCING: bool = True
+
+    # Cache-Control das leituras de livros e romancistas (vazio = sem o
+    # cabeçalho); o padrão obriga a revalidar com ETag/Last-Modified, e
+    # ex.: 'public, max-age=0, s-maxage=10' deixa um proxy reverso servir
+    # as leituras repetidas por 10 segundos
+    HTTP_CACHE_CONTROL: str = 'no-cache'
+
+    # buscas por id de livros e romancistas: entidades em memória por
+    # OBJECT_CACHE_TTL segundos e ids inexistentes (404) por
+    # OBJECT_CACHE_NEGATIVE_TTL; backend 'none' desativa o cache
+    OBJECT_CACHE_BACKEND: Literal['memory', 'none'] = 'memory'
+    OBJECT_CACHE_TTL: float = 60
+    OBJECT_CACHE_NEGATIVE_TTL: float = 5
+    OBJECT_CACHE_SIZE: int = 10_000
+
+    # usuários autenticados guardados por email (subject do token), sem o
+    # SELECT a cada requisição autenticada; a entrada vale o TTL (segundos,
+    # 0 desativa), nunca além da expiração do token que a trouxe
+    AUTH_PRINCIPAL_CACHE_TTL: float = 60
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10_000
@@ -2,6 +2,7 @@
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
+from sqlalchemy import make_url
 from sqlalchemy import pool
 
 from alembic import context
@@ -10,7 +11,14 @@ from madr_fast.models import table_registry
 from madr_fast.settings import Settings
 
 config = context.config
-config.set_main_option('sqlalchemy.url', Settings().DATABASE_URL)
+url = make_url(Settings().DATABASE_URL)
+sqlite = url.get_backend_name() == 'sqlite'
+if sqlite:
+    # migrações rodam com o driver síncrono (sqlite3) em vez do aiosqlite
+    url = url.set(drivername='sqlite')
+config.set_main_option(
+    'sqlalchemy.url', url.render_as_string(hide_password=False)
+)
 
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -18,6 +26,15 @@ if config.config_file_name is not None:
 target_metadata = table_registry.metadata
 
 
+def include_object(objeto, nome, tipo, refletido, comparado_a):
+    # objetos com ddl_if de outro dialeto (ex.: índices de trigramas, só no
+    # Postgres) não existem neste banco e não entram no autogenerate
+    ddl_if = getattr(objeto, '_ddl_if', None)
+    if ddl_if is not None and ddl_if.dialect is not None:
+        return ddl_if.dialect == url.get_backend_name()
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -57,7 +74,11 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # o SQLite não altera constraints: recria a tabela (batch)
+            render_as_batch=sqlite,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,83 @@
+"""indices cobertos das ordenacoes
+
+Revision ID: 0b6c2f8e4a17
+Revises: f3a8d5e61b29
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6c2f8e4a17'
+down_revision: Union[str, None] = 'f3a8d5e61b29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # INCLUDE só existe no Postgres: no SQLite (ano, titulo) continua igual
+    # e o índice de titulo já existe (unique)
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    # um índice por ordenar_por, com as colunas públicas no INCLUDE
+    # (index-only scan); o (ano, titulo) é recriado com o INCLUDE e a ordem
+    # por id fica com a chave primária, na ordem física da tabela
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_livros_ano_titulo_cobertura',
+            'livros',
+            ['ano', 'titulo'],
+            unique=False,
+            postgresql_include=['id', 'romancista_id'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_ano_titulo',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            'ALTER INDEX ix_livros_ano_titulo_cobertura'
+            ' RENAME TO ix_livros_ano_titulo'
+        )
+        op.create_index(
+            'ix_livros_titulo_cobertura',
+            'livros',
+            ['titulo'],
+            unique=False,
+            postgresql_include=['ano', 'id', 'romancista_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_livros_titulo_cobertura',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_livros_ano_titulo_simples',
+            'livros',
+            ['ano', 'titulo'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_ano_titulo',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            'ALTER INDEX ix_livros_ano_titulo_simples'
+            ' RENAME TO ix_livros_ano_titulo'
+        )
@@ -0,0 +1,52 @@
+"""indices de chave estrangeira e filtros
+
+Revision ID: 5b7e2c9d4f10
+Revises: a01291f63545
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c9d4f10'
+down_revision: Union[str, None] = 'a01291f63545'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY não bloqueia escritas na tabela, mas não
+    # pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_livros_romancista_id'),
+            'livros',
+            ['romancista_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            op.f('ix_livros_ano'),
+            'livros',
+            ['ano'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_livros_ano'),
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            op.f('ix_livros_romancista_id'),
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
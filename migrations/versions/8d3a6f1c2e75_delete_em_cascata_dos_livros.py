@@ -0,0 +1,76 @@
+"""delete em cascata dos livros
+
+Revision ID: 8d3a6f1c2e75
+Revises: 5b7e2c9d4f10
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3a6f1c2e75'
+down_revision: Union[str, None] = '5b7e2c9d4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# a foreign key criada no SQLite não tem nome: o batch a nomeia pela convenção
+convencao_sqlite = {'fk': 'fk_%(table_name)s_%(column_0_name)s'}
+
+
+def troca_foreign_key_sqlite(ondelete) -> None:
+    (foreign_key,) = sa.inspect(op.get_bind()).get_foreign_keys('livros')
+    nome_atual = foreign_key['name'] or 'fk_livros_romancista_id'
+
+    # o SQLite não altera constraints: o batch recria a tabela livros
+    with op.batch_alter_table(
+        'livros', naming_convention=convencao_sqlite
+    ) as batch_op:
+        batch_op.drop_constraint(nome_atual, type_='foreignkey')
+        batch_op.create_foreign_key(
+            'livros_romancista_id_fkey',
+            'romancistas',
+            ['romancista_id'],
+            ['id'],
+            ondelete=ondelete,
+        )
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == 'sqlite':
+        troca_foreign_key_sqlite('CASCADE')
+        return
+
+    # troca a foreign key por uma com ON DELETE CASCADE (mesma transação)
+    op.drop_constraint(
+        'livros_romancista_id_fkey', 'livros', type_='foreignkey'
+    )
+    op.create_foreign_key(
+        'livros_romancista_id_fkey',
+        'livros',
+        'romancistas',
+        ['romancista_id'],
+        ['id'],
+        ondelete='CASCADE',
+    )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == 'sqlite':
+        troca_foreign_key_sqlite(None)
+        return
+
+    op.drop_constraint(
+        'livros_romancista_id_fkey', 'livros', type_='foreignkey'
+    )
+    op.create_foreign_key(
+        'livros_romancista_id_fkey',
+        'livros',
+        'romancistas',
+        ['romancista_id'],
+        ['id'],
+    )
@@ -0,0 +1,65 @@
+"""indices de trigramas para busca
+
+Revision ID: c4e19a7b3d52
+Revises: 8d3a6f1c2e75
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e19a7b3d52'
+down_revision: Union[str, None] = '8d3a6f1c2e75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # só no Postgres: no SQLite a busca contains continua sem índice
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # GIN com gin_trgm_ops atende LIKE '%x%'; CONCURRENTLY não bloqueia
+    # escritas, mas não pode rodar dentro de uma transação
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_livros_titulo_trgm',
+            'livros',
+            ['titulo'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'titulo': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_romancistas_nome_trgm',
+            'romancistas',
+            ['nome'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'nome': 'gin_trgm_ops'},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        return
+
+    # a extensão fica: removê-la pode afetar outros objetos do banco
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_romancistas_nome_trgm',
+            table_name='romancistas',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_titulo_trgm',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,123 @@
+"""busca textual em portugues
+
+Revision ID: e7b2c9d41f08
+Revises: c4e19a7b3d52
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c9d41f08'
+down_revision: Union[str, None] = 'c4e19a7b3d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # no SQLite a coluna existe (mesmo schema), mas fica vazia: a busca
+    # cai em LIKE por termo
+    if op.get_context().dialect.name != 'postgresql':
+        op.add_column(
+            'livros', sa.Column('vetor_busca', sa.Text(), nullable=True)
+        )
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.add_column(
+        'livros',
+        sa.Column('vetor_busca', postgresql.TSVECTOR(), nullable=True),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION livros_documento(titulo text, nome text)
+        RETURNS tsvector LANGUAGE sql STABLE AS $$
+            SELECT setweight(to_tsvector('portuguese', unaccent(titulo)), 'A')
+                || setweight(
+                    to_tsvector('portuguese', unaccent(coalesce(nome, ''))),
+                    'B'
+                )
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION livros_atualiza_vetor_busca()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.vetor_busca := livros_documento(
+                NEW.titulo,
+                (SELECT nome FROM romancistas WHERE id = NEW.romancista_id)
+            );
+            RETURN NEW;
+        END $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER livros_vetor_busca
+        BEFORE INSERT OR UPDATE OF titulo, romancista_id ON livros
+        FOR EACH ROW EXECUTE FUNCTION livros_atualiza_vetor_busca()
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION romancistas_atualiza_vetor_busca()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE livros SET vetor_busca = livros_documento(titulo, NEW.nome)
+            WHERE romancista_id = NEW.id;
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER romancistas_vetor_busca
+        AFTER UPDATE OF nome ON romancistas
+        FOR EACH ROW WHEN (OLD.nome IS DISTINCT FROM NEW.nome)
+        EXECUTE FUNCTION romancistas_atualiza_vetor_busca()
+        """
+    )
+    # livros já cadastrados
+    op.execute(
+        """
+        UPDATE livros SET vetor_busca = livros_documento(livros.titulo, r.nome)
+        FROM romancistas r WHERE r.id = livros.romancista_id
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_livros_vetor_busca',
+            'livros',
+            ['vetor_busca'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != 'postgresql':
+        with op.batch_alter_table('livros') as batch_op:
+            batch_op.drop_column('vetor_busca')
+        return
+
+    # a extensão fica, como a pg_trgm
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_livros_vetor_busca',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+    op.execute('DROP TRIGGER romancistas_vetor_busca ON romancistas')
+    op.execute('DROP FUNCTION romancistas_atualiza_vetor_busca()')
+    op.execute('DROP TRIGGER livros_vetor_busca ON livros')
+    op.execute('DROP FUNCTION livros_atualiza_vetor_busca()')
+    op.execute('DROP FUNCTION livros_documento(text, text)')
+    op.drop_column('livros', 'vetor_busca')
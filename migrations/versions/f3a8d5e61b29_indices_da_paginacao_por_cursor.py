@@ -0,0 +1,77 @@
+"""indices da paginacao por cursor
+
+Revision ID: f3a8d5e61b29
+Revises: e7b2c9d41f08
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8d5e61b29'
+down_revision: Union[str, None] = 'e7b2c9d41f08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (filtro, titulo) atende o filtro e o seek da ordem das listagens; os
+    # índices de uma coluna ficam redundantes (o de romancista_id continua
+    # coberto para o ON DELETE CASCADE)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_livros_romancista_id_titulo',
+            'livros',
+            ['romancista_id', 'titulo'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_livros_ano_titulo',
+            'livros',
+            ['ano', 'titulo'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_romancista_id',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_ano',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_livros_ano',
+            'livros',
+            ['ano'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_livros_romancista_id',
+            'livros',
+            ['romancista_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_ano_titulo',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_livros_romancista_id_titulo',
+            table_name='livros',
+            postgresql_concurrently=True,
+        )
@@ -1,68 +1,104 @@
+from contextlib import contextmanager
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from testcontainers.postgres import PostgresContainer
 
 from madr_fast.app import app
-from madr_fast.database import get_session
+from madr_fast.autocompletar import indice_livros, indice_romancistas
+from madr_fast.consultas import livros_por_id, romancistas_por_id
+from madr_fast.database import get_read_session, get_session
 from madr_fast.models import Livro, Romancista, table_registry
-from madr_fast.security import get_password_hash
+from madr_fast.paginacao import paginas
+from madr_fast.security import get_password_hash, principais
 from tests.factories import UsuarioFactory
 
 
-@pytest.fixture
-def client(session):
+@contextmanager
+def cliente_de_teste(session):
+    """TestClient da aplicação servido pela sessão do teste."""
+
     def get_session_override():
         return session
 
     with TestClient(app) as client:
         app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_read_session] = get_session_override
+        # a carga da inicialização leu o banco da aplicação, não o do teste
+        indice_livros.descarta()
+        indice_romancistas.descarta()
+        # usuários autenticados em testes anteriores, de outros bancos
+        principais.limpa()
+        livros_por_id.limpa()
+        romancistas_por_id.limpa()
+        paginas.limpa()
         yield client
 
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def client(session):
+    with cliente_de_teste(session) as client:
+        yield client
+
+
 @pytest.fixture(scope='session')
 def engine():
     with PostgresContainer('postgres:16', driver='psycopg') as postgres:
-        _engine = create_engine(postgres.get_connection_url())
-
-        with _engine.begin():
-            yield _engine
+        _engine = create_async_engine(postgres.get_connection_url())
+        yield _engine
 
 
-@pytest.fixture
-def session(engine):
-    table_registry.metadata.create_all(engine)
+@pytest_asyncio.fixture
+async def session(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
 
-    with Session(engine) as session:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
-        session.rollback()
+        await session.rollback()
 
-    table_registry.metadata.drop_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
 
 
 @pytest.fixture
-def usuario(session):
+def consultas_executadas(engine):
+    # registra o SQL enviado ao banco durante o teste
+    consultas = []
+
+    def registra(conn, cursor, statement, *args):
+        consultas.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', registra)
+    yield consultas
+    event.remove(engine.sync_engine, 'before_cursor_execute', registra)
+
+
+@pytest_asyncio.fixture
+async def usuario(session):
     segredo = 'segredo'
     usuario = UsuarioFactory(senha=get_password_hash(segredo))
     session.add(usuario)
-    session.commit()
-    session.refresh(usuario)
+    await session.commit()
+    await session.refresh(usuario)
 
     usuario.senha_pura = segredo
 
     return usuario
 
 
-@pytest.fixture
-def outro_usuario(session):
+@pytest_asyncio.fixture
+async def outro_usuario(session):
     segredo = 'segredo'
     usuario = UsuarioFactory(senha=get_password_hash(segredo))
     session.add(usuario)
-    session.commit()
-    session.refresh(usuario)
+    await session.commit()
+    await session.refresh(usuario)
 
     usuario.senha_pura = segredo
 
@@ -82,43 +118,43 @@ def token(client, usuario):
     return response.json()['access_token']
 
 
-@pytest.fixture
-def romancista(session):
+@pytest_asyncio.fixture
+async def romancista(session):
     romancista = Romancista(nome='jorge')
 
     session.add(romancista)
-    session.commit()
-    session.refresh(romancista)
+    await session.commit()
+    await session.refresh(romancista)
 
     return romancista
 
 
-@pytest.fixture
-def livro(session, romancista):
+@pytest_asyncio.fixture
+async def livro(session, romancista):
     livro = Livro(
         titulo='o ultimo romantico', ano=2000, romancista_id=romancista.id
     )
 
     session.add(livro)
-    session.commit()
-    session.refresh(livro)
+    await session.commit()
+    await session.refresh(livro)
 
     return livro
 
 
-@pytest.fixture
-def outro_romancista(session):
+@pytest_asyncio.fixture
+async def outro_romancista(session):
     romancista = Romancista(nome='cleber')
 
     session.add(romancista)
-    session.commit()
-    session.refresh(romancista)
+    await session.commit()
+    await session.refresh(romancista)
 
     return romancista
 
 
-@pytest.fixture
-def outro_livro(session, outro_romancista):
+@pytest_asyncio.fixture
+async def outro_livro(session, outro_romancista):
     livro = Livro(
         titulo='mais romantico mais furioso',
         ano=2005,
@@ -126,7 +162,7 @@ def outro_livro(session, outro_romancista):
     )
 
     session.add(livro)
-    session.commit()
-    session.refresh(livro)
+    await session.commit()
+    await session.refresh(livro)
 
     return livro
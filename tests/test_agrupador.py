@@ -0,0 +1,99 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+
+from madr_fast import agrupador as modulo_agrupador
+from madr_fast.agrupador import AgrupadorDeEscritas
+from madr_fast.models import Romancista
+
+
+@pytest.fixture
+def commits(engine):
+    # conta os COMMITs enviados ao banco durante o teste
+    contagem = []
+
+    def conta(conn):
+        contagem.append(conn)
+
+    event.listen(engine.sync_engine, 'commit', conta)
+    yield contagem
+    event.remove(engine.sync_engine, 'commit', conta)
+
+
+@pytest.mark.asyncio
+async def test_agrupador_grava_lote_em_um_commit(
+    session, engine, romancista, commits
+):
+    agrupador = AgrupadorDeEscritas(engine, janela=0.05, max_lote=10)
+    nomes = ['ana', 'bia', romancista.nome, 'caio']
+
+    resultados = await asyncio.gather(
+        *(agrupador.insere(Romancista, {'nome': nome}) for nome in nomes),
+        return_exceptions=True,
+    )
+
+    # o nome repetido falha só o seu chamador
+    assert [r.nome for r in resultados if isinstance(r, Romancista)] == [
+        'ana',
+        'bia',
+        'caio',
+    ]
+    assert isinstance(resultados[2], IntegrityError)
+    assert len(commits) == 1
+
+    nomes_db = await session.scalars(select(Romancista.nome))
+    assert sorted(nomes_db) == sorted(nomes)
+
+
+@pytest.mark.asyncio
+async def test_agrupador_dispara_ao_atingir_lote_maximo(
+    session, engine, commits
+):
+    # janela longa: só o tamanho máximo dispara os lotes
+    agrupador = AgrupadorDeEscritas(engine, janela=60, max_lote=2)
+    num_lotes = 2
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(
+        *(
+            agrupador.insere(Romancista, {'nome': f'nome {i}'})
+            for i in range(4)
+        )
+    )
+
+    assert time.perf_counter() - inicio < 1
+    assert len(resultados) == num_lotes * agrupador.max_lote
+    assert len(commits) == num_lotes
+
+
+def test_cadastra_via_agrupador_retorna_resultado_de_cada_chamador(
+    client, engine, token, romancista, monkeypatch
+):
+    monkeypatch.setattr(
+        modulo_agrupador,
+        'agrupador',
+        AgrupadorDeEscritas(engine, janela=0.001, max_lote=10),
+    )
+    headers = {'Authorization': f'Bearer {token}'}
+    livro = {'titulo': 'livro', 'ano': 1950, 'romancista_id': romancista.id}
+
+    criado = client.post('/livros/', headers=headers, json=livro)
+    repetido = client.post('/livros/', headers=headers, json=livro)
+    sem_romancista = client.post(
+        '/livros/',
+        headers=headers,
+        json={**livro, 'titulo': 'outro', 'romancista_id': 999},
+    )
+    romancista_criado = client.post(
+        '/romancistas/', headers=headers, json={'nome': 'outro nome'}
+    )
+
+    assert criado.status_code == HTTPStatus.CREATED
+    assert criado.json()['titulo'] == 'livro'
+    assert repetido.status_code == HTTPStatus.CONFLICT
+    assert sem_romancista.status_code == HTTPStatus.NOT_FOUND
+    assert romancista_criado.status_code == HTTPStatus.CREATED
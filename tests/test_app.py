@@ -1,8 +1,13 @@
+import time
 from http import HTTPStatus
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 from madr_fast.app import app
+from madr_fast.database import get_read_session, settings
 
 
 def test_root_retorna_ok_e_message():
@@ -12,3 +17,38 @@ def test_root_retorna_ok_e_message():
 
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {'message': 'Bem-vindo!'}
+
+
+@pytest.mark.asyncio
+async def test_busca_que_excede_o_prazo_retorna_gateway_timeout(
+    client, engine
+):
+    # outra conexão trava a tabela: a busca espera até o statement_timeout
+    async with engine.begin() as conn:
+        await conn.execute(text('LOCK TABLE livros IN ACCESS EXCLUSIVE MODE'))
+        inicio = time.perf_counter()
+        response = client.get('/livros/query/?titulo=a')
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+    assert response.status_code == HTTPStatus.GATEWAY_TIMEOUT
+    assert response.json() == {
+        'detail': 'Consulta excedeu o tempo limite do MADR'
+    }
+    # vale o prazo da rota de busca, não o padrão
+    assert duracao_ms >= settings.DATABASE_SEARCH_STATEMENT_TIMEOUT
+    assert duracao_ms < settings.DATABASE_STATEMENT_TIMEOUT
+
+
+def test_pool_esgotado_retorna_service_unavailable(client):
+    def pool_esgotado():
+        raise PoolTimeoutError
+
+    app.dependency_overrides[get_read_session] = pool_esgotado
+
+    response = client.get('/livros/1')
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response.json() == {
+        'detail': 'MADR sobrecarregado, tente novamente'
+    }
+    assert response.headers['Retry-After'] == '1'
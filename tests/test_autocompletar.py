@@ -0,0 +1,214 @@
+import asyncio
+import time
+from contextlib import suppress
+from http import HTTPStatus
+
+import pytest
+
+from madr_fast.autocompletar import (
+    IndicePrefixos,
+    indice_livros,
+    recarrega_periodicamente,
+)
+from tests.factories import LivroFactory, RomancistaFactory
+
+UM_MILISSEGUNDO = 1e-3
+
+
+def test_indice_busca_por_prefixo_em_ordem_e_com_limite():
+    indice = IndicePrefixos()
+    indice.carrega([
+        (1, 'dom casmurro', 10),
+        (2, 'dom quixote', 20),
+        (3, 'domingo', 10),
+        (4, 'a hora da estrela', 10),
+    ])
+
+    assert indice.busca('dom', 10) == [
+        (1, 'dom casmurro'),
+        (2, 'dom quixote'),
+        (3, 'domingo'),
+    ]
+    assert indice.busca('dom ', 1) == [(1, 'dom casmurro')]
+    assert indice.busca('x', 10) == []
+
+
+def test_indice_adiciona_altera_e_remove():
+    indice = IndicePrefixos()
+    indice.carrega([(1, 'dom casmurro', 10), (2, 'dom quixote', 20)])
+
+    indice.adiciona(1, 'memorias postumas', 10)  # alteração do título
+    indice.adiciona(3, 'dom pedro', 10)
+    assert indice.busca('dom', 10) == [(3, 'dom pedro'), (2, 'dom quixote')]
+
+    indice.remove(2)
+    indice.remove(99)  # ausente: nada a fazer
+    assert indice.busca('dom', 10) == [(3, 'dom pedro')]
+
+    indice.remove_grupo(10)
+    assert len(indice) == 0
+
+
+def test_indice_reaplica_as_alteracoes_feitas_durante_a_carga():
+    indice = IndicePrefixos()
+    indice.carrega([(1, 'dom casmurro', 10)])
+
+    indice.inicia_carga()
+    # escritas deste processo enquanto o SELECT lia o retrato abaixo
+    indice.adiciona(2, 'dom quixote', 20)
+    indice.remove(1)
+    indice.carrega([(1, 'dom casmurro', 10), (3, 'domingo', 10)])
+
+    assert indice.busca('dom', 10) == [(2, 'dom quixote'), (3, 'domingo')]
+
+    # fora de uma carga, nada é registrado
+    indice.adiciona(4, 'dom pedro', 10)
+    indice.carrega([(3, 'domingo', 10)])
+    assert indice.busca('dom', 10) == [(3, 'domingo')]
+
+
+def test_indice_reaplica_as_alteracoes_anteriores_a_primeira_carga():
+    indice = IndicePrefixos()
+    indice.adiciona(2, 'dom quixote', 20)
+
+    # a primeira carga falhou: as alterações continuam registradas
+    indice.inicia_carga()
+    indice.cancela_carga()
+    indice.carrega([(1, 'dom casmurro', 10)])
+
+    assert indice.busca('dom', 10) == [(1, 'dom casmurro'), (2, 'dom quixote')]
+
+
+def test_indice_busca_em_menos_de_um_milissegundo():
+    indice = IndicePrefixos()
+    indice.carrega((i, f'livro {i:06}', None) for i in range(100_000))
+
+    inicio = time.perf_counter()
+    for _ in range(100):
+        indice.busca('livro 0421', 10)
+    duracao = (time.perf_counter() - inicio) / 100
+
+    assert duracao < UM_MILISSEGUNDO
+
+
+def test_autocompletar_livros_nao_consulta_o_banco_a_cada_tecla(
+    client, session, romancista, consultas_executadas
+):
+    session.add_all([
+        LivroFactory(titulo=titulo, romancista_id=romancista.id)
+        for titulo in ('dom casmurro', 'dom quixote', 'domingo', 'iracema')
+    ])
+    client.get('/livros/autocompletar?prefixo=d')  # primeira: carga
+    consultas_executadas.clear()
+
+    response = client.get('/livros/autocompletar?prefixo=DOM  ')
+    limitada = client.get('/livros/autocompletar?prefixo=dom&limite=2')
+
+    assert response.status_code == HTTPStatus.OK
+    assert [s['titulo'] for s in response.json()] == [
+        'dom casmurro',
+        'dom quixote',
+    ]
+    assert [s['titulo'] for s in limitada.json()] == [
+        'dom casmurro',
+        'dom quixote',
+    ]
+    assert consultas_executadas == []
+
+
+def test_autocompletar_livros_acompanha_as_escritas(client, romancista, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/livros/autocompletar?prefixo=x')  # carga
+
+    criado = client.post(
+        '/livros/',
+        headers=headers,
+        json={
+            'titulo': 'Quincas Borba',
+            'ano': 1891,
+            'romancista_id': romancista.id,
+        },
+    ).json()
+    assert client.get('/livros/autocompletar?prefixo=quin').json() == [
+        {'id': criado['id'], 'titulo': 'quincas borba'}
+    ]
+
+    client.patch(
+        f'/livros/{criado["id"]}',
+        headers=headers,
+        json={'titulo': 'Helena'},
+    )
+    assert client.get('/livros/autocompletar?prefixo=quin').json() == []
+    assert client.get('/livros/autocompletar?prefixo=hel').json() == [
+        {'id': criado['id'], 'titulo': 'helena'}
+    ]
+
+    client.delete(f'/livros/{criado["id"]}', headers=headers)
+    assert client.get('/livros/autocompletar?prefixo=hel').json() == []
+
+
+def test_autocompletar_romancistas_acompanha_as_escritas(
+    client, session, livro, romancista, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    session.add(RomancistaFactory(nome='jose de alencar'))
+
+    response = client.get('/romancistas/autocompletar?prefixo=jo')
+    assert [s['nome'] for s in response.json()] == ['jorge', 'jose de alencar']
+
+    client.patch(
+        f'/romancistas/{romancista.id}',
+        headers=headers,
+        json={'nome': 'Machado'},
+    )
+    response = client.get('/romancistas/autocompletar?prefixo=ma')
+    assert response.json() == [{'id': romancista.id, 'nome': 'machado'}]
+
+    # os livros do romancista saem junto (ON DELETE CASCADE)
+    client.delete(f'/romancistas/{romancista.id}', headers=headers)
+    assert client.get('/romancistas/autocompletar?prefixo=ma').json() == []
+    assert client.get('/livros/autocompletar?prefixo=o').json() == []
+
+
+def test_autocompletar_exige_prefixo(client):
+    response = client.get('/livros/autocompletar?prefixo=')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_autocompletar_nao_recarrega_durante_a_requisicao(
+    client, romancista, consultas_executadas
+):
+    client.get('/livros/autocompletar?prefixo=x')  # carga
+    indice_livros.carregado_em -= 24 * 60 * 60  # muito além do intervalo
+    consultas_executadas.clear()
+
+    response = client.get('/livros/autocompletar?prefixo=x')
+
+    assert response.status_code == HTTPStatus.OK
+    assert consultas_executadas == []
+
+
+@pytest.mark.asyncio
+async def test_recarga_periodica_traz_as_escritas_dos_outros_workers(
+    session, engine, romancista
+):
+    indice_livros.descarta()
+    session.add(LivroFactory(titulo='iracema', romancista_id=romancista.id))
+    await session.commit()
+
+    recarga = asyncio.create_task(recarrega_periodicamente(engine, 0.01))
+    encontrados = []
+    try:
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            encontrados = indice_livros.busca('ira', 10)
+            if encontrados:
+                break
+    finally:
+        recarga.cancel()
+        with suppress(asyncio.CancelledError):
+            await recarga
+        indice_livros.descarta()
+
+    assert [texto for _, texto in encontrados] == ['iracema']
@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from madr_fast import cache as modulo_cache
+from madr_fast.cache import AUSENTE, CachePorId, CacheTTL, cria_armazenamento
+
+
+def test_cache_despeja_o_usado_ha_mais_tempo():
+    cache = CacheTTL(max_itens=2, ttl=60)
+    cache.guarda('a', 1)
+    cache.guarda('b', 2)
+    cache.obtem('a')  # 'b' passa a ser o usado há mais tempo
+    cache.guarda('c', 3)
+
+    assert cache.obtem('b') is AUSENTE
+    assert (cache.obtem('a'), cache.obtem('c')) == (1, 3)
+    assert cache.estatisticas.despejos == 1
+    assert len(cache) == cache.max_itens
+
+
+def test_cache_expira_pelo_ttl(monkeypatch):
+    agora = 1_000.0
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', lambda: agora)
+    cache = CacheTTL(max_itens=10, ttl=30)
+    cache.guarda('curto', None, ttl=5)
+    cache.guarda('longo', 'valor')
+
+    agora += 10
+
+    # None guardado é um valor; expirado é ausente
+    assert cache.obtem('curto') is AUSENTE
+    assert cache.obtem('longo') == 'valor'
+    assert (cache.estatisticas.acertos, cache.estatisticas.faltas) == (1, 1)
+
+
+def test_cache_limitado_em_bytes_despeja_ate_caber():
+    cache = CacheTTL(max_itens=10, ttl=60, max_bytes=10)
+    cache.guarda('a', b'1234')
+    cache.guarda('b', b'1234')
+    cache.guarda('c', b'1234')  # 12 bytes: sai 'a'
+    cache.guarda('grande', b'12345678901')  # maior que o limite
+
+    assert cache.obtem('a') is AUSENTE
+    assert cache.obtem('grande') is AUSENTE
+    assert (cache.obtem('b'), cache.obtem('c')) == (b'1234', b'1234')
+    assert cache.bytes == len(b'12341234')
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_guarda_ausentes_pelo_ttl_negativo(monkeypatch):
+    agora = 1_000.0
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', lambda: agora)
+    cache = CachePorId(CacheTTL(max_itens=10, ttl=60), ttl_negativo=5)
+    carregados = []
+
+    async def carrega():
+        carregados.append(1)
+
+    assert await cache.obtem(1, carrega) is None
+    assert await cache.obtem(1, carrega) is None  # entrada negativa
+    agora += 10
+    assert await cache.obtem(1, carrega) is None
+
+    assert len(carregados) == len(['primeira', 'depois do ttl'])
+    assert cache.estatisticas.negativos == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_invalida_grupo():
+    cache = CachePorId(
+        CacheTTL(max_itens=10, ttl=60),
+        ttl_negativo=5,
+        grupo=lambda livro: livro['romancista_id'],
+    )
+    cache.guarda(1, {'id': 1, 'romancista_id': 7})
+    cache.guarda(2, {'id': 2, 'romancista_id': 8})
+
+    async def carrega():
+        return {'id': 1, 'romancista_id': 9}
+
+    cache.invalida_grupo(7)
+
+    assert await cache.obtem(1, carrega) == {'id': 1, 'romancista_id': 9}
+    assert await cache.obtem(2, carrega) == {'id': 2, 'romancista_id': 8}
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_desativado_sempre_carrega():
+    cache = CachePorId(cria_armazenamento('none', 10, 60), ttl_negativo=5)
+    cache.guarda(1, 'guardado')
+
+    async def carrega():
+        return 'do banco'
+
+    assert await cache.obtem(1, carrega) == 'do banco'
+    assert len(cache) == 0
+    assert cache.estatisticas.faltas == 1
+
+
+def carga_lenta(liberada, valor):
+    # carga que termina só quando `liberada` é sinalizado
+    async def carrega():
+        await liberada.wait()
+        return valor
+
+    return carrega
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_carga_que_cruza_uma_escrita_nao_guarda():
+    for escreve in (
+        lambda cache: cache.guarda(1, 'novo'),  # PATCH
+        lambda cache: cache.invalida(1),  # DELETE
+        lambda cache: cache.invalida_grupo(7),  # DELETE em cascata
+    ):
+        cache = CachePorId(CacheTTL(max_itens=10, ttl=60), ttl_negativo=5)
+        liberada = asyncio.Event()
+        lenta = asyncio.create_task(
+            cache.obtem(1, carga_lenta(liberada, 'antigo'))
+        )
+        await asyncio.sleep(0)
+        escreve(cache)
+        liberada.set()
+
+        assert await lenta == 'antigo'  # lido antes da escrita
+        assert cache.armazenamento.obtem(1) in {'novo', AUSENTE}
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_falta_depois_da_escrita_nao_espera_carga_antiga():
+    cache = CachePorId(CacheTTL(max_itens=10, ttl=60), ttl_negativo=5)
+    liberada = asyncio.Event()
+    lenta = asyncio.create_task(
+        cache.obtem(1, carga_lenta(liberada, 'antigo'))
+    )
+    await asyncio.sleep(0)
+    cache.invalida(1)
+
+    async def carrega():
+        return 'novo'
+
+    assert await cache.obtem(1, carrega) == 'novo'
+    liberada.set()
+    await lenta
+    assert await cache.obtem(1, carrega) == 'novo'
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_sem_preencher_nao_guarda():
+    cache = CachePorId(CacheTTL(max_itens=10, ttl=60), ttl_negativo=5)
+
+    async def carrega():
+        return 'da replica'
+
+    assert await cache.obtem(1, carrega, preenche=False) == 'da replica'
+    assert len(cache) == 0
+
+
+def test_cache_por_id_chave_sai_do_grupo_ao_sair_do_armazenamento(
+    monkeypatch,
+):
+    agora = 1_000.0
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', lambda: agora)
+    cache = CachePorId(
+        CacheTTL(max_itens=2, ttl=60),
+        ttl_negativo=5,
+        grupo=lambda livro: livro['romancista_id'],
+    )
+
+    cache.guarda(1, {'id': 1, 'romancista_id': 7})
+    cache.guarda(1, {'id': 1, 'romancista_id': 8})  # mudou de romancista
+    assert dict(cache._grupos) == {8: {1}}
+
+    cache.invalida(1)
+    assert dict(cache._grupos) == {}
+
+    cache.guarda(1, {'id': 1, 'romancista_id': 7})
+    cache.guarda(2, {'id': 2, 'romancista_id': 7})
+    cache.guarda(3, {'id': 3, 'romancista_id': 9})  # despeja a chave 1
+    assert dict(cache._grupos) == {7: {2}, 9: {3}}
+
+    agora += 120  # vencidas, saem na próxima leitura
+    cache.armazenamento.obtem(2)
+    cache.armazenamento.obtem(3)
+    assert dict(cache._grupos) == {}
@@ -0,0 +1,127 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+from madr_fast import coalescencia as modulo_coalescencia
+from madr_fast.cache import CachePorId, CacheTTL
+from madr_fast.coalescencia import Coalescedor, uma_vez
+
+
+def gerador(liberada, execucoes, resultado='pagina'):
+    # execução que só termina quando `liberada` é sinalizado
+    async def gera():
+        execucoes.append(1)
+        await liberada.wait()
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    return gera
+
+
+@pytest.mark.asyncio
+async def test_coalescedor_junta_chamadas_simultaneas_da_mesma_chave():
+    coalescedor = Coalescedor()
+    liberada, execucoes = asyncio.Event(), []
+    gera = gerador(liberada, execucoes)
+
+    tarefas = [
+        asyncio.create_task(coalescedor.executa('chave', gera))
+        for _ in range(5)
+    ]
+    outra = asyncio.create_task(coalescedor.executa('outra', gera))
+    await asyncio.sleep(0)
+    assert len(coalescedor) == len(['chave', 'outra'])
+    liberada.set()
+
+    assert await asyncio.gather(*tarefas, outra) == ['pagina'] * 6
+    assert len(execucoes) == len(['chave', 'outra'])
+    assert coalescedor.estatisticas.execucoes == len(['chave', 'outra'])
+    assert coalescedor.estatisticas.coalescidas == len(tarefas) - 1
+    assert len(coalescedor) == 0
+
+
+@pytest.mark.asyncio
+async def test_coalescedor_nao_junta_chamadas_sequenciais():
+    coalescedor = Coalescedor()
+    liberada, execucoes = asyncio.Event(), []
+    liberada.set()
+    gera = gerador(liberada, execucoes)
+
+    await coalescedor.executa('chave', gera)
+    await coalescedor.executa('chave', gera)
+
+    assert len(execucoes) == len(['primeira', 'segunda'])
+    assert coalescedor.estatisticas.coalescidas == 0
+
+
+@pytest.mark.asyncio
+async def test_coalescedor_repassa_a_excecao_a_todas_as_chamadas():
+    coalescedor = Coalescedor()
+    liberada, execucoes = asyncio.Event(), []
+    nao_consta = HTTPException(status_code=HTTPStatus.NOT_FOUND)
+    gera = gerador(liberada, execucoes, nao_consta)
+
+    tarefas = [
+        asyncio.create_task(coalescedor.executa('chave', gera))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    liberada.set()
+    resultados = await asyncio.gather(*tarefas, return_exceptions=True)
+
+    assert resultados == [nao_consta] * 3
+    assert len(execucoes) == 1
+
+
+@pytest.mark.asyncio
+async def test_coalescedor_cancelada_a_primeira_a_seguinte_executa():
+    coalescedor = Coalescedor()
+    liberada, execucoes = asyncio.Event(), []
+    gera = gerador(liberada, execucoes)
+
+    primeira = asyncio.create_task(coalescedor.executa('chave', gera))
+    await asyncio.sleep(0)
+    seguinte = asyncio.create_task(coalescedor.executa('chave', gera))
+    await asyncio.sleep(0)
+    primeira.cancel()  # o cliente da primeira desistiu
+    await asyncio.sleep(0)
+    liberada.set()
+
+    assert await seguinte == 'pagina'
+    assert primeira.cancelled()
+    assert len(execucoes) == len(['primeira', 'seguinte'])
+    assert coalescedor.estatisticas.coalescidas == 0
+
+
+@pytest.mark.asyncio
+async def test_uma_vez_desativada_executa_todas(monkeypatch):
+    monkeypatch.setattr(
+        modulo_coalescencia.settings, 'REQUEST_COALESCING', False
+    )
+    liberada, execucoes = asyncio.Event(), []
+    gera = gerador(liberada, execucoes)
+
+    tarefas = [asyncio.create_task(uma_vez('chave', gera)) for _ in range(3)]
+    await asyncio.sleep(0)
+    liberada.set()
+    await asyncio.gather(*tarefas)
+
+    assert len(execucoes) == len(tarefas)
+
+
+@pytest.mark.asyncio
+async def test_cache_por_id_faltas_simultaneas_carregam_uma_vez():
+    cache = CachePorId(CacheTTL(max_itens=10, ttl=60), ttl_negativo=5)
+    liberada, carregados = asyncio.Event(), []
+    carrega = gerador(liberada, carregados, {'id': 1})
+
+    tarefas = [asyncio.create_task(cache.obtem(1, carrega)) for _ in range(4)]
+    await asyncio.sleep(0)
+    liberada.set()
+
+    assert await asyncio.gather(*tarefas) == [{'id': 1}] * 4
+    assert len(carregados) == 1
+    assert await cache.obtem(1, carrega) == {'id': 1}  # guardado
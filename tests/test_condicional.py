@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+from starlette.requests import Request
+
+from madr_fast.condicional import cabecalhos, etag_de, nao_modificado
+
+MODIFICADO_EM = datetime(2024, 5, 1, 12, 30, 15, 123456)  # UTC, sem fuso
+
+
+def requisicao(**cabecalhos_http):
+    return Request({
+        'type': 'http',
+        'headers': [
+            (nome.replace('_', '-').encode(), valor.encode())
+            for nome, valor in cabecalhos_http.items()
+        ],
+    })
+
+
+def test_etag_muda_com_qualquer_parte():
+    etag = etag_de('livro', 1, MODIFICADO_EM, ())
+
+    assert etag.startswith('"')
+    assert etag.endswith('"')
+    assert etag != etag_de('livro', 1, MODIFICADO_EM, ('titulo',))
+    assert etag != etag_de('livro', 2, MODIFICADO_EM, ())
+
+
+@pytest.mark.parametrize(
+    'if_none_match', ['{etag}', 'W/{etag}', '"outro", {etag}', '*']
+)
+def test_nao_modificado_por_if_none_match(if_none_match):
+    etag = etag_de('livro', 1)
+    request = requisicao(if_none_match=if_none_match.format(etag=etag))
+
+    assert nao_modificado(request, etag)
+
+
+def test_if_none_match_tem_precedencia_sobre_if_modified_since():
+    request = requisicao(
+        if_none_match='"outro"',
+        if_modified_since='Wed, 01 May 2024 12:30:15 GMT',
+    )
+
+    assert not nao_modificado(request, etag_de('livro', 1), MODIFICADO_EM)
+
+
+@pytest.mark.parametrize(
+    ('if_modified_since', 'esperado'),
+    [
+        ('Wed, 01 May 2024 12:30:15 GMT', True),  # mesmo segundo
+        ('Wed, 01 May 2024 12:30:14 GMT', False),
+        ('data invalida', False),
+    ],
+)
+def test_nao_modificado_por_if_modified_since(if_modified_since, esperado):
+    request = requisicao(if_modified_since=if_modified_since)
+
+    assert (
+        nao_modificado(request, etag_de('livro', 1), MODIFICADO_EM) is esperado
+    )
+
+
+def test_cabecalhos_trazem_last_modified_em_gmt():
+    valores = cabecalhos(etag_de('livro', 1), MODIFICADO_EM)
+
+    assert valores['Last-Modified'] == 'Wed, 01 May 2024 12:30:15 GMT'
+    assert valores['Cache-Control'] == 'no-cache'
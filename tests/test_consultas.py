@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+
+from madr_fast import consultas
+
+
+def test_consultas_sem_modo_preparado_retornam_select(monkeypatch):
+    monkeypatch.setattr(
+        consultas.settings, 'DATABASE_PREPARED_STATEMENTS', False
+    )
+
+    assert not isinstance(consultas.livro_por_id(1), StatementLambdaElement)
+
+
+@pytest.mark.asyncio
+async def test_consultas_preparadas_retornam_mesmos_registros(
+    monkeypatch, session, usuario, livro, outro_livro
+):
+    monkeypatch.setattr(
+        consultas.settings, 'DATABASE_PREPARED_STATEMENTS', True
+    )
+
+    assert isinstance(consultas.livro_por_id(1), StatementLambdaElement)
+
+    # a mesma lambda com parâmetros diferentes não reaproveita o valor antigo
+    assert await session.scalar(consultas.livro_por_id(livro.id)) is livro
+    assert (
+        await session.scalar(consultas.livro_por_id(outro_livro.id))
+        is outro_livro
+    )
+    assert (
+        await session.scalar(consultas.romancista_por_id(livro.romancista_id))
+    ).id == livro.romancista_id
+    assert (
+        await session.scalar(consultas.usuario_por_email(usuario.email))
+    ).id == usuario.id
+
+
+@pytest.mark.asyncio
+async def test_anexa_romancistas_removido_durante_a_busca_vem_nulo(
+    session, livro, romancista
+):
+    itens = [
+        {'id': livro.id, 'romancista_id': romancista.id},
+        {'id': livro.id + 1, 'romancista_id': romancista.id + 1},  # removido
+    ]
+
+    await consultas.anexa_romancistas(session, itens)
+
+    assert itens[0]['romancista'] == {'nome': 'jorge', 'id': romancista.id}
+    assert itens[1]['romancista'] is None
@@ -1,5 +1,6 @@
 from http import HTTPStatus
 
+import pytest
 from sqlalchemy import select
 
 from madr_fast.models import Usuario
@@ -150,7 +151,10 @@ def test_atualiza_campos_vazios_menos_email(client, usuario, token):
     assert response.json() == output
 
 
-def test_atualiza_campos_vazios_menos_senha(client, usuario, token, session):
+@pytest.mark.asyncio
+async def test_atualiza_campos_vazios_menos_senha(
+    client, usuario, token, session
+):
     # campo: senha
     campo_atualizado = {'senha': 'nova_senha'}
     output = {
@@ -169,7 +173,9 @@ def test_atualiza_campos_vazios_menos_senha(client, usuario, token, session):
     assert response.json() == output
 
     # verifica senha
-    dados = session.scalar(select(Usuario).where(Usuario.id == usuario.id))
+    dados = await session.scalar(
+        select(Usuario).where(Usuario.id == usuario.id)
+    )
 
     assert dados
     assert verify_password(campo_atualizado['senha'], dados.senha)
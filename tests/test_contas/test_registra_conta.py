@@ -1,5 +1,6 @@
 from http import HTTPStatus
 
+import pytest
 from sqlalchemy import select
 
 from madr_fast.models import Usuario
@@ -25,7 +26,8 @@ def test_registra_valido_retorna_criado_e_schema(client):
     assert response.json() == json_output
 
 
-def test_registra_senha_criptografada(client, session):
+@pytest.mark.asyncio
+async def test_registra_senha_criptografada(client, session):
     json_input = {
         'username': 'teste senha',
         'email': 'senha@de.teste',
@@ -33,7 +35,7 @@ def test_registra_senha_criptografada(client, session):
     }
     client.post('/contas', json=json_input)
 
-    usuario_db = session.scalar(
+    usuario_db = await session.scalar(
         select(Usuario).where(Usuario.username == json_input['username'])
     )
     senha_db = usuario_db.senha
@@ -1,13 +1,29 @@
+import time
 from http import HTTPStatus
+from types import SimpleNamespace
 
-from sqlalchemy import select
+import pytest
+from fastapi import Request, Response
+from sqlalchemy import select, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
+from madr_fast import database
+from madr_fast.database import (
+    COOKIE_ULTIMA_ESCRITA,
+    RoteadorDeLeitura,
+    cria_engine,
+    le_de_replica,
+    marca_escrita,
+    resumo_pool,
+    ultima_escrita,
+)
 from madr_fast.models import Livro, Usuario
 from tests.factories import LivroFactory
 
 
-def test_database(session, usuario):
-    usuario_db = session.scalar(
+@pytest.mark.asyncio
+async def test_database(session, usuario):
+    usuario_db = await session.scalar(
         select(Usuario).where(Usuario.username == usuario.username)
     )
 
@@ -15,18 +31,19 @@ def test_database(session, usuario):
     assert usuario_db.created_at
 
 
-def test_relacionamento_romancista_e_livro_com_delete(
+@pytest.mark.asyncio
+async def test_relacionamento_romancista_e_livro_com_delete(
     session, client, token, romancista, outro_romancista
 ):
-    session.bulk_save_objects(  # romancista 1
+    session.add_all(  # romancista 1
         LivroFactory.create_batch(4, romancista_id=romancista.id)
     )
-    session.bulk_save_objects(  # romancista 2
+    session.add_all(  # romancista 2
         LivroFactory.create_batch(2, romancista_id=outro_romancista.id)
     )
 
     # verifica livros cadastrados por romancista 1
-    check_db = session.scalars(
+    check_db = await session.scalars(
         select(Livro).where(Livro.romancista_id == romancista.id)
     )
     num_livros_do_romancista = 4
@@ -41,12 +58,152 @@ def test_relacionamento_romancista_e_livro_com_delete(
     assert response.json() == {'message': 'Romancista deletado no MADR'}
 
     # verifica livros do romancista 1 foram deletados junto
-    check_db = session.scalars(
+    check_db = await session.scalars(
         select(Livro).where(Livro.romancista_id == romancista.id)
     )
     assert not check_db.fetchall()
 
     # verifica livros do romancista 2 continuam cadastrados
-    check_db = session.scalars(select(Livro))
+    check_db = await session.scalars(select(Livro))
     num_livros_devem_restar_no_db = 2
     assert len(check_db.fetchall()) == num_livros_devem_restar_no_db
+
+
+@pytest.mark.asyncio
+async def test_pool_monitorado_conta_checkout_espera_e_timeout(engine):
+    _engine = cria_engine(
+        engine.url, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+
+    async with _engine.connect():
+        assert resumo_pool(_engine)['em_uso'] == 1
+
+        # pool esgotado: o segundo checkout espera e estoura o timeout
+        with pytest.raises(PoolTimeoutError):
+            await _engine.connect()
+
+    resumo = resumo_pool(_engine)
+    await _engine.dispose()
+
+    timeout_ms = 100
+    assert resumo['em_uso'] == 0
+    assert resumo['pico_em_uso'] == 1
+    assert resumo['checkouts'] == 1
+    assert resumo['checkins'] == 1
+    assert resumo['timeouts'] == 1
+    assert resumo['espera_max_ms'] >= timeout_ms
+
+
+@pytest.mark.asyncio
+async def test_roteador_de_leitura_round_robin_e_read_your_writes(engine):
+    # mesma instância sob duas "réplicas"
+    replicas = [cria_engine(engine.url), cria_engine(engine.url)]
+    roteador = RoteadorDeLeitura(engine, replicas, janela=5)
+
+    escolhidos = [roteador.escolhe() for _ in range(4)]
+    assert escolhidos == replicas * 2
+
+    # cliente que acabou de escrever lê do primário até a janela passar
+    assert roteador.escolhe(time.time()) is engine
+    assert roteador.escolhe(time.time() - 10) in replicas
+
+    for replica in replicas:
+        async with replica.connect() as conn:
+            assert await conn.scalar(text('SELECT 1')) == 1
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_roteador_de_leitura_least_connections(engine):
+    replicas = [cria_engine(engine.url), cria_engine(engine.url)]
+    roteador = RoteadorDeLeitura(
+        engine, replicas, estrategia='least_connections'
+    )
+
+    async with replicas[0].connect():
+        assert roteador.escolhe() is replicas[1]
+    async with replicas[1].connect():
+        assert roteador.escolhe() is replicas[0]
+
+    for replica in replicas:
+        await replica.dispose()
+
+
+def test_roteador_de_leitura_sem_replicas_usa_o_primario(engine):
+    assert RoteadorDeLeitura(engine, []).escolhe() is engine
+
+
+def test_le_de_replica_so_com_replicas_configuradas(monkeypatch, engine):
+    replica = object()
+    monkeypatch.setattr(database, 'replicas', [replica])
+    monkeypatch.setattr(
+        database.settings, 'DATABASE_REPLICA_URLS', ['postgresql://replica']
+    )
+
+    # só o bind da sessão importa
+    assert le_de_replica(SimpleNamespace(bind=replica))
+    assert not le_de_replica(SimpleNamespace(bind=engine))
+
+    # pool somente leitura do SQLite: mesmo arquivo do primário
+    monkeypatch.setattr(database.settings, 'DATABASE_REPLICA_URLS', [])
+    assert not le_de_replica(SimpleNamespace(bind=replica))
+
+
+def test_marca_escrita_so_em_metodos_de_escrita(monkeypatch):
+    monkeypatch.setattr(database.settings, 'DATABASE_READ_YOUR_WRITES', 5)
+
+    def requisicao(metodo, headers=()):
+        return Request({'type': 'http', 'method': metodo, 'headers': headers})
+
+    leitura = Response()
+    marca_escrita(requisicao('GET'), leitura)
+    assert COOKIE_ULTIMA_ESCRITA not in leitura.headers.get('set-cookie', '')
+
+    escrita = Response()
+    marca_escrita(requisicao('POST'), escrita)
+    cookie = escrita.headers['set-cookie']
+    assert cookie.startswith(COOKIE_ULTIMA_ESCRITA)
+
+    # a próxima leitura do cliente devolve o instante da escrita
+    valor = cookie.split(';')[0].encode()
+    instante = ultima_escrita(requisicao('GET', [(b'cookie', valor)]))
+    assert time.time() - instante < 1
+    assert ultima_escrita(requisicao('GET')) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ('preparados', 'limiar'),
+    [(True, database.settings.DATABASE_PREPARE_THRESHOLD), (False, None)],
+)
+async def test_cria_engine_repassa_prepare_threshold(
+    engine, monkeypatch, preparados, limiar
+):
+    monkeypatch.setattr(
+        database.settings, 'DATABASE_PREPARED_STATEMENTS', preparados
+    )
+    _engine = cria_engine(engine.url)
+
+    async with _engine.connect() as conn:
+        bruta = await conn.get_raw_connection()
+        prepare_threshold = bruta.driver_connection.prepare_threshold
+    await _engine.dispose()
+
+    # desligado é None: o padrão do psycopg (5) ainda prepararia
+    assert prepare_threshold == limiar
+
+
+@pytest.mark.asyncio
+async def test_cria_engine_aplica_statement_timeout_padrao(engine):
+    _engine = cria_engine(engine.url)
+
+    async with _engine.connect() as conn:
+        timeout = await conn.scalar(
+            text(
+                'SELECT setting::int FROM pg_settings '
+                "WHERE name = 'statement_timeout'"
+            )
+        )
+    await _engine.dispose()
+
+    assert timeout == database.settings.DATABASE_STATEMENT_TIMEOUT
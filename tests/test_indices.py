@@ -0,0 +1,185 @@
+import hashlib
+
+import pytest
+from fastapi_pagination.ext.sqlalchemy import create_count_query
+from sqlalchemy import insert, select, text, tuple_
+
+from madr_fast.consultas import (
+    busca_textual,
+    listagem_de_livros,
+    livro_por_id,
+    romancista_por_id,
+)
+from madr_fast.models import Livro, Romancista, Usuario
+from madr_fast.routers.livros import ordem_livros, ordens_livros
+from madr_fast.routers.romancistas import ordem_romancistas
+
+num_romancistas = 2_000
+num_livros = 10_000
+num_usuarios = 1_000
+ano_alvo = 1950
+# abaixo disso o planner prefere varrer a tabela a usar o GIN de trigramas
+num_linhas_busca = 100_000
+
+
+async def plano_de_execucao(session, query):
+    # parâmetros enviados ao driver: nem todo tipo (ex.: regconfig da busca
+    # textual) tem representação literal
+    conn = await session.connection()
+    sql = query.compile(dialect=conn.dialect)
+    resultado = await conn.exec_driver_sql(f'EXPLAIN {sql}', sql.params)
+    return '\n'.join(resultado.scalars())
+
+
+@pytest.mark.asyncio
+async def test_consultas_das_rotas_usam_indices(session):
+    # popula um volume em que varredura sequencial seria mais cara
+    await session.execute(
+        insert(Romancista),
+        [{'nome': f'romancista {i}'} for i in range(num_romancistas)],
+    )
+    await session.execute(
+        insert(Livro),
+        [
+            {
+                'titulo': f'livro {i}',
+                'ano': 1900 + i % 125,
+                'romancista_id': 1 + i % num_romancistas,
+            }
+            for i in range(num_livros)
+        ],
+    )
+    await session.execute(
+        insert(Usuario),
+        [
+            {'username': f'u{i}', 'email': f'u{i}@teste.com', 'senha': 's'}
+            for i in range(num_usuarios)
+        ],
+    )
+    await session.commit()
+    await session.execute(text('ANALYZE'))
+
+    por_romancista = select(Livro).where(Livro.romancista_id == 1)
+    por_ano = select(Livro).where(Livro.ano == ano_alvo)
+    por_texto, ordem_texto = busca_textual('4321', 'postgresql')
+    consultas = {
+        'livro por id': livro_por_id(1),
+        'romancista por id': romancista_por_id(1),
+        'usuario por email': select(Usuario).where(
+            Usuario.email == 'u1@teste.com'
+        ),
+        'livros por romancista': por_romancista.limit(20),
+        'total de livros por romancista': create_count_query(por_romancista),
+        'livros por ano': por_ano.limit(20),
+        'total de livros por ano': create_count_query(por_ano),
+        'busca textual': por_texto.order_by(*ordem_texto).limit(20),
+        'total da busca textual': create_count_query(por_texto),
+    }
+
+    await verifica_planos(session, consultas)
+
+    # páginas por cursor: o seek é condição do índice (custo igual em
+    # qualquer profundidade), não um filtro sobre linhas já lidas
+    livros = select(Livro)
+    depois_do_livro = tuple_(*ordem_livros) > ('livro 5000',)
+    depois_do_romancista = tuple_(*ordem_romancistas) > ('romancista 1000',)
+    seeks = {
+        'livros após cursor': livros.where(depois_do_livro).order_by(
+            *ordem_livros
+        ),
+        'livros por romancista após cursor': por_romancista.where(
+            depois_do_livro
+        ).order_by(*ordem_livros),
+        'livros por ano após cursor': por_ano.where(depois_do_livro).order_by(
+            *ordem_livros
+        ),
+        'romancistas após cursor': select(Romancista)
+        .where(depois_do_romancista)
+        .order_by(*ordem_romancistas),
+    }
+    seeks = {nome: query.limit(21) for nome, query in seeks.items()}
+
+    await verifica_planos(session, seeks)
+    for nome, query in seeks.items():
+        plano = await plano_de_execucao(session, query)
+        condicoes = [
+            linha for linha in plano.splitlines() if 'Index Cond' in linha
+        ]
+        assert any(
+            " > '" in linha for linha in condicoes
+        ), f'{nome} não faz o seek pelo índice:\n{plano}'
+
+
+async def verifica_planos(session, consultas):
+    for nome, query in consultas.items():
+        plano = await plano_de_execucao(session, query)
+        assert 'Index' in plano, f'{nome} não usa índice:\n{plano}'
+        assert 'Seq Scan' not in plano, f'{nome} varre a tabela:\n{plano}'
+
+
+@pytest.mark.asyncio
+async def test_buscas_contains_usam_indices_de_trigramas(session):
+    # textos variados (md5), gerados no próprio banco para ser rápido
+    await session.execute(
+        text(
+            'INSERT INTO romancistas (nome)'
+            " SELECT 'romancista ' || md5(i::text)"
+            ' FROM generate_series(1, CAST(:n AS integer)) i'
+        ),
+        {'n': num_linhas_busca},
+    )
+    await session.execute(
+        text(
+            'INSERT INTO livros (titulo, ano, romancista_id)'
+            " SELECT 'livro ' || md5(i::text), 1900 + i % 125, i"
+            ' FROM generate_series(1, CAST(:n AS integer)) i'
+        ),
+        {'n': num_linhas_busca},
+    )
+    await session.commit()
+    await session.execute(text('ANALYZE'))
+
+    trecho = hashlib.md5(b'4321').hexdigest()[:8]
+    por_titulo = select(Livro).where(Livro.titulo.contains(trecho))
+    por_nome = select(Romancista).where(Romancista.nome.contains(trecho))
+    await verifica_planos(
+        session,
+        {
+            'livros por título': por_titulo.limit(20),
+            'total de livros por título': create_count_query(por_titulo),
+            'romancistas por nome': por_nome.limit(20),
+            'total de romancistas por nome': create_count_query(por_nome),
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_ordenacoes_da_busca_por_query_sao_index_only(session, engine):
+    session.add(Romancista(nome='romancista'))
+    await session.commit()
+    await session.execute(
+        text(
+            'INSERT INTO livros (titulo, ano, romancista_id)'
+            " SELECT 'livro ' || md5(i::text), 1900 + i % 125, 1"
+            ' FROM generate_series(1, CAST(:n AS integer)) i'
+        ),
+        {'n': num_livros},
+    )
+    await session.commit()
+    # index-only scan depende do visibility map, atualizado pelo VACUUM
+    async with engine.connect() as conn:
+        autocommit = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await autocommit.execute(text('VACUUM ANALYZE livros'))
+
+    faixa = listagem_de_livros().where(Livro.ano.between(1950, 1999))
+    for ordenar_por, colunas in ordens_livros.items():
+        for decrescente in (False, True):
+            ordem = [c.desc() if decrescente else c for c in colunas]
+            query = faixa.order_by(*ordem).limit(21)
+            plano = await plano_de_execucao(session, query)
+
+            # por id, a chave primária dá a ordem (sem Sort), não index-only
+            nome = f'{ordenar_por} {"desc" if decrescente else "asc"}'
+            esperado = 'livros_pkey' if ordenar_por == 'id' else 'Index Only'
+            assert esperado in plano, f'{nome}:\n{plano}'
+            assert 'Sort' not in plano, f'{nome} ordena em memória:\n{plano}'
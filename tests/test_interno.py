@@ -0,0 +1,74 @@
+from http import HTTPStatus
+
+import pytest
+
+from madr_fast.routers import interno
+
+
+@pytest.fixture(autouse=True)
+def _habilita_interno(monkeypatch):
+    monkeypatch.setattr(interno.settings, 'INTERNAL_ENDPOINTS', True)
+
+
+def test_interno_desligado_responde_404(client, monkeypatch):
+    monkeypatch.setattr(interno.settings, 'INTERNAL_ENDPOINTS', False)
+
+    for rota in ('pool', 'caches', 'coalescencia'):
+        response = client.get(f'/interno/{rota}')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_estatisticas_do_pool_retorna_ok_e_contadores(client):
+    response = client.get('/interno/pool')
+
+    assert response.status_code == HTTPStatus.OK
+    assert set(response.json()) == {
+        'tamanho',
+        'em_uso',
+        'ociosas',
+        'overflow_em_uso',
+        'pico_em_uso',
+        'checkouts',
+        'checkins',
+        'timeouts',
+        'espera_media_ms',
+        'espera_max_ms',
+    }
+
+
+def test_estatisticas_dos_caches_retorna_ok_e_contadores(client, livro):
+    # os contadores são do processo: compara antes e depois
+    antes = client.get('/interno/caches').json()['livros']
+    for livro_id in (livro.id, livro.id, livro.id + 1, livro.id + 1):
+        client.get(f'/livros/{livro_id}')
+
+    response = client.get('/interno/caches')
+
+    assert response.status_code == HTTPStatus.OK
+    assert set(response.json()) == {
+        'livros',
+        'romancistas',
+        'principais',
+        'totais',
+        'paginas',
+    }
+    depois = response.json()['livros']
+    assert depois['itens'] == len([livro.id, livro.id + 1])
+    assert {
+        contador: depois[contador] - antes[contador]
+        for contador in ('acertos', 'faltas', 'negativos')
+    } == {'acertos': 2, 'faltas': 2, 'negativos': 1}
+
+
+def test_estatisticas_da_coalescencia_retorna_ok_e_contadores(client, livro):
+    # os contadores são do processo: compara antes e depois
+    antes = client.get('/interno/coalescencia').json()
+    client.get(f'/livros/romancista/{livro.romancista_id}')
+
+    response = client.get('/interno/coalescencia')
+
+    assert response.status_code == HTTPStatus.OK
+    depois = response.json()
+    assert depois['em_andamento'] == 0
+    assert depois['execucoes'] - antes['execucoes'] == 1
+    assert depois['coalescidas'] == antes['coalescidas']
@@ -268,3 +268,14 @@ def test_altera_livro_str_no_campo_ano_retorna_ano_inteiro(
     assert response.status_code == HTTPStatus.OK
     assert response.json()['ano'] == ano_intenger
     assert isinstance(response.json()['ano'], int)
+
+
+def test_altera_livro_para_o_proprio_titulo_retorna_ok(client, livro, token):
+    response = client.patch(
+        f'/livros/{livro.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'titulo': livro.titulo},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['titulo'] == livro.titulo
@@ -1,8 +1,10 @@
 from http import HTTPStatus
 
-from sqlalchemy import select
+import pytest
+from sqlalchemy import delete, event, select
 
-from madr_fast.models import Livro
+from madr_fast import paginacao
+from madr_fast.models import Livro, Romancista
 from tests.factories import LivroFactory
 
 
@@ -27,9 +29,7 @@ def test_busca_livro_por_id_id_nao_cadastrado_retorna_erro(client, livro):
 
 def test_paginacao(client, session, romancista):
     # factory
-    session.bulk_save_objects(
-        LivroFactory.create_batch(30, romancista_id=romancista.id)
-    )
+    session.add_all(LivroFactory.create_batch(30, romancista_id=romancista.id))
 
     response = client.get('/livros/query/')
 
@@ -38,6 +38,67 @@ def test_paginacao(client, session, romancista):
     assert response.status_code == HTTPStatus.OK
 
 
+def test_busca_livro_por_query_repetida_vem_do_cache_ate_uma_escrita(
+    client, livro, romancista, token, consultas_executadas
+):
+    url = '/livros/query/?titulo=roman&ordem=asc&size=5'
+    client.get(url)
+    consultas_executadas.clear()
+
+    # mesmos parâmetros, em outra ordem e com o padrão explícito
+    repetida = client.get('/livros/query/?size=5&titulo=roman&page=1')
+
+    assert repetida.json()['total'] == 1
+    assert not [c for c in consultas_executadas if 'FROM livros' in c]
+
+    client.post(
+        '/livros/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'titulo': 'outro romance',
+            'ano': 2001,
+            'romancista_id': romancista.id,
+        },
+    )
+    depois = client.get(url).json()
+
+    assert depois['total'] == len([livro, 'outro romance'])
+
+
+def test_busca_livro_por_query_da_replica_nao_serve_quem_acabou_de_escrever(
+    client, livro, token, consultas_executadas, monkeypatch
+):
+    monkeypatch.setattr(paginacao.settings, 'DATABASE_READ_YOUR_WRITES', 5)
+    url = '/livros/query/?titulo=roman'
+    client.post(
+        '/livros/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'titulo': 'outro romance',
+            'ano': 2001,
+            'romancista_id': livro.romancista_id,
+        },
+    )
+
+    # réplica logo depois da escrita: a página não é guardada
+    monkeypatch.setattr(paginacao, 'le_de_replica', lambda session: True)
+    client.get(url)
+    consultas_executadas.clear()
+    client.get(url)
+    assert [c for c in consultas_executadas if 'FROM livros' in c]
+
+    # o primário (read-your-writes) tem as próprias páginas
+    monkeypatch.setattr(paginacao, 'le_de_replica', lambda session: False)
+    consultas_executadas.clear()
+    primario = client.get(url)
+    assert [c for c in consultas_executadas if 'FROM livros' in c]
+    assert primario.json()['total'] == len([livro, 'outro romance'])
+
+    consultas_executadas.clear()
+    client.get(url)
+    assert not [c for c in consultas_executadas if 'FROM livros' in c]
+
+
 def test_busca_livro_por_query_filtra_nome_parcial_retorna_lista(
     client, outro_livro, livro
 ):
@@ -62,6 +123,10 @@ def test_busca_livro_por_query_filtra_nome_parcial_retorna_lista(
         'páginas': 1,
         'tamanho': 20,
         'total': 1,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
+        'facetas': None,
     }
 
 
@@ -71,10 +136,10 @@ def test_busca_livro_por_query_filtra_ano_retorna_lista(
     ano_alvo = 2001
     num_livros_alvo = 5
     # factory
-    session.bulk_save_objects(
+    session.add_all(
         LivroFactory.create_batch(3, ano=1999, romancista_id=romancista.id)
     )
-    session.bulk_save_objects(
+    session.add_all(
         LivroFactory.create_batch(
             num_livros_alvo, ano=ano_alvo, romancista_id=romancista.id
         )
@@ -90,10 +155,10 @@ def test_busca_livro_por_query_filtra_combinado_retorna_lista(
     client, session, livro, romancista
 ):
     # factory
-    session.bulk_save_objects(
+    session.add_all(
         LivroFactory.create_batch(3, ano=2000, romancista_id=romancista.id)
     )
-    session.bulk_save_objects(
+    session.add_all(
         LivroFactory.create_batch(5, ano=2001, romancista_id=romancista.id)
     )
 
@@ -115,6 +180,10 @@ def test_busca_livro_por_query_filtra_combinado_retorna_lista(
         'páginas': 1,
         'tamanho': 20,
         'total': 1,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
+        'facetas': None,
     }
 
 
@@ -122,9 +191,7 @@ def test_busca_livro_por_query_deve_retorna_paginacao_maiores_que_20(
     client, session, romancista
 ):
     # factory
-    session.bulk_save_objects(
-        LivroFactory.create_batch(30, romancista_id=romancista.id)
-    )
+    session.add_all(LivroFactory.create_batch(30, romancista_id=romancista.id))
 
     response = client.get('/livros/query/')
 
@@ -137,9 +204,7 @@ def test_busca_livro_por_query_vazias_retorna_lista_total(
     client, session, romancista
 ):
     # factory
-    session.bulk_save_objects(
-        LivroFactory.create_batch(7, romancista_id=romancista.id)
-    )
+    session.add_all(LivroFactory.create_batch(7, romancista_id=romancista.id))
 
     response = client.get('/livros/query/')
 
@@ -161,6 +226,10 @@ def test_busca_livro_por_query_sem_correspondencia_titulo_retorna_lista_vazia(
         'páginas': 0,
         'tamanho': 20,
         'total': 0,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
+        'facetas': None,
     }
 
 
@@ -177,20 +246,23 @@ def test_busca_livro_por_query_sem_correspondencia_ano_retorna_lista_vazia(
         'páginas': 0,
         'tamanho': 20,
         'total': 0,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
+        'facetas': None,
     }
 
 
-def test_busca_livros_por_romancista_id_ok_e_quantidade_certa(
+@pytest.mark.asyncio
+async def test_busca_livros_por_romancista_id_ok_e_quantidade_certa(
     session, client, romancista, livro, outro_livro
 ):
-    session.bulk_save_objects(
-        LivroFactory.create_batch(4, romancista_id=romancista.id)
-    )
+    session.add_all(LivroFactory.create_batch(4, romancista_id=romancista.id))
     response = client.get(f'/livros/romancista/{romancista.id}')
 
     assert response.status_code == HTTPStatus.OK
 
-    check_db = session.scalars(
+    check_db = await session.scalars(
         select(Livro).where(Livro.romancista_id == romancista.id)
     )
     assert len(check_db.fetchall()) == len(response.json()['livros'])
@@ -216,6 +288,9 @@ def test_busca_livros_por_romancista_id_ok_e_lista_certa(
         'páginas': 1,
         'tamanho': 20,
         'total': 1,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
     }
 
 
@@ -232,6 +307,9 @@ def test_busca_livros_por_romancista_id_sem_livros_retorna_lista_vazia(
         'páginas': 0,
         'tamanho': 20,
         'total': 0,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
     }
 
 
@@ -244,19 +322,598 @@ def test_busca_livros_por_romancista_id_retorna_erro_nao_cadastrado(client):
     assert response.status_code == HTTPStatus.NOT_FOUND
 
 
-def test_busca_livros_por_romancista_id_paginacao_de_20(
+@pytest.mark.asyncio
+async def test_busca_livros_por_romancista_id_paginacao_de_20(
     session, client, romancista, outro_livro
 ):
-    session.bulk_save_objects(
-        LivroFactory.create_batch(22, romancista_id=romancista.id)
-    )
+    session.add_all(LivroFactory.create_batch(22, romancista_id=romancista.id))
     response = client.get(f'/livros/romancista/{romancista.id}')
 
     assert response.status_code == HTTPStatus.OK
 
-    check_db = session.scalars(
+    check_db = await session.scalars(
         select(Livro).where(Livro.romancista_id == romancista.id)
     )
     num_items = 20
     assert len(response.json()['livros']) == num_items
     assert len(check_db.fetchall()) != len(response.json()['livros'])
+
+
+# busca textual
+def test_busca_textual_ignora_acentos_e_flexoes(client, livro, outro_livro):
+    response = client.get('/livros/busca?q=Românticos')
+
+    assert response.status_code == HTTPStatus.OK
+    assert sorted(item['id'] for item in response.json()['livros']) == sorted([
+        livro.id,
+        outro_livro.id,
+    ])
+
+    response = client.get('/livros/busca?q=último')
+    assert [item['id'] for item in response.json()['livros']] == [livro.id]
+
+
+@pytest.mark.asyncio
+async def test_busca_textual_ordena_titulo_acima_do_nome(
+    client, session, romancista
+):
+    # 'casmurro' só no nome do romancista de um livro e no título do outro
+    casmurro = Romancista(nome='casmurro da silva')
+    session.add(casmurro)
+    await session.commit()
+    por_nome = Livro(titulo='memorias', ano=1900, romancista_id=casmurro.id)
+    por_titulo = Livro(
+        titulo='dom casmurro', ano=1899, romancista_id=romancista.id
+    )
+    session.add_all([por_nome, por_titulo])
+    await session.commit()
+
+    response = client.get('/livros/busca?q=casmurro')
+
+    assert response.status_code == HTTPStatus.OK
+    ordem_esperada = [por_titulo.id, por_nome.id]
+    assert [item['id'] for item in response.json()['livros']] == (
+        ordem_esperada
+    )
+    assert response.json()['total'] == len(ordem_esperada)
+
+
+@pytest.mark.asyncio
+async def test_busca_textual_acompanha_alteracoes(
+    client, session, token, romancista, livro
+):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # nome do romancista alterado: o vetor dos seus livros é refeito
+    client.patch(
+        f'/romancistas/{romancista.id}',
+        headers=headers,
+        json={'nome': 'graciliano'},
+    )
+    assert client.get('/livros/busca?q=jorge').json()['livros'] == []
+    busca = client.get('/livros/busca?q=graciliano').json()
+    assert [item['id'] for item in busca['livros']] == [livro.id]
+
+    # título alterado
+    client.patch(
+        f'/livros/{livro.id}', headers=headers, json={'titulo': 'vidas secas'}
+    )
+    assert client.get('/livros/busca?q=romantico').json()['livros'] == []
+    busca = client.get('/livros/busca?q=seca').json()
+    assert [item['id'] for item in busca['livros']] == [livro.id]
+
+
+def test_busca_textual_exige_termo(client):
+    response = client.get('/livros/busca?q=')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+# paginação por cursor
+def titulos(pagina):
+    return [item['titulo'] for item in pagina['livros']]
+
+
+def percorre(client, url, chave, cursor):
+    # segue os cursores de uma direção até o fim
+    paginas = []
+    while cursor:
+        pagina = client.get(url, params={'size': 3, 'cursor': cursor}).json()
+        assert pagina['página'] is None
+        paginas.append(pagina)
+        cursor = pagina[chave]
+    return paginas
+
+
+@pytest.mark.asyncio
+async def test_paginacao_por_cursor_percorre_nos_dois_sentidos(
+    client, session, romancista
+):
+    session.add_all(
+        Livro(titulo=f'livro {letra}', ano=2000, romancista_id=romancista.id)
+        for letra in 'hgfedcba'
+    )
+    await session.commit()
+    url = f'/livros/romancista/{romancista.id}'
+
+    primeira = client.get(url, params={'size': 3}).json()
+    adiante = percorre(client, url, 'próximo', primeira['próximo'])
+    atras = percorre(client, url, 'anterior', adiante[-1]['anterior'])
+
+    # ordem por título, sem repetir nem pular livros nos dois sentidos
+    assert titulos(primeira) == ['livro a', 'livro b', 'livro c']
+    assert primeira['anterior'] is None
+    assert [titulos(pagina) for pagina in adiante] == [
+        ['livro d', 'livro e', 'livro f'],
+        ['livro g', 'livro h'],
+    ]
+    assert [titulos(pagina) for pagina in atras] == [
+        ['livro d', 'livro e', 'livro f'],
+        ['livro a', 'livro b', 'livro c'],
+    ]
+    assert atras[-1]['anterior'] is None
+
+
+@pytest.mark.asyncio
+async def test_paginacao_por_cursor_da_busca_textual_segue_relevancia(
+    client, session, romancista
+):
+    # relevâncias diferentes e empates, desempatados pelo id
+    todos = (
+        'mar',
+        'mar do mar',
+        'mar mar mar',
+        'ceu e mar',
+        'o mar',
+        'cartas de jorge',
+        'jorge',
+    )
+    session.add_all(
+        Livro(titulo=titulo, ano=2000, romancista_id=romancista.id)
+        for titulo in todos
+    )
+    await session.commit()
+
+    # q=mar: relevâncias variadas; q=jorge: dois no título e cinco empatados
+    # só pelo nome (0.4, sem representação exata), com o fim da página
+    # no meio do empate
+    for url in ('/livros/busca?q=mar', '/livros/busca?q=jorge'):
+        completa = client.get(url).json()
+        primeira = client.get(url, params={'size': 3}).json()
+        adiante = percorre(client, url, 'próximo', primeira['próximo'])
+
+        por_cursor = titulos(primeira)
+        for pagina in adiante:
+            por_cursor += titulos(pagina)
+        assert por_cursor == titulos(completa)
+
+    # todos são do romancista jorge
+    assert sorted(por_cursor) == sorted(todos)
+
+
+@pytest.mark.parametrize(
+    'cursor',
+    [
+        'nao-e-base64!',
+        'WyJwcm94aW1vIl0',  # ["proximo"]
+        'WyJsYWRvIixbImEiXV0',  # ["lado",["a"]]
+        'WyJwcm94aW1vIixbMV1d',  # ["proximo",[1]], título não é número
+    ],
+)
+def test_paginacao_por_cursor_invalido_retorna_bad_request(client, cursor):
+    response = client.get('/livros/query/', params={'cursor': cursor})
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Cursor inválido'}
+
+
+# faixa de anos e ordenação
+@pytest.mark.asyncio
+async def test_busca_livro_por_query_filtra_faixa_de_anos_e_ordena(
+    client, session, romancista
+):
+    session.add_all(
+        Livro(titulo=titulo, ano=ano, romancista_id=romancista.id)
+        for titulo, ano in (
+            ('c', 1990),
+            ('a', 2001),
+            ('d', 2001),
+            ('b', 2010),
+            ('e', 2020),
+        )
+    )
+    await session.commit()
+    faixa = {'ano_min': 2000, 'ano_max': 2010}
+
+    def busca(**params):
+        response = client.get('/livros/query/', params={**faixa, **params})
+        assert response.status_code == HTTPStatus.OK
+        return titulos(response.json())
+
+    assert busca() == ['a', 'b', 'd']
+    assert busca(ordem='desc') == ['d', 'b', 'a']
+    assert busca(ordenar_por='ano') == ['a', 'd', 'b']
+    assert busca(ordenar_por='ano', ordem='desc') == ['b', 'd', 'a']
+    assert busca(ordenar_por='id') == ['a', 'd', 'b']
+    assert busca(ordenar_por='id', ordem='desc') == ['b', 'd', 'a']
+
+
+@pytest.mark.asyncio
+async def test_busca_livro_por_query_ordenada_pagina_por_cursor(
+    client, session, romancista
+):
+    session.add_all(
+        Livro(
+            titulo=f'livro {i}', ano=2000 + i % 3, romancista_id=romancista.id
+        )
+        for i in range(7)
+    )
+    await session.commit()
+    url = '/livros/query/?ordenar_por=ano&ordem=desc'
+
+    completa = client.get(url).json()
+    primeira = client.get(url, params={'size': 3}).json()
+    adiante = percorre(client, url, 'próximo', primeira['próximo'])
+
+    assert titulos(primeira) + [
+        titulo for pagina in adiante for titulo in titulos(pagina)
+    ] == titulos(completa)
+
+
+@pytest.mark.asyncio
+async def test_busca_livro_por_query_conta_facetas_do_filtro(
+    client, session, romancista, outro_romancista, consultas_executadas
+):
+    session.add_all(
+        Livro(titulo=titulo, ano=ano, romancista_id=romancista_id)
+        for titulo, ano, romancista_id in (
+            ('livro a', 2001, romancista.id),
+            ('livro b', 2001, outro_romancista.id),
+            ('livro c', 2002, romancista.id),
+            ('livro d', 2003, romancista.id),
+            ('outro', 2001, romancista.id),
+        )
+    )
+    await session.commit()
+    consultas_executadas.clear()
+
+    response = client.get(
+        '/livros/query/?titulo=livro&facetas=romancista,ano,ano'
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['facetas'] == {
+        'ano': [
+            {'valor': 2001, 'total': 2},
+            {'valor': 2002, 'total': 1},
+            {'valor': 2003, 'total': 1},
+        ],
+        'romancista': [
+            {'valor': romancista.id, 'total': 3},
+            {'valor': outro_romancista.id, 'total': 1},
+        ],
+        'parcial': False,
+    }
+    # página, total e uma consulta para todas as facetas
+    consultas = [c for c in consultas_executadas if not c.startswith('SET')]
+    assert len(consultas) == len(['página', 'total', 'facetas'])
+    assert len([c for c in consultas if 'GROUPING SETS' in c]) == 1
+
+
+@pytest.mark.asyncio
+async def test_busca_livro_por_query_facetas_acima_do_limite_sao_parciais(
+    client, session, romancista, monkeypatch
+):
+    monkeypatch.setattr(paginacao.settings, 'DATABASE_FACET_LIMIT', 3)
+    livros = LivroFactory.create_batch(
+        5, ano=2001, romancista_id=romancista.id
+    )
+    session.add_all(livros)
+    await session.commit()
+
+    facetas = client.get('/livros/query/?facetas=ano').json()['facetas']
+
+    assert facetas['parcial'] is True
+    assert facetas['romancista'] is None
+    assert facetas['ano'][0]['total'] < len(livros)
+
+
+@pytest.mark.parametrize('facetas', ['', 'titulo', 'ano,', 'ano;romancista'])
+def test_busca_livro_por_query_recusa_facetas_fora_da_lista(client, facetas):
+    response = client.get('/livros/query/', params={'facetas': facetas})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_busca_livro_por_id_serve_do_cache_e_guarda_ausentes(
+    client, livro, consultas_executadas
+):
+    for _ in range(2):
+        encontrado = client.get(f'/livros/{livro.id}')
+        ausente = client.get(f'/livros/{livro.id + 1}')
+
+    assert encontrado.status_code == HTTPStatus.OK
+    assert ausente.status_code == HTTPStatus.NOT_FOUND
+    # uma consulta para cada id, na primeira vez (a do 404 inclusive)
+    consultas = [c for c in consultas_executadas if 'FROM livros' in c]
+    assert len(consultas) == len([livro.id, livro.id + 1])
+
+
+def test_busca_livro_por_id_em_cache_acompanha_as_escritas(
+    client, livro, romancista, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    novo_ano = 1999
+    client.get(f'/livros/{livro.id}')
+
+    client.patch(
+        f'/livros/{livro.id}', headers=headers, json={'ano': novo_ano}
+    )
+    alterado = client.get(f'/livros/{livro.id}').json()
+    client.delete(f'/romancistas/{romancista.id}', headers=headers)
+    removido = client.get(f'/livros/{livro.id}')
+
+    assert alterado['ano'] == novo_ano
+    assert removido.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_busca_livro_por_id_condicional_responde_304_pelo_update_at(
+    client, livro, token, consultas_executadas
+):
+    primeira = client.get(f'/livros/{livro.id}')
+    etag = primeira.headers['etag']
+    consultas_executadas.clear()
+
+    nao_modificado = client.get(
+        f'/livros/{livro.id}', headers={'If-None-Match': etag}
+    )
+    por_data = client.get(
+        f'/livros/{livro.id}',
+        headers={'If-Modified-Since': primeira.headers['last-modified']},
+    )
+
+    assert primeira.headers['cache-control'] == 'no-cache'
+    assert nao_modificado.status_code == HTTPStatus.NOT_MODIFIED
+    assert nao_modificado.content == b''
+    assert nao_modificado.headers['etag'] == etag
+    assert por_data.status_code == HTTPStatus.NOT_MODIFIED
+    # uma consulta só do update_at por requisição condicional
+    assert len(consultas_executadas) == len([nao_modificado, por_data])
+    assert all('update_at' in c for c in consultas_executadas)
+    assert not any('titulo' in c for c in consultas_executadas)
+
+    client.patch(
+        f'/livros/{livro.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'ano': 2001},
+    )
+    alterado = client.get(
+        f'/livros/{livro.id}', headers={'If-None-Match': etag}
+    )
+
+    assert alterado.status_code == HTTPStatus.OK
+    assert alterado.headers['etag'] != etag
+
+
+def test_busca_livro_etag_depende_da_representacao(client, livro):
+    completo = client.get(f'/livros/{livro.id}')
+    recortado = client.get(
+        f'/livros/{livro.id}?campos=titulo',
+        headers={'If-None-Match': completo.headers['etag']},
+    )
+    expandido = client.get(f'/livros/{livro.id}?expandir=romancista')
+
+    assert recortado.status_code == HTTPStatus.OK
+    etags = {
+        resposta.headers['etag']
+        for resposta in (completo, recortado, expandido)
+    }
+    assert len(etags) == len(['completo', 'recortado', 'expandido'])
+
+
+def test_busca_livro_condicional_id_nao_cadastrado_retorna_erro(client, livro):
+    response = client.get(
+        f'/livros/{livro.id + 1}', headers={'If-None-Match': '"x"'}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_listagens_de_livros_respondem_304_pelo_hash_da_pagina(client, livro):
+    for url in (
+        '/livros/query/',
+        '/livros/busca?q=romantico',
+        f'/livros/romancista/{livro.romancista_id}',
+    ):
+        etag = client.get(url).headers['etag']
+
+        response = client.get(url, headers={'If-None-Match': etag})
+
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_busca_livro_por_id_com_campos_recorta_o_livro_do_cache(
+    client, livro, consultas_executadas
+):
+    client.get(f'/livros/{livro.id}')
+    consultas_executadas.clear()
+
+    response = client.get(f'/livros/{livro.id}?campos=titulo,id,titulo')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'titulo': livro.titulo, 'id': livro.id}
+    assert consultas_executadas == []
+
+
+@pytest.mark.asyncio
+async def test_listagens_de_livros_com_campos_retornam_so_os_pedidos(
+    client, session, romancista
+):
+    session.add_all(
+        Livro(titulo=f'livro {i}', ano=2000 + i, romancista_id=romancista.id)
+        for i in range(5)
+    )
+    await session.commit()
+    rotas = (
+        '/livros/query/?campos=ano',
+        f'/livros/romancista/{romancista.id}?campos=ano',
+        '/livros/busca?q=livro&campos=ano',
+    )
+
+    for rota in rotas:
+        pagina = client.get(rota).json()
+        assert sorted(pagina['livros'], key=lambda livro: livro['ano']) == [
+            {'ano': 2000 + i} for i in range(5)
+        ]
+        assert pagina['total'] == len(range(5))
+
+    # o cursor usa a chave de ordenação, mesmo fora dos campos
+    primeira = client.get('/livros/query/?campos=ano&size=2').json()
+    segunda = client.get(
+        '/livros/query/',
+        params={'campos': 'ano', 'size': 2, 'cursor': primeira['próximo']},
+    ).json()
+    assert segunda['livros'] == [{'ano': 2002}, {'ano': 2003}]
+
+
+@pytest.mark.parametrize('campos', ['', 'created_at', 'id,', 'nome'])
+def test_busca_livro_recusa_campos_fora_do_schema(client, livro, campos):
+    response = client.get(f'/livros/{livro.id}', params={'campos': campos})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_listagens_nao_carregam_entidades_orm(
+    client, session, livro, outro_livro
+):
+    carregadas = []
+
+    def registra(entidade, contexto):
+        carregadas.append(type(entidade).__name__)
+
+    session.expunge_all()
+    for classe in (Livro, Romancista):
+        event.listen(classe, 'load', registra)
+    try:
+        for rota in (
+            '/livros/query/',
+            '/livros/busca?q=romantico',
+            f'/livros/romancista/{livro.romancista_id}',
+            '/romancistas/query/',
+        ):
+            response = client.get(rota)
+            assert response.status_code == HTTPStatus.OK
+            assert response.json()['total'] > 0
+    finally:
+        for classe in (Livro, Romancista):
+            event.remove(classe, 'load', registra)
+
+    # a existência do romancista só é verificada quando a página vem vazia
+    assert carregadas == []
+
+
+def test_busca_livros_por_romancista_id_sem_livros_retorna_ok_ou_erro(
+    client, romancista
+):
+    existente = client.get(f'/livros/romancista/{romancista.id}')
+    inexistente = client.get(f'/livros/romancista/{romancista.id + 1}')
+
+    assert existente.json()['livros'] == []
+    assert inexistente.status_code == HTTPStatus.NOT_FOUND
+    assert inexistente.json() == {'detail': 'Romancista não consta no MADR'}
+
+
+def test_busca_livro_por_id_expande_romancista(client, livro, romancista):
+    response = client.get(f'/livros/{livro.id}?expandir=romancista')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'id': livro.id,
+        'titulo': livro.titulo,
+        'ano': livro.ano,
+        'romancista_id': romancista.id,
+        'romancista': {'id': romancista.id, 'nome': romancista.nome},
+    }
+
+
+@pytest.mark.asyncio
+async def test_busca_livro_por_id_expande_romancista_removido_retorna_erro(
+    client, session, livro
+):
+    client.get(f'/livros/{livro.id}')  # livro no cache
+    # outro worker remove o romancista (e o livro, em cascata)
+    await session.execute(
+        delete(Romancista).where(Romancista.id == livro.romancista_id)
+    )
+    await session.commit()
+
+    response = client.get(f'/livros/{livro.id}?expandir=romancista')
+
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json() == {'detail': 'Livro não consta no MADR'}
+    assert client.get(f'/livros/{livro.id}').status_code == (
+        HTTPStatus.NOT_FOUND
+    )
+
+
+@pytest.mark.asyncio
+async def test_listagens_de_livros_expandem_romancista_em_uma_consulta(
+    client, session, romancista, outro_romancista, consultas_executadas
+):
+    session.add_all(
+        LivroFactory.create_batch(10, romancista_id=romancista.id, ano=2001)
+        + LivroFactory.create_batch(
+            10, romancista_id=outro_romancista.id, ano=2001
+        )
+    )
+    await session.commit()
+    nomes = {romancista.id: 'jorge', outro_romancista.id: 'cleber'}
+
+    for tamanho in (2, 20):
+        consultas_executadas.clear()
+        response = client.get(
+            '/livros/query/',
+            params={'size': tamanho, 'expandir': 'romancista', 'campos': 'id'},
+        )
+
+        livros = response.json()['livros']
+        assert len(livros) == tamanho
+        for livro in livros:
+            assert set(livro) == {'id', 'romancista'}
+            romancista_do_livro = livro['romancista']
+            assert (
+                romancista_do_livro['nome'] == nomes[romancista_do_livro['id']]
+            )
+        # página, total e os romancistas da página, qualquer que seja o
+        # tamanho dela
+        consultas = [
+            c for c in consultas_executadas if not c.startswith('SET')
+        ]
+        assert len(consultas) == len(['página', 'total', 'romancistas'])
+
+
+def test_busca_livros_por_texto_e_romancista_expandem_romancista(
+    client, livro, romancista
+):
+    esperado = {'id': romancista.id, 'nome': romancista.nome}
+
+    por_texto = client.get('/livros/busca?q=romantico&expandir=romancista')
+    por_romancista = client.get(
+        f'/livros/romancista/{romancista.id}?expandir=romancista'
+    )
+
+    assert por_texto.json()['livros'][0]['romancista'] == esperado
+    assert por_romancista.json()['livros'][0]['romancista'] == esperado
+
+
+@pytest.mark.parametrize('expandir', ['', 'livros', 'romancista,livros'])
+def test_busca_livro_recusa_expandir_fora_da_lista(client, livro, expandir):
+    response = client.get(f'/livros/{livro.id}', params={'expandir': expandir})
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_busca_livro_por_query_recusa_ordenacao_fora_da_lista(client):
+    response = client.get('/livros/query/?ordenar_por=created_at')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
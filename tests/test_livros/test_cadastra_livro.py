@@ -66,6 +66,9 @@ def test_cadastra_livro_retorna_nome_sanitizado(client, romancista, token):
 
 
 def test_cadastra_livro_ja_cadastrado_retorna_conflito(client, livro, token):
+    # o conflito desfaz a transação (e expira os objetos da sessão)
+    assert livro.titulo == 'o ultimo romantico'
+
     json_input = {
         'titulo': livro.titulo,
         'ano': 1999,
@@ -78,7 +81,6 @@ def test_cadastra_livro_ja_cadastrado_retorna_conflito(client, livro, token):
         json=json_input,
     )
 
-    assert livro.titulo == 'o ultimo romantico'
     assert response.json() == {'detail': 'Livro já consta no MADR'}
     assert response.status_code == HTTPStatus.CONFLICT
 
@@ -142,3 +144,20 @@ def test_cadastra_livro_nome_str_vazia_retorna_erro(client, token, romancista):
         response.json()['detail'][0]['msg']
         == 'String should have at least 1 character'
     )
+
+
+def test_cadastra_livro_insere_e_retorna_em_uma_consulta(
+    client, romancista, token, consultas_executadas
+):
+    response = client.post(
+        '/livros',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'titulo': 'livro', 'ano': 1999, 'romancista_id': romancista.id},
+    )
+
+    assert response.status_code == HTTPStatus.CREATED
+    # busca do usuário autenticado + INSERT ... RETURNING
+    assert [sql.split()[0] for sql in consultas_executadas] == [
+        'SELECT',
+        'INSERT',
+    ]
@@ -0,0 +1,105 @@
+from http import HTTPStatus
+
+import pytest
+from sqlalchemy import insert, text
+
+from madr_fast import paginacao
+from madr_fast.cache import CacheTTL
+from madr_fast.models import Livro
+
+
+@pytest.fixture
+def estrategia(monkeypatch):
+    # troca a estratégia do total, com um cache de totais limpo
+    monkeypatch.setattr(paginacao, 'totais', CacheTTL(10, ttl=60))
+
+    def define(nome, **opcoes):
+        monkeypatch.setattr(
+            paginacao.settings, 'DATABASE_COUNT_STRATEGY', nome
+        )
+        for opcao, valor in opcoes.items():
+            monkeypatch.setattr(paginacao.settings, opcao, valor)
+
+    return define
+
+
+def counts(consultas):
+    return [sql for sql in consultas if 'count(' in sql]
+
+
+def test_total_omitido_nao_conta(
+    client, livro, estrategia, consultas_executadas
+):
+    estrategia('omitted')
+
+    response = client.get('/livros/query/')
+
+    assert response.status_code == HTTPStatus.OK
+    pagina = response.json()
+    assert len(pagina['livros']) == 1
+    assert pagina['total'] is None
+    assert pagina['páginas'] is None
+    assert pagina['total_modo'] == 'omitted'
+    assert counts(consultas_executadas) == []
+
+
+@pytest.mark.asyncio
+async def test_total_em_cache_por_filtro(
+    client, session, livro, estrategia, consultas_executadas
+):
+    estrategia('cached')
+
+    primeira = client.get('/livros/query/', params={'ano': livro.ano})
+    session.add(
+        Livro(titulo='novo', ano=livro.ano, romancista_id=livro.romancista_id)
+    )
+    await session.commit()
+    segunda = client.get(
+        '/livros/query/', params={'ano': livro.ano, 'page': 2}
+    )
+    outro_filtro = client.get('/livros/query/', params={'ano': 1})
+
+    # o filtro repetido (em outra página) reaproveita o total guardado
+    assert (primeira.json()['total'], primeira.json()['total_modo']) == (
+        1,
+        'exact',
+    )
+    assert (segunda.json()['total'], segunda.json()['total_modo']) == (
+        1,
+        'cached',
+    )
+    assert outro_filtro.json()['total_modo'] == 'exact'
+    assert len(counts(consultas_executadas)) == len([primeira, outro_filtro])
+
+
+@pytest.mark.asyncio
+async def test_total_estimado_em_filtros_amplos(
+    client, session, romancista, estrategia
+):
+    num_livros = 5_000
+    await session.execute(
+        insert(Livro),
+        [
+            {
+                'titulo': f'livro {i}',
+                'ano': 2000,
+                'romancista_id': romancista.id,
+            }
+            for i in range(num_livros)
+        ],
+    )
+    await session.commit()
+    await session.execute(text('ANALYZE livros'))
+
+    estrategia('estimated', DATABASE_COUNT_ESTIMATE_THRESHOLD=1_000)
+    amplo = client.get('/livros/query/').json()
+    estreito = client.get('/livros/query/', params={'titulo': 'livro 42'})
+
+    # sem filtro: estimativa do planner, próxima do total real
+    assert amplo['total_modo'] == 'estimated'
+    assert abs(amplo['total'] - num_livros) <= num_livros // 10
+    # filtro estreito: abaixo do limite, count exato
+    assert estreito.json()['total_modo'] == 'exact'
+    assert estreito.json()['total'] == len([
+        i for i in range(num_livros) if 'livro 42' in f'livro {i}'
+    ])
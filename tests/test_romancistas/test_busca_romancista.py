@@ -1,5 +1,10 @@
 from http import HTTPStatus
+from unittest.mock import ANY
 
+import pytest
+
+from madr_fast import consultas
+from madr_fast.models import Livro
 from tests.factories import RomancistaFactory
 
 
@@ -38,6 +43,9 @@ def test_busca_romancista_por_query_filtra_nome_parcial_retorna_lista(
         'páginas': 1,
         'tamanho': 20,
         'total': 1,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
     }
 
 
@@ -45,7 +53,7 @@ def test_busca_romancista_por_query_deve_retorna_paginacao_maiores_que_20(
     client, session
 ):
     # factory
-    session.bulk_save_objects(RomancistaFactory.create_batch(25))
+    session.add_all(RomancistaFactory.create_batch(25))
 
     response = client.get(
         '/romancistas/query/',
@@ -60,7 +68,7 @@ def test_busca_romancista_por_query_vazias_retorna_lista_total(
     client, session
 ):
     # factory
-    session.bulk_save_objects(RomancistaFactory.create_batch(7))
+    session.add_all(RomancistaFactory.create_batch(7))
 
     response = client.get(
         '/romancistas/query/',
@@ -86,4 +94,181 @@ def test_busca_romancista_por_query_sem_correspondencia_retorna_lista_vazia(
         'páginas': 0,
         'tamanho': 20,
         'total': 0,
+        'próximo': None,
+        'anterior': None,
+        'total_modo': 'exact',
+    }
+
+
+def test_busca_romancista_por_query_pagina_por_cursor(
+    client, romancista, outro_romancista
+):
+    primeira = client.get('/romancistas/query/', params={'size': 1}).json()
+    segunda = client.get(
+        '/romancistas/query/',
+        params={'size': 1, 'cursor': primeira['próximo']},
+    ).json()
+    de_volta = client.get(
+        '/romancistas/query/',
+        params={'size': 1, 'cursor': segunda['anterior']},
+    ).json()
+
+    # ordem por nome: cleber, jorge
+    assert primeira['romancistas'] == [
+        {'id': outro_romancista.id, 'nome': outro_romancista.nome}
+    ]
+    assert segunda['romancistas'] == [
+        {'id': romancista.id, 'nome': romancista.nome}
+    ]
+    assert segunda['próximo'] is None
+    assert de_volta['romancistas'] == primeira['romancistas']
+    assert de_volta['anterior'] is None
+
+
+def test_busca_romancista_com_campos_retorna_so_os_pedidos(
+    client, romancista, outro_romancista, consultas_executadas
+):
+    por_id = client.get(f'/romancistas/{romancista.id}?campos=nome')
+    consultas_executadas.clear()
+    por_query = client.get('/romancistas/query/?campos=id')
+
+    assert por_id.json() == {'nome': romancista.nome}
+    assert por_query.json()['romancistas'] == [
+        {'id': outro_romancista.id},
+        {'id': romancista.id},
+    ]
+    assert not any('created_at' in c for c in consultas_executadas)
+
+
+def test_busca_romancista_recusa_campos_fora_do_schema(client, romancista):
+    response = client.get(f'/romancistas/{romancista.id}?campos=created_at')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_busca_romancista_por_id_inclui_livros(
+    client, session, romancista
+):
+    session.add_all(
+        Livro(titulo=titulo, ano=2001, romancista_id=romancista.id)
+        for titulo in ('livro b', 'livro a')
+    )
+    await session.commit()
+
+    response = client.get(
+        f'/romancistas/{romancista.id}?incluir=livros&campos=nome'
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'nome': romancista.nome,
+        'livros': [
+            {
+                'id': ANY,
+                'titulo': titulo,
+                'ano': 2001,
+                'romancista_id': romancista.id,
+            }
+            for titulo in ('livro a', 'livro b')
+        ],
+        'livros_truncados': False,
     }
+
+
+@pytest.mark.asyncio
+async def test_busca_romancista_por_query_inclui_livros_em_uma_consulta(
+    client, session, romancista, outro_romancista, consultas_executadas
+):
+    session.add_all(
+        Livro(titulo=titulo, ano=2001, romancista_id=romancista.id)
+        for titulo in ('livro b', 'livro a')
+    )
+    await session.commit()
+
+    for tamanho in (1, 20):
+        consultas_executadas.clear()
+        response = client.get(
+            '/romancistas/query/',
+            params={'size': tamanho, 'incluir': 'livros'},
+        )
+
+        romancistas = response.json()['romancistas']
+        assert romancistas[0] == {
+            'id': outro_romancista.id,
+            'nome': 'cleber',
+            'livros': [],
+            'livros_truncados': False,
+        }
+        # página, total e os livros da página, qualquer que seja o tamanho
+        consultas = [
+            c for c in consultas_executadas if not c.startswith('SET')
+        ]
+        assert len(consultas) == len(['página', 'total', 'livros'])
+
+    titulos = [livro['titulo'] for livro in romancistas[1]['livros']]
+    assert titulos == ['livro a', 'livro b']
+
+
+@pytest.mark.asyncio
+async def test_busca_romancista_inclui_livros_ate_o_limite(
+    client, session, romancista, monkeypatch
+):
+    monkeypatch.setattr(consultas.settings, 'EMBED_LIVROS_LIMIT', 2)
+    session.add_all(
+        Livro(titulo=titulo, ano=2001, romancista_id=romancista.id)
+        for titulo in ('livro c', 'livro a', 'livro b')
+    )
+    await session.commit()
+
+    por_id = client.get(f'/romancistas/{romancista.id}?incluir=livros')
+    listagem = client.get('/romancistas/query/?incluir=livros')
+
+    for com_livros in (por_id.json(), listagem.json()['romancistas'][0]):
+        assert [livro['titulo'] for livro in com_livros['livros']] == [
+            'livro a',
+            'livro b',
+        ]
+        assert com_livros['livros_truncados'] is True
+
+
+def test_busca_romancista_recusa_incluir_fora_da_lista(client, romancista):
+    response = client.get(f'/romancistas/{romancista.id}?incluir=romancista')
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_busca_romancista_por_query_com_livros_acompanha_escrita_em_livros(
+    client, romancista, livro, token
+):
+    url = '/romancistas/query/?incluir=livros'
+    antes = client.get(url).json()['romancistas'][0]['livros']
+
+    client.delete(
+        f'/livros/{livro.id}', headers={'Authorization': f'Bearer {token}'}
+    )
+    depois = client.get(url).json()['romancistas'][0]['livros']
+
+    assert [item['id'] for item in antes] == [livro.id]
+    assert depois == []
+
+
+def test_busca_romancista_condicional_responde_304(client, romancista, livro):
+    url = f'/romancistas/{romancista.id}'
+    etag = client.get(url).headers['etag']
+    com_livros = client.get(f'{url}?incluir=livros').headers['etag']
+
+    nao_modificado = client.get(url, headers={'If-None-Match': etag})
+    livros_nao_modificados = client.get(
+        f'{url}?incluir=livros', headers={'If-None-Match': com_livros}
+    )
+    listagem = client.get('/romancistas/query/')
+    listagem_nao_modificada = client.get(
+        '/romancistas/query/',
+        headers={'If-None-Match': listagem.headers['etag']},
+    )
+
+    assert etag != com_livros
+    assert nao_modificado.status_code == HTTPStatus.NOT_MODIFIED
+    assert livros_nao_modificados.status_code == HTTPStatus.NOT_MODIFIED
+    assert listagem_nao_modificada.status_code == HTTPStatus.NOT_MODIFIED
@@ -49,13 +49,15 @@ def test_cadastra_romancista_retorna_nome_sanitizado(client, token):
 def test_cadastra_romancista_ja_cadastrado_retorna_conflito(
     client, romancista, token
 ):
+    # o conflito desfaz a transação (e expira os objetos da sessão)
+    assert romancista.nome == 'jorge'
+
     response = client.post(
         '/romancistas',
         headers={'Authorization': f'Bearer {token}'},
         json={'nome': romancista.nome},
     )
 
-    assert romancista.nome == 'jorge'
     assert response.status_code == HTTPStatus.CONFLICT
     assert response.json() == {'detail': 'Romancista já consta no MADR'}
 
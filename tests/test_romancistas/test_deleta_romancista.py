@@ -33,3 +33,19 @@ def test_deleta_romancista_id_nao_cadastrado_retorna_erro(
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Romancista não consta no MADR'}
+
+
+def test_deleta_romancista_com_livros_usa_um_unico_delete(
+    client, romancista, livro, token, consultas_executadas
+):
+    response = client.delete(
+        f'/romancistas/{romancista.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    # busca do usuário autenticado + DELETE (livros via ON DELETE CASCADE)
+    assert [sql.split()[0] for sql in consultas_executadas] == [
+        'SELECT',
+        'DELETE',
+    ]
@@ -1,3 +1,6 @@
+import time
+from http import HTTPStatus
+
 import pytest
 from fastapi.exceptions import HTTPException
 from jwt import decode
@@ -6,6 +9,7 @@ from madr_fast.security import (
     create_access_token,
     get_current_user,
     get_password_hash,
+    principais,
     settings,
     verify_password,
 )
@@ -27,25 +31,87 @@ def test_jwt():
     assert decoded['exp']
 
 
-def test_security_current_user_token_invalido(session):
+@pytest.mark.asyncio
+async def test_security_current_user_token_invalido(session):
     # test case for JWT token error (or decode error)
     with pytest.raises(HTTPException):
-        get_current_user(session, token='invalid-token')
+        await get_current_user(session, token='invalid-token')
 
 
-def test_security_current_user_token_vazio(session):
+@pytest.mark.asyncio
+async def test_security_current_user_token_vazio(session):
     # test case for user not found in the database
     data_no_username = {'sub': 'test@test'}
     token = create_access_token(data_no_username)
 
     with pytest.raises(HTTPException):
-        get_current_user(session, token)
+        await get_current_user(session, token)
 
 
-def test_security_current_user_token_sem_sub(session):
+@pytest.mark.asyncio
+async def test_security_current_user_token_sem_sub(session):
     # test case for missing 'sub' in the payload
     data_user_none = {'test': 'test'}
     token = create_access_token(data_user_none)
 
     with pytest.raises(HTTPException):
-        get_current_user(session, token)
+        await get_current_user(session, token)
+
+
+def test_current_user_em_cache_nao_consulta_o_banco(
+    client, usuario, token, consultas_executadas
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+    consultas_executadas.clear()
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert not any('FROM usuarios' in c for c in consultas_executadas)
+    assert principais.estatisticas.acertos >= 1
+
+
+def test_current_user_em_cache_vale_ate_a_expiracao_do_token(
+    client, usuario, monkeypatch
+):
+    validade_do_token = 15  # segundos, abaixo do TTL do cache
+    monkeypatch.setattr(
+        settings, 'ACCESS_TOKEN_EXPIRE_MINUTES', validade_do_token / 60
+    )
+    token = create_access_token({'sub': usuario.email})
+
+    client.post(
+        '/auth/refresh_token', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    expira_em, _ = principais._itens[usuario.email]
+    assert expira_em - time.monotonic() <= validade_do_token
+
+
+def test_current_user_em_cache_invalidado_ao_alterar_email(
+    client, usuario, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.put(
+        f'/contas/{usuario.id}',
+        headers=headers,
+        json={'email': 'novo@email.com'},
+    )
+
+    # o token antigo aponta para o email que não existe mais
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_current_user_em_cache_invalidado_ao_deletar_conta(
+    client, usuario, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+    client.delete(f'/contas/{usuario.id}', headers=headers)
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,284 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from madr_fast.app import app
+from madr_fast.database import (
+    VIOLACAO_CHAVE_ESTRANGEIRA,
+    VIOLACAO_UNICA,
+    cria_engine,
+    get_read_session,
+    get_session,
+    resumo_pool,
+    settings,
+    tipo_de_violacao,
+)
+from madr_fast.models import Livro, Romancista, table_registry
+from tests.conftest import cliente_de_teste
+
+
+@pytest_asyncio.fixture
+async def sessao_sqlite():
+    _engine = cria_engine('sqlite+aiosqlite://')
+    async with _engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    async with AsyncSession(_engine, expire_on_commit=False) as session:
+        yield session
+
+    await _engine.dispose()
+
+
+@pytest.fixture
+def cliente_sqlite(sessao_sqlite):
+    with cliente_de_teste(sessao_sqlite) as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_sqlite_em_arquivo_usa_wal_e_um_escritor(tmp_path):
+    url = f'sqlite+aiosqlite:///{tmp_path / "madr.db"}'
+    escritor = cria_engine(url)
+    leitor = cria_engine(url, somente_leitura=True)
+
+    async with escritor.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+        pragmas = {
+            pragma: await conn.scalar(text(f'PRAGMA {pragma}'))
+            for pragma in (
+                'journal_mode',
+                'synchronous',
+                'mmap_size',
+                'foreign_keys',
+            )
+        }
+
+    assert pragmas == {
+        'journal_mode': 'wal',
+        'synchronous': 1,  # NORMAL
+        'mmap_size': settings.DATABASE_SQLITE_MMAP_SIZE,
+        'foreign_keys': 1,
+    }
+    assert escritor.pool.size() == 1
+    assert escritor.pool._max_overflow == 0
+
+    # o pool de leitura não escreve
+    async with leitor.connect() as conn:
+        with pytest.raises(OperationalError):
+            await conn.execute(insert(Romancista).values(nome='leitor'))
+
+    await escritor.dispose()
+    await leitor.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_em_memoria_compartilha_o_banco(sessao_sqlite):
+    _engine = sessao_sqlite.bind
+    sessao_sqlite.add(Romancista(nome='machado'))
+    await sessao_sqlite.commit()
+
+    # outra sessão, outra conexão: enxerga o mesmo banco em memória
+    async with AsyncSession(_engine) as outra:
+        assert await outra.scalar(select(Romancista.nome)) == 'machado'
+
+    # o banco sobrevive ao fechamento das conexões do pool
+    await _engine.dispose()
+    async with AsyncSession(_engine) as depois:
+        assert await depois.scalar(select(Romancista.nome)) == 'machado'
+
+    # outro engine em memória, outro banco
+    vazio = cria_engine('sqlite+aiosqlite://')
+    async with vazio.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+    async with AsyncSession(vazio) as outro_banco:
+        assert await outro_banco.scalar(select(Romancista.nome)) is None
+    await vazio.dispose()
+
+    assert resumo_pool(_engine)['tamanho'] == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_em_memoria_requisicoes_simultaneas(
+    cliente_sqlite, sessao_sqlite
+):
+    _engine = sessao_sqlite.bind
+
+    async def sessao_por_requisicao():
+        async with AsyncSession(_engine, expire_on_commit=False) as session:
+            yield session
+
+    # cada requisição com a sua sessão, como na aplicação
+    app.dependency_overrides[get_session] = sessao_por_requisicao
+    app.dependency_overrides[get_read_session] = sessao_por_requisicao
+    conta = {
+        'username': 'leitor',
+        'email': 'leitor@de.teste',
+        'senha': 'segredo',
+    }
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url='http://teste'
+    ) as cliente:
+        await cliente.post('/contas/', json=conta)
+        token = (
+            await cliente.post(
+                '/auth/token',
+                data={'username': conta['email'], 'password': conta['senha']},
+            )
+        ).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        escritas = [
+            cliente.post(
+                '/romancistas/', headers=headers, json={'nome': f'autor {i}'}
+            )
+            for i in range(5)
+        ]
+        leituras = [cliente.get('/romancistas/query/') for _ in range(5)]
+        respostas = await asyncio.gather(*escritas, *leituras)
+
+    assert [resposta.status_code for resposta in respostas] == [
+        HTTPStatus.CREATED
+    ] * len(escritas) + [HTTPStatus.OK] * len(leituras)
+    async with AsyncSession(_engine) as session:
+        nomes = await session.scalars(select(Romancista.nome))
+        assert len(nomes.all()) == len(escritas)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_traduz_violacoes_para_sqlstate(sessao_sqlite):
+    sessao_sqlite.add(Romancista(nome='machado'))
+    await sessao_sqlite.commit()
+
+    with pytest.raises(IntegrityError) as repetido:
+        await sessao_sqlite.execute(insert(Romancista).values(nome='machado'))
+    await sessao_sqlite.rollback()
+
+    with pytest.raises(IntegrityError) as sem_romancista:
+        await sessao_sqlite.execute(
+            insert(Livro).values(titulo='livro', ano=1900, romancista_id=9)
+        )
+    await sessao_sqlite.rollback()
+
+    assert tipo_de_violacao(repetido.value) == VIOLACAO_UNICA
+    assert tipo_de_violacao(sem_romancista.value) == (
+        VIOLACAO_CHAVE_ESTRANGEIRA
+    )
+
+
+def autentica(cliente):
+    conta = {
+        'username': 'leitor',
+        'email': 'leitor@de.teste',
+        'senha': 'segredo',
+    }
+    assert cliente.post('/contas', json=conta).status_code == (
+        HTTPStatus.CREATED
+    )
+    token = cliente.post(
+        '/auth/token',
+        data={'username': conta['email'], 'password': conta['senha']},
+    ).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_sqlite_fluxo_da_api(cliente_sqlite):
+    headers = autentica(cliente_sqlite)
+
+    romancista = cliente_sqlite.post(
+        '/romancistas/', headers=headers, json={'nome': 'Machado de Assis'}
+    ).json()
+    livro = {
+        'titulo': 'Dom Casmurro',
+        'ano': 1899,
+        'romancista_id': romancista['id'],
+    }
+    criado = cliente_sqlite.post('/livros/', headers=headers, json=livro)
+    repetido = cliente_sqlite.post('/livros/', headers=headers, json=livro)
+    sem_romancista = cliente_sqlite.post(
+        '/livros/',
+        headers=headers,
+        json={**livro, 'titulo': 'outro', 'romancista_id': 999},
+    )
+
+    assert criado.status_code == HTTPStatus.CREATED
+    assert repetido.status_code == HTTPStatus.CONFLICT
+    assert sem_romancista.status_code == HTTPStatus.NOT_FOUND
+
+    # LIKE diferencia maiúsculas, como no Postgres
+    busca = cliente_sqlite.get('/livros/query/?titulo=casmurro').json()
+    assert [livro['titulo'] for livro in busca['livros']] == ['dom casmurro']
+    busca = cliente_sqlite.get('/livros/query/?titulo=CASMURRO').json()
+    assert busca['livros'] == []
+
+    # busca textual cai em LIKE por termo, no título ou no nome
+    busca = cliente_sqlite.get('/livros/busca?q=Machado Dom').json()
+    assert [livro['titulo'] for livro in busca['livros']] == ['dom casmurro']
+    busca = cliente_sqlite.get('/livros/busca?q=machado memorias').json()
+    assert busca['livros'] == []
+
+    # paginação por cursor (comparação de tuplas no SQLite)
+    cliente_sqlite.post(
+        '/livros/',
+        headers=headers,
+        json={**livro, 'titulo': 'Memorias Postumas'},
+    )
+    primeira = cliente_sqlite.get('/livros/query/?size=1').json()
+    segunda = cliente_sqlite.get(
+        '/livros/query/', params={'size': 1, 'cursor': primeira['próximo']}
+    ).json()
+    assert [livro['titulo'] for livro in segunda['livros']] == [
+        'memorias postumas'
+    ]
+    assert segunda['próximo'] is None
+
+    # facetas sem GROUPING SETS (um GROUP BY por faceta, unidos)
+    facetas = cliente_sqlite.get(
+        '/livros/query/?facetas=ano,romancista'
+    ).json()['facetas']
+    assert facetas == {
+        'ano': [{'valor': 1899, 'total': 2}],
+        'romancista': [{'valor': romancista['id'], 'total': 2}],
+        'parcial': False,
+    }
+
+    # romancista embutido nos livros da página
+    expandidos = cliente_sqlite.get(
+        '/livros/query/?campos=titulo&expandir=romancista'
+    ).json()['livros']
+    assert expandidos[0] == {
+        'titulo': 'dom casmurro',
+        'romancista': {'id': romancista['id'], 'nome': romancista['nome']},
+    }
+
+    # autocompletar da memória, carregado do banco do teste
+    sugestoes = cliente_sqlite.get('/livros/autocompletar?prefixo=Dom').json()
+    assert sugestoes == [{'id': criado.json()['id'], 'titulo': 'dom casmurro'}]
+
+    # ON DELETE CASCADE
+    cliente_sqlite.delete(f'/romancistas/{romancista["id"]}', headers=headers)
+    response = cliente_sqlite.get(f'/livros/{criado.json()["id"]}')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert cliente_sqlite.get('/livros/autocompletar?prefixo=dom').json() == []
+
+
+def test_sqlite_patch_no_mesmo_segundo_muda_o_etag(cliente_sqlite):
+    headers = autentica(cliente_sqlite)
+    romancista = cliente_sqlite.post(
+        '/romancistas/', headers=headers, json={'nome': 'Machado'}
+    ).json()
+    url = f'/romancistas/{romancista["id"]}'
+
+    # o CURRENT_TIMESTAMP do SQLite tem resolução de segundos
+    etag = cliente_sqlite.get(url).headers['etag']
+    cliente_sqlite.patch(url, headers=headers, json={'nome': 'Assis'})
+    response = cliente_sqlite.get(url, headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['etag'] != etag
+    assert response.json()['nome'] == 'assis'